@@ -0,0 +1,238 @@
+import os
+import sys
+import json
+import time
+import argparse
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from instance_stats import read_mesh_positions
+from scene_data import INSTANCE_FILE, load_instance_index, write_json_atomic
+
+MESH_FILE = 'mesh_aligned_0.05.ply'
+# 暴力搜索时一块查询的临时数组 (块大小 × 实例顶点数 × 3 个float64) 的字节上限
+BRUTE_FORCE_BUDGET = 64 * 2**20
+# annotation_metrics 写入的字段；无法计算的标注对要去掉这些旧值
+METRIC_KEYS = ('surface_distance_m', 'surface_point1', 'surface_point2', 'centroid_distance_m', 'aabb_gap_m')
+
+
+class NearestTree:
+    """一个实例顶点上的最近邻搜索结构
+
+    优先使用 scipy 的 cKDTree，其次 Open3D 的 NearestNeighborSearch (KD树)，
+    两者都不可用时退回分块暴力搜索。
+    """
+
+    def __init__(self, points):
+        self.points = np.ascontiguousarray(points, dtype=np.float64)
+        self._query = None
+        try:
+            from scipy.spatial import cKDTree
+            tree = cKDTree(self.points)
+            self._query = lambda q: tree.query(q, k=1)
+        except ImportError:
+            try:
+                import open3d as o3d
+                nns = o3d.core.nns.NearestNeighborSearch(o3d.core.Tensor(self.points))
+                nns.knn_index()
+
+                def query(q):
+                    indices, sq_distances = nns.knn_search(o3d.core.Tensor(np.ascontiguousarray(q)), 1)
+                    return np.sqrt(sq_distances.numpy()[:, 0]), indices.numpy()[:, 0]
+                self._query = query
+            except ImportError:
+                self._query = self._brute_force
+
+    def _brute_force(self, q):
+        distances = np.empty(q.shape[0])
+        indices = np.empty(q.shape[0], dtype=np.int64)
+        # 块大小随实例顶点数缩小，大实例 (墙、地面) 也不会超出内存上限
+        chunk = max(1, BRUTE_FORCE_BUDGET // (self.points.shape[0] * 24))
+        for start in range(0, q.shape[0], chunk):
+            block = q[start:start + chunk]
+            sq = ((block[:, None, :] - self.points[None, :, :]) ** 2).sum(axis=2)
+            nearest = sq.argmin(axis=1)
+            indices[start:start + block.shape[0]] = nearest
+            distances[start:start + block.shape[0]] = np.sqrt(sq[np.arange(block.shape[0]), nearest])
+        return distances, indices
+
+    def closest(self, query_points):
+        """query_points 中离本实例最近的点：返回 (距离, 查询点序号, 本实例点序号)"""
+        distances, indices = self._query(query_points)
+        k = int(np.argmin(distances))
+        return float(distances[k]), k, int(indices[k])
+
+
+class SceneInstances:
+    """一个场景的实例几何：顶点坐标、每个实例的质心/AABB和KD树都按需计算并缓存，供所有标注对复用"""
+
+    def __init__(self, positions, index):
+        self.positions = positions
+        self.index = index
+        self._points = {}
+        self._trees = {}
+
+    def points(self, object_id):
+        if object_id not in self._points:
+            self._points[object_id] = self.positions[self.index.vertices_of([object_id])]
+        return self._points[object_id]
+
+    def tree(self, object_id):
+        if object_id not in self._trees:
+            self._trees[object_id] = NearestTree(self.points(object_id))
+        return self._trees[object_id]
+
+    def surface_distance(self, id1, id2, upper_bound=np.inf):
+        """两个实例顶点之间的最小距离，返回 (距离, id1上的点, id2上的点)
+
+        KD树建在较小的实例上，查询较大实例的顶点。已知距离上界 (如标注的两点距离) 时，
+        只查询落在较小实例AABB扩大上界范围内的顶点；结果超过上界时退回全部查询，保证结果精确。
+        """
+        small, large = (id1, id2) if self.points(id1).shape[0] <= self.points(id2).shape[0] else (id2, id1)
+        small_points, large_points = self.points(small), self.points(large)
+        candidates = large_points
+        if np.isfinite(upper_bound):
+            low = small_points.min(axis=0) - upper_bound
+            high = small_points.max(axis=0) + upper_bound
+            inside = np.all((large_points >= low) & (large_points <= high), axis=1)
+            if inside.any():
+                candidates = large_points[inside]
+        distance, q, t = self.tree(small).closest(candidates)
+        if candidates is not large_points and distance > upper_bound:
+            distance, q, t = self.tree(small).closest(large_points)
+            candidates = large_points
+        point_small, point_large = small_points[t], candidates[q]
+        if small == id1:
+            return distance, point_small, point_large
+        return distance, point_large, point_small
+
+    def centroid(self, object_id):
+        return self.points(object_id).mean(axis=0)
+
+    def aabb_gap(self, id1, id2):
+        """两个AABB之间的欧氏间隙，相交时为0"""
+        a, b = self.points(id1), self.points(id2)
+        gap = np.maximum(0.0, np.maximum(a.min(axis=0) - b.max(axis=0), b.min(axis=0) - a.max(axis=0)))
+        return float(np.linalg.norm(gap))
+
+
+def annotation_metrics(instances, annotation):
+    """一条距离标注的附加度量；实例不存在时返回None"""
+    object_ids = annotation.get('object_ids', [])
+    if len(object_ids) != 2:
+        return None
+    id1, id2 = object_ids
+    if instances.points(id1).shape[0] == 0 or instances.points(id2).shape[0] == 0:
+        return None
+    upper_bound = np.inf
+    if annotation.get('point1') is not None and annotation.get('point2') is not None:
+        # 标注的两点分别位于两个实例上，其距离是表面距离的上界 (distance_m 只保留4位小数，留出余量)
+        upper_bound = float(np.linalg.norm(np.subtract(annotation['point1'], annotation['point2']))) + 1e-3
+    distance, point1, point2 = instances.surface_distance(id1, id2, upper_bound)
+    return {
+        'surface_distance_m': round(distance, 4),
+        'surface_point1': point1.tolist(),
+        'surface_point2': point2.tolist(),
+        'centroid_distance_m': round(float(np.linalg.norm(instances.centroid(id1) - instances.centroid(id2))), 4),
+        'aabb_gap_m': round(instances.aabb_gap(id1, id2), 4),
+    }
+
+
+def process_scene(scene_dir, mesh_name=MESH_FILE):
+    """为一个场景的所有距离标注补充度量字段，内容有变化时原子写回；任何异常都只影响该场景"""
+    start = time.perf_counter()
+    scene = os.path.basename(os.path.normpath(scene_dir))
+    result = {'scene': scene, 'status': 'ok', 'pairs': 0, 'skipped_pairs': 0, 'written': False}
+    try:
+        path = os.path.join(scene_dir, f'{scene}_abs_annotations.json')
+        if not os.path.exists(path):
+            result['status'] = 'skipped'
+            return result
+        with open(path, 'r', encoding='utf-8') as f:
+            annotations = json.load(f)
+        if not annotations:
+            return result
+
+        positions = read_mesh_positions(os.path.join(scene_dir, mesh_name))
+        index = load_instance_index(os.path.join(scene_dir, INSTANCE_FILE))
+        if positions.shape[0] != index.num_vertices:
+            raise ValueError(f'mesh顶点数 ({positions.shape[0]}) 与实例掩码 ({index.num_vertices}) 不匹配')
+        instances = SceneInstances(positions, index)
+
+        updated = []
+        for annotation in annotations:
+            metrics = annotation_metrics(instances, annotation)
+            if metrics is None:
+                result['skipped_pairs'] += 1
+                # 去掉之前计算的度量，避免它们描述的是修改前的另一对实例
+                updated.append({k: v for k, v in annotation.items() if k not in METRIC_KEYS})
+            else:
+                result['pairs'] += 1
+                updated.append(dict(annotation, **metrics))
+        if updated != annotations:
+            write_json_atomic(path, updated, indent=4)
+            result['written'] = True
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = f'{type(e).__name__}: {e}'
+        result['traceback'] = traceback.format_exc()
+    finally:
+        result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description='为 *_abs_annotations.json 中的每对实例补充表面最小距离、质心距离和AABB间隙')
+    parser.add_argument('dataset_path', help='数据集目录，每个子文件夹为一个场景')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1,
+                        help='并行工作进程数 (默认: CPU核数)')
+    parser.add_argument('--scenes', nargs='+', default=None, help='只处理指定的场景')
+    parser.add_argument('--mesh-name', default=MESH_FILE, help=f'mesh文件名 (默认: {MESH_FILE})')
+    parser.add_argument('-v', '--verbose', action='store_true', help='出错时打印完整堆栈')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    from data_preprocess import list_scenes
+
+    scenes = args.scenes if args.scenes else list_scenes(args.dataset_path)
+    scene_dirs = [os.path.join(args.dataset_path, name) for name in scenes]
+    mesh_names = [args.mesh_name] * len(scene_dirs)
+    start = time.perf_counter()
+    if args.workers <= 1 or len(scene_dirs) <= 1:
+        results = map(process_scene, scene_dirs, mesh_names)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=args.workers)
+        results = executor.map(process_scene, scene_dirs, mesh_names)
+
+    failed = []
+    pairs = 0
+    try:
+        for result in results:
+            if result['status'] == 'error':
+                failed.append(result['scene'])
+                print(f'{result["scene"]}: 出错 {result["error"]}')
+                if args.verbose:
+                    print(result['traceback'])
+            elif result['status'] == 'ok':
+                pairs += result['pairs']
+                note = '已更新' if result['written'] else '无变化'
+                skipped = f', {result["skipped_pairs"]} 对缺少实例' if result['skipped_pairs'] else ''
+                print(f'{result["scene"]}: {result["pairs"]} 对{skipped}, {note}, {result["seconds"]:.2f}s')
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    elapsed = time.perf_counter() - start
+    print(f'完成: {len(scene_dirs)} 个场景, {pairs} 对实例, 失败 {len(failed)}, 耗时 {elapsed:.1f}s '
+          f'({pairs / max(elapsed, 1e-9):.0f} 对/s)')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,263 @@
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# 每个阶段读取的输入文件，用于计算MB/s
+STAGE_INPUTS = {
+    'preprocess': ['segments_anno.json'],
+    'stats': ['mesh_aligned_0.05.ply', 'instance.npy', 'segments_anno.json'],
+    'bundle': ['mesh_aligned_0.05.ply', 'instance.npy'],
+    'codec': ['mesh_aligned_0.05.ply', 'instance.npy'],
+    'convert': ['segments_anno.json', '{scene}_annotations.json', '{scene}_abs_annotations.json'],
+}
+STAGES = list(STAGE_INPUTS)
+STAGE_MODULES = {
+    'preprocess': ['data_preprocess'],
+    'stats': ['instance_stats', 'scene_data'],
+    'bundle': ['scene_bundle'],
+    'codec': ['scene_codec'],
+    'convert': ['process_raw_annotation'],
+}
+
+
+def reference_process_annotation(annotation, label_index):
+    """重构前 process_annotation 的逐条实现，作为批量改写的对照"""
+    object_ids = annotation.get("object_ids", [])
+    object_names = [label_index.get(obj_id, "unknown") for obj_id in object_ids]
+    original_text = annotation.get("full_text", annotation.get("description", ""))
+    if "#" in original_text:
+        description = re.sub(r'\s*\[\d+\]', '', original_text)
+    else:
+        description = re.sub(r'\s*\[\d+\]', '', original_text)
+        if description and not description[-1] in ['.', '?', '!']:
+            if not any(obj_name in description for obj_name in object_names):
+                object_names_formatted = ", ".join(f"[{name}]" for name in object_names)
+                description += " " + object_names_formatted
+    return {"object_id": object_ids, "object_name": object_names, "description": description}
+
+
+# 合成数据覆盖不到的边界情况：未知物体、空label、空描述、无object_ids、"#"、标点结尾、多空白
+REWRITE_EDGE_CASES = (
+    {1: 'chair', 2: '', 3: 'table lamp', 4: 'lamp'},
+    [
+        {'object_ids': [1, 99], 'full_text': '左边的 [1] [99]'},
+        {'object_ids': [2], 'full_text': '没有名字的物体 [2]'},
+        {'object_ids': [3], 'full_text': '桌上的lamp\t [3]'},
+        {'object_ids': [4], 'full_text': '桌上的table lamp [4]'},
+        {'object_ids': [], 'full_text': '什么都没有'},
+        {'object_ids': [1], 'full_text': ''},
+        {'object_ids': [1], 'description': '只有description [1]'},
+        {'object_ids': [1]},
+        {'object_ids': [1, 3], 'full_text': '[门口视角] 可以坐的东西是？# [1]'},
+        {'object_ids': [1], 'full_text': 'Which one is closest? [1]'},
+        {'object_ids': [1], 'full_text': 'Look at that![1] [12]'},
+        {'object_ids': [4], 'full_text': ' [4]'},
+        {'object_ids': [4], 'full_text': '[x] [ 4] [4a]'},
+    ],
+)
+
+
+def check_rewrite(scene_dirs, repeat=3):
+    """比较批量改写与逐条实现的输出是否逐字节相同，并比较吞吐量"""
+    import process_raw_annotation as pra
+    corpus = [REWRITE_EDGE_CASES]
+    for scene_dir in scene_dirs:
+        scene = os.path.basename(scene_dir)
+        path = os.path.join(scene_dir, f'{scene}_annotations.json')
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                annotations = json.load(f)
+            corpus.append((pra.load_label_index(os.path.join(scene_dir, 'segments_anno.json')), annotations))
+
+    mismatches = 0
+    for label_index, annotations in corpus:
+        expected = json.dumps([reference_process_annotation(a, label_index) for a in annotations],
+                              ensure_ascii=False, indent=4)
+        actual = json.dumps(pra.process_annotations(annotations, label_index), ensure_ascii=False, indent=4)
+        mismatches += expected != actual
+
+    def best_time(fn):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for label_index, annotations in corpus:
+                fn(annotations, label_index)
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    count = sum(len(annotations) for _, annotations in corpus)
+    reference = best_time(lambda annotations, label_index: [reference_process_annotation(a, label_index)
+                                                            for a in annotations])
+    batched = best_time(pra.process_annotations)
+    result = {
+        'corpora': len(corpus),
+        'annotations': count,
+        'mismatches': mismatches,
+        'reference_per_sec': count / reference if reference > 0 else None,
+        'batched_per_sec': count / batched if batched > 0 else None,
+    }
+    print(f'描述改写: {count} 条标注, {mismatches} 个场景输出不一致, '
+          f'逐条 {result["reference_per_sec"] or 0:.0f} 条/s, 批量 {result["batched_per_sec"] or 0:.0f} 条/s')
+    return result
+
+
+def run_stage_scene(stage, scene_dir):
+    if stage == 'preprocess':
+        from data_preprocess import process_scene
+        process_scene(scene_dir)
+    elif stage == 'stats':
+        from instance_stats import write_scene_stats
+        from scene_data import load_instance_index
+        index = load_instance_index(os.path.join(scene_dir, 'instance.npy'))
+        write_scene_stats(scene_dir, index, os.path.join(scene_dir, 'mesh_aligned_0.05.ply'),
+                          os.path.join(scene_dir, 'segments_anno.json'))
+    elif stage == 'bundle':
+        from scene_bundle import build_scene_bundle
+        build_scene_bundle(scene_dir, os.path.join(scene_dir, 'mesh_aligned_0.05.ply'))
+    elif stage == 'codec':
+        from scene_codec import encode_scene_dir
+        encode_scene_dir(scene_dir, 'mesh_aligned_0.05.ply', 'zlib', 1 << 18)
+    elif stage == 'convert':
+        from process_raw_annotation import process_scene
+        result = process_scene(scene_dir)
+        if result['status'] == 'error':
+            raise RuntimeError(result['error'])
+    else:
+        raise ValueError(f'未知阶段: {stage}')
+
+
+def run_stage(stage, scene_dirs):
+    """在独立的子进程中运行，返回 (耗时秒数, 峰值RSS MB)"""
+    # 先导入依赖，避免把模块导入时间计入阶段耗时
+    for module in STAGE_MODULES[stage]:
+        __import__(module)
+    start = time.perf_counter()
+    for scene_dir in scene_dirs:
+        run_stage_scene(stage, scene_dir)
+    seconds = time.perf_counter() - start
+    # Linux 上 ru_maxrss 单位为KB，macOS 上为字节
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_mb = peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+    return seconds, peak_mb
+
+
+def input_bytes(stage, scene_dirs):
+    total = 0
+    for scene_dir in scene_dirs:
+        scene = os.path.basename(scene_dir)
+        for name in STAGE_INPUTS[stage]:
+            path = os.path.join(scene_dir, name.format(scene=scene))
+            if os.path.exists(path):
+                total += os.path.getsize(path)
+    return total
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(scene_dirs, stages):
+    """依次运行各阶段，每个阶段使用全新的spawn子进程以获得独立的峰值RSS"""
+    context = multiprocessing.get_context('spawn')
+    results = {}
+    for stage in stages:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            seconds, peak_mb = executor.submit(run_stage, stage, scene_dirs).result()
+        size = input_bytes(stage, scene_dirs)
+        results[stage] = {
+            'scenes': len(scene_dirs),
+            'seconds': seconds,
+            'scenes_per_sec': len(scene_dirs) / seconds if seconds > 0 else None,
+            'input_mb': size / 2**20,
+            'mb_per_sec': size / 2**20 / seconds if seconds > 0 else None,
+            'peak_rss_mb': peak_mb,
+        }
+        print(f'{stage:<12}{seconds:>9.3f}s{results[stage]["scenes_per_sec"] or 0:>10.2f} 场景/s'
+              f'{results[stage]["mb_per_sec"] or 0:>10.1f} MB/s{peak_mb:>10.1f} MB RSS')
+    return results
+
+
+def print_comparison(current, baseline):
+    print(f'\n与 {baseline.get("commit") or "基线"} 比较 (耗时比, <1 表示更快):')
+    for stage, result in current['stages'].items():
+        old = baseline.get('stages', {}).get(stage)
+        if old and old.get('seconds'):
+            print(f'  {stage:<12}{result["seconds"] / old["seconds"]:>8.2f}x  '
+                  f'RSS {result["peak_rss_mb"] - old["peak_rss_mb"]:+.1f} MB')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='预处理与标注转换各阶段的吞吐量基准测试')
+    parser.add_argument('--root', default=None,
+                        help='数据目录；配合 --generate 时生成到此目录 (默认: ./bench_data)')
+    parser.add_argument('--generate', type=int, default=0, help='先生成指定数量的合成场景')
+    parser.add_argument('--vertices', type=int, default=200000, help='合成场景的顶点数')
+    parser.add_argument('--instances', type=int, default=100, help='合成场景的实例数')
+    parser.add_argument('--segments-per-group', type=int, default=None, help='合成场景每个segGroup的segments长度')
+    parser.add_argument('--annotations', type=int, default=50, help='合成场景的常规标注数')
+    parser.add_argument('--abs-annotations', type=int, default=20, help='合成场景的距离标注数')
+    parser.add_argument('--seed', type=int, default=0, help='合成场景随机种子')
+    parser.add_argument('--stages', nargs='*', choices=STAGES, default=STAGES, help='要测试的阶段')
+    parser.add_argument('--check-rewrite', action='store_true',
+                        help='检查批量描述改写与逐条实现的输出逐字节相同，并比较吞吐量')
+    parser.add_argument('--output', default='benchmark_results.json', help='结果JSON路径')
+    parser.add_argument('--compare', default=None, help='与之前的结果JSON比较')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    root = args.root or os.path.join(os.getcwd(), 'bench_data')
+    config = {'root': root}
+
+    if args.generate:
+        from synthetic_scenes import generate_dataset
+        config.update({'generate': args.generate, 'vertices': args.vertices, 'instances': args.instances,
+                       'segments_per_group': args.segments_per_group, 'annotations': args.annotations,
+                       'abs_annotations': args.abs_annotations, 'seed': args.seed})
+        start = time.perf_counter()
+        scene_dirs = generate_dataset(root, args.generate, seed=args.seed, num_vertices=args.vertices,
+                                      num_instances=args.instances, segments_per_group=args.segments_per_group,
+                                      num_annotations=args.annotations, num_abs_annotations=args.abs_annotations)
+        print(f'已生成 {len(scene_dirs)} 个合成场景 ({time.perf_counter() - start:.1f}s)')
+    else:
+        from data_preprocess import list_scenes
+        scene_dirs = [os.path.join(root, name) for name in list_scenes(root)]
+
+    results = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': config,
+        'stages': run_benchmark(scene_dirs, args.stages),
+    }
+    if args.check_rewrite:
+        results['rewrite'] = check_rewrite(scene_dirs)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=4)
+    print(f'结果已保存到 {args.output}')
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            print_comparison(results, json.load(f))
+    if args.check_rewrite and results['rewrite']['mismatches']:
+        print('错误: 批量改写的输出与逐条实现不一致')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,17 +1,280 @@
-import os
-import json
-import open3d as o3d
-import numpy as np
-
-dataset_path = 'your/path/to/dataset' #CHANGE HERE
-
-for i in os.listdir(dataset_path):
-    name = i
-    with open(f'{dataset_path}/{name}/segments_anno.json', 'r') as f:
-        a = json.load(f)
-    pcd = o3d.io.read_point_cloud(f'{dataset_path}/{name}/mesh_aligned_0.05.ply')
-    points = np.asarray(pcd.points)
-    mask = np.zeros((points.shape[0]))
-    for seg in a['segGroups']:
-        mask[np.array(seg['segments'])] = seg['objectId']
-    np.save(f'{dataset_path}/{name}/instance.npy', mask)
+import os
+import sys
+import time
+import argparse
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from ply_io import read_ply_header
+from segments_io import iter_seg_groups
+from stage_timing import (StageTimer, Profiled, file_size, format_stages, merge_profiles, merge_stages,
+                          prepare_profile_dir)
+from scene_data import (INSTANCE_FILE, INSTANCE_STATS_FILE, InstanceIndex, instance_dtype,
+                        instance_index_path, instance_meta_path, save_instance_mask, write_json_atomic)
+
+MESH_FILE = 'mesh_aligned_0.05.ply'
+SEGMENTS_FILE = 'segments_anno.json'
+
+# 多个segGroup占用同一顶点时的处理策略
+#   last:     按segGroups顺序，后出现的实例获胜 (与逐组赋值的旧行为一致)
+#   first:    先出现的实例获胜
+#   smallest: 顶点数最少的实例获胜，相同时后出现的获胜
+OVERLAP_POLICIES = ('last', 'first', 'smallest')
+
+
+def list_scenes(dataset_path):
+    """列出数据集目录下的所有场景文件夹（按名称排序）"""
+    return sorted(name for name in os.listdir(dataset_path)
+                  if os.path.isdir(os.path.join(dataset_path, name)))
+
+
+def is_up_to_date(scene_dir, with_stats=False):
+    """instance.npy 比 mesh 和 segments_anno.json 都新时无需重新生成
+
+    缺少元数据文件的旧格式掩码视为过期，以便重新生成为整数格式；CSR索引缺失或比掩码旧时同样过期。
+    with_stats 时还要求实例统计表同样是最新的。
+    """
+    mask_path = os.path.join(scene_dir, INSTANCE_FILE)
+    outputs = [mask_path, instance_meta_path(mask_path), instance_index_path(mask_path)]
+    if with_stats:
+        outputs.append(os.path.join(scene_dir, INSTANCE_STATS_FILE))
+    try:
+        if os.stat(instance_index_path(mask_path)).st_mtime_ns < os.stat(mask_path).st_mtime_ns:
+            return False
+        instance_mtime = min(os.stat(path).st_mtime_ns for path in outputs)
+        mesh_mtime = os.stat(os.path.join(scene_dir, MESH_FILE)).st_mtime_ns
+        segments_mtime = os.stat(os.path.join(scene_dir, SEGMENTS_FILE)).st_mtime_ns
+    except FileNotFoundError:
+        return False
+    return instance_mtime > mesh_mtime and instance_mtime > segments_mtime
+
+
+def count_vertices(mesh_path):
+    """只读PLY头部得到顶点数；头部异常时退回用Open3D完整解码"""
+    try:
+        return read_ply_header(mesh_path).vertex_count
+    except ValueError:
+        import open3d as o3d
+        pcd = o3d.io.read_point_cloud(mesh_path)
+        return np.asarray(pcd.points).shape[0]
+
+
+def build_instance_mask(seg_groups, num_vertices, overlap_policy='last'):
+    """一次性拼接所有segments并一次散射写入掩码
+
+    返回 (mask, overlap)，overlap 记录被不同objectId同时占用的顶点数以及涉及的实例。
+    """
+    if overlap_policy not in OVERLAP_POLICIES:
+        raise ValueError(f'未知的重叠处理策略: {overlap_policy}')
+
+    # segments 可以是列表或 iter_seg_groups 产生的int64数组
+    segments = [np.asarray(seg['segments'], dtype=np.int64) for seg in seg_groups]
+    lengths = np.fromiter((len(s) for s in segments), dtype=np.int64, count=len(segments))
+    group_ids = np.fromiter((seg['objectId'] for seg in seg_groups),
+                            dtype=np.int64, count=len(seg_groups))
+    vertex_ids = np.concatenate(segments) if segments else np.empty(0, dtype=np.int64)
+    del segments
+    object_ids = np.repeat(group_ids, lengths)
+
+    min_id = min(0, int(group_ids.min(initial=0)))
+    mask = np.zeros((num_vertices), dtype=instance_dtype(min_id, int(group_ids.max(initial=0))))
+    overlap = {'vertices': 0, 'object_ids': []}
+    if vertex_ids.size == 0:
+        return mask, overlap
+    if vertex_ids.min() < 0 or vertex_ids.max() >= num_vertices:
+        raise ValueError(f'segments中的顶点索引超出范围 [0, {num_vertices})')
+
+    counts = np.bincount(vertex_ids, minlength=num_vertices)
+    if counts.max() <= 1:
+        mask[vertex_ids] = object_ids
+        return mask, overlap
+
+    # 只对被多次声明的顶点排序决胜，其余顶点直接写入
+    shared = counts[vertex_ids] > 1
+    mask[vertex_ids[~shared]] = object_ids[~shared]
+
+    group_rank = np.repeat(np.arange(len(seg_groups)), lengths)[shared]
+    shared_vertices = vertex_ids[shared]
+    shared_objects = object_ids[shared]
+    if overlap_policy == 'last':
+        order = np.lexsort((group_rank, shared_vertices))
+    elif overlap_policy == 'first':
+        order = np.lexsort((-group_rank, shared_vertices))
+    else:
+        sizes = np.repeat(lengths, lengths)[shared]
+        order = np.lexsort((group_rank, -sizes, shared_vertices))
+
+    # 排序后每个顶点连续一段，段内最后一个即获胜者
+    sorted_vertices = shared_vertices[order]
+    sorted_objects = shared_objects[order]
+    starts = np.flatnonzero(np.r_[True, sorted_vertices[1:] != sorted_vertices[:-1]])
+    ends = np.r_[starts[1:], sorted_vertices.size] - 1
+    mask[sorted_vertices[ends]] = sorted_objects[ends]
+
+    conflicted = (np.minimum.reduceat(sorted_objects, starts)
+                  != np.maximum.reduceat(sorted_objects, starts))
+    if conflicted.any():
+        run = np.repeat(conflicted, ends - starts + 1)
+        overlap['vertices'] = int(conflicted.sum())
+        overlap['object_ids'] = np.unique(sorted_objects[run]).tolist()
+    return mask, overlap
+
+
+def process_scene(scene_dir, overlap_policy='last', with_stats=False, timer=None):
+    """为单个场景生成 instance.npy 及其CSR索引，返回顶点数和重叠信息
+
+    with_stats 时同时生成实例统计表 instance_stats.npy；传入 timer (StageTimer) 时记录各阶段耗时和读写量。
+    """
+    timer = timer or StageTimer()
+    segments_path = os.path.join(scene_dir, SEGMENTS_FILE)
+    mesh_path = os.path.join(scene_dir, MESH_FILE)
+    mask_path = os.path.join(scene_dir, INSTANCE_FILE)
+    index_path = instance_index_path(mask_path)
+
+    # 流式读取，segments直接转换为数组，避免构造大量Python int
+    with timer.stage('read_segments', bytes_read=file_size(segments_path)):
+        seg_groups = list(iter_seg_groups(segments_path))
+    timer.add('read_segments', records=len(seg_groups), calls=0)
+    with timer.stage('count_vertices'):
+        num_vertices = count_vertices(mesh_path)
+    with timer.stage('build_mask', records=num_vertices):
+        mask, overlap = build_instance_mask(seg_groups, num_vertices, overlap_policy)
+    with timer.stage('write_mask'):
+        save_instance_mask(mask_path, mask)
+    timer.add('write_mask', bytes_written=file_size(mask_path) + file_size(instance_meta_path(mask_path)), calls=0)
+    with timer.stage('build_index', records=num_vertices):
+        index = InstanceIndex.build(mask)
+    with timer.stage('write_index'):
+        index.save(index_path)
+    timer.add('write_index', bytes_written=file_size(index_path), calls=0)
+    if with_stats:
+        from instance_stats import write_scene_stats
+        with timer.stage('stats', bytes_read=file_size(mesh_path)):
+            count = write_scene_stats(scene_dir, index, mesh_path, segments_path)
+        timer.add('stats', records=count, bytes_written=file_size(os.path.join(scene_dir, INSTANCE_STATS_FILE)),
+                  calls=0)
+    return num_vertices, overlap
+
+
+def run_scene(scene_dir, overlap_policy='last', with_stats=False):
+    """在工作进程中处理一个场景，任何异常都只影响该场景"""
+    start = time.perf_counter()
+    timer = StageTimer()
+    result = {'scene': os.path.basename(scene_dir), 'status': 'ok'}
+    try:
+        result['num_vertices'], result['overlap'] = process_scene(scene_dir, overlap_policy, with_stats, timer)
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = f'{type(e).__name__}: {e}'
+        result['traceback'] = traceback.format_exc()
+    result['seconds'] = time.perf_counter() - start
+    result['stages'] = timer.as_dict()
+    return result
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='为数据集中的每个场景生成 instance.npy 实例掩码')
+    parser.add_argument('dataset_path', help='数据集目录，每个子文件夹为一个场景')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1,
+                        help='并行工作进程数 (默认: CPU核数)')
+    parser.add_argument('--force', action='store_true',
+                        help='忽略时间戳，重新生成所有场景')
+    parser.add_argument('--scenes', nargs='+', default=None,
+                        help='只处理指定的场景')
+    parser.add_argument('--overlap-policy', choices=OVERLAP_POLICIES, default='last',
+                        help='多个实例占用同一顶点时的处理策略 (默认: last，与旧版本一致)')
+    parser.add_argument('--stats', action='store_true',
+                        help='同时生成实例统计表 instance_stats.npy (质心、AABB、OBB、顶点数、label)')
+    parser.add_argument('--report', default=None,
+                        help='把每个场景及全局的分阶段耗时、读写字节数和记录数写入此JSON文件')
+    parser.add_argument('--profile', default=None, metavar='DIR',
+                        help='用cProfile运行，每个工作进程的结果写入 DIR/worker-<pid>.pstats 并合并为 combined.pstats')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='出错时打印完整堆栈')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    scenes = args.scenes if args.scenes else list_scenes(args.dataset_path)
+    pending = []
+    skipped = 0
+    for name in scenes:
+        scene_dir = os.path.join(args.dataset_path, name)
+        if not args.force and is_up_to_date(scene_dir, args.stats):
+            skipped += 1
+        else:
+            pending.append(scene_dir)
+
+    print(f'共 {len(scenes)} 个场景: 需处理 {len(pending)} 个, 跳过 {skipped} 个已是最新的场景')
+
+    start = time.perf_counter()
+    results = []
+
+    def report(result):
+        results.append(result)
+        prefix = f'[{len(results)}/{len(pending)}] {result["scene"]}'
+        if result['status'] == 'ok':
+            print(f'{prefix}: {result["num_vertices"]} 个顶点, {result["seconds"]:.2f}s')
+            overlap = result['overlap']
+            if overlap['vertices']:
+                ids = overlap['object_ids']
+                shown = ', '.join(str(i) for i in ids[:10]) + (' ...' if len(ids) > 10 else '')
+                print(f'  警告: {overlap["vertices"]} 个顶点被多个实例占用 '
+                      f'(策略: {args.overlap_policy})，涉及实例: {shown}')
+        else:
+            print(f'{prefix}: 出错 {result["error"]}')
+            if args.verbose:
+                print(result['traceback'])
+
+    task = run_scene
+    if args.profile:
+        prepare_profile_dir(args.profile)
+        task = Profiled(run_scene, args.profile)
+
+    if args.workers <= 1 or len(pending) <= 1:
+        for scene_dir in pending:
+            report(task(scene_dir, args.overlap_policy, args.stats))
+    else:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            futures = [executor.submit(task, scene_dir, args.overlap_policy, args.stats) for scene_dir in pending]
+            for future in as_completed(futures):
+                report(future.result())
+
+    elapsed = time.perf_counter() - start
+    failed = sorted(r['scene'] for r in results if r['status'] != 'ok')
+    done = len(results) - len(failed)
+    total_vertices = sum(r.get('num_vertices', 0) for r in results)
+    rate = done / elapsed if elapsed > 0 else 0.0
+
+    print(f'完成: 成功 {done}, 失败 {len(failed)}, 跳过 {skipped}, '
+          f'耗时 {elapsed:.1f}s, {rate:.2f} 场景/s, {total_vertices / max(elapsed, 1e-9):.0f} 顶点/s')
+    if args.report:
+        total = {}
+        for r in results:
+            merge_stages(total, r['stages'])
+        write_json_atomic(args.report, {
+            'seconds': elapsed,
+            'total': total,
+            'scenes': {r['scene']: {'status': r['status'], 'seconds': r['seconds'], 'stages': r['stages']}
+                       for r in sorted(results, key=lambda r: r['scene'])},
+        }, indent=1)
+        print(format_stages(total))
+        print(f'分阶段报告已保存到 {args.report}')
+    if args.profile:
+        combined = merge_profiles(args.profile)
+        if combined:
+            print(f'profile已保存到 {combined} (python -m pstats {combined})')
+    if failed:
+        print('失败的场景 (重新运行将只处理这些及过期的场景):')
+        for name in failed:
+            print(f'  {name}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+import os
+
+import numpy as np
+
+from ply_io import read_ply_positions
+from segments_io import iter_seg_groups
+from scene_data import INSTANCE_STATS_FILE, save_npy_atomic
+
+
+def read_mesh_positions(mesh_path):
+    """读取mesh顶点坐标，PLY头部异常时退回Open3D"""
+    try:
+        return read_ply_positions(mesh_path)
+    except ValueError:
+        import open3d as o3d
+        return np.asarray(o3d.io.read_point_cloud(mesh_path).points)
+
+
+def read_labels(segments_path):
+    """objectId → label，同一objectId以第一个segGroup为准"""
+    labels = {}
+    for group in iter_seg_groups(segments_path, skip_segments=True):
+        labels.setdefault(group.get('objectId'), group.get('label', 'unknown'))
+    return labels
+
+
+def stats_dtype(label_width):
+    return np.dtype([
+        ('id', '<i8'),
+        ('label', f'<U{max(label_width, 1)}'),
+        ('vertex_count', '<i8'),
+        ('centroid', '<f4', (3,)),
+        ('aabb_min', '<f4', (3,)),
+        ('aabb_max', '<f4', (3,)),
+        ('obb_center', '<f4', (3,)),
+        ('obb_R', '<f4', (3, 3)),  # 列向量为包围盒的三个轴，与Open3D OrientedBoundingBox.R一致
+        ('obb_extent', '<f4', (3,)),
+    ])
+
+
+def compute_instance_stats(positions, index, labels):
+    """利用CSR索引一次性计算每个实例的质心、AABB、OBB (PCA) 和顶点数
+
+    背景 (ID 0) 不计入统计表。
+    """
+    keep = index.ids != 0
+    ids = index.ids[keep]
+    counts = index.counts()[keep]
+    starts = index.offsets[:-1][keep]
+
+    names = [str(labels.get(int(i), 'unknown')) for i in ids]
+    table = np.zeros(ids.shape[0], dtype=stats_dtype(max((len(n) for n in names), default=1)))
+    table['id'] = ids
+    table['label'] = names
+    table['vertex_count'] = counts
+    if ids.shape[0] == 0:
+        return table
+
+    # 只保留非背景顶点，按实例连续排列
+    order = np.concatenate([index.vertices[s:s + c] for s, c in zip(starts, counts)])
+    points = positions[order]
+    group_starts = np.r_[0, np.cumsum(counts)[:-1]]
+
+    centroid = np.add.reduceat(points, group_starts, axis=0) / counts[:, None]
+    table['centroid'] = centroid
+    table['aabb_min'] = np.minimum.reduceat(points, group_starts, axis=0)
+    table['aabb_max'] = np.maximum.reduceat(points, group_starts, axis=0)
+
+    # 协方差由中心化后的二阶矩得到，批量求特征向量
+    centered = points - np.repeat(centroid, counts, axis=0)
+    cov = np.empty((ids.shape[0], 3, 3))
+    for a in range(3):
+        for b in range(a, 3):
+            cov[:, a, b] = cov[:, b, a] = np.add.reduceat(centered[:, a] * centered[:, b],
+                                                          group_starts) / counts
+    _, axes = np.linalg.eigh(cov)
+    # eigh 的特征向量符号任意，翻转第三个轴使其成为右手系 (det = +1) 的旋转矩阵
+    axes[np.linalg.det(axes) < 0, :, 2] *= -1
+
+    for k, (start, count) in enumerate(zip(group_starts, counts)):
+        local = centered[start:start + count] @ axes[k]
+        low, high = local.min(axis=0), local.max(axis=0)
+        table['obb_center'][k] = centroid[k] + axes[k] @ ((low + high) / 2)
+        table['obb_extent'][k] = high - low
+    table['obb_R'] = axes
+    return table
+
+
+def write_scene_stats(scene_dir, index, mesh_path, segments_path):
+    """计算并保存一个场景的实例统计表，返回实例数"""
+    positions = read_mesh_positions(mesh_path)
+    if positions.shape[0] != index.num_vertices:
+        raise ValueError(f'mesh顶点数 ({positions.shape[0]}) 与实例掩码 ({index.num_vertices}) 不匹配')
+    table = compute_instance_stats(positions, index, read_labels(segments_path))
+    save_npy_atomic(os.path.join(scene_dir, INSTANCE_STATS_FILE), table)
+    return table.shape[0]
@@ -0,0 +1,100 @@
+import numpy as np
+
+# 点选代理的默认点数上限；顶点数不超过它的场景直接使用全分辨率
+DEFAULT_PICK_POINTS = 400000
+# 调整体素大小以满足点数上限的最大次数
+MAX_VOXEL_ITERATIONS = 6
+
+
+class PickingProxy:
+    """点选用的代理点云：代理点 i 对应原始顶点 vertex_ids[i]，属于实例 instance_ids[i]
+
+    voxel_size 为None时是全分辨率 (每个顶点一个代理点)。Open3D点云在第一次使用时
+    构建并缓存，之后的点选都复用同一个对象。
+    """
+
+    def __init__(self, vertex_ids, instance_ids, voxel_size=None):
+        self.vertex_ids = vertex_ids
+        self.instance_ids = instance_ids
+        self.voxel_size = voxel_size
+        self.point_cloud = None
+
+    def __len__(self):
+        return int(self.vertex_ids.shape[0])
+
+    @property
+    def nbytes(self):
+        total = int(self.vertex_ids.nbytes) + int(getattr(self.instance_ids, 'nbytes', 0))
+        if self.point_cloud is not None:
+            total += len(self) * 3 * 8 * 2  # float64 坐标和颜色
+        return total
+
+    def cloud(self, mesh):
+        """代理点的Open3D点云，坐标和颜色取自mesh (应在没有高亮时调用)"""
+        if self.point_cloud is None:
+            import open3d as o3d
+            pcd = o3d.geometry.PointCloud()
+            pcd.points = o3d.utility.Vector3dVector(np.asarray(mesh.vertices)[self.vertex_ids])
+            pcd.colors = o3d.utility.Vector3dVector(np.asarray(mesh.vertex_colors)[self.vertex_ids])
+            self.point_cloud = pcd
+        return self.point_cloud
+
+    def to_vertices(self, proxy_indices):
+        """把点选得到的代理点序号转换为原始顶点索引，越界的序号被忽略"""
+        return [int(self.vertex_ids[i]) for i in proxy_indices if 0 <= i < len(self)]
+
+    def to_instances(self, proxy_indices):
+        return [int(self.instance_ids[i]) for i in proxy_indices if 0 <= i < len(self)]
+
+
+def _voxel_representatives(positions, index, voxel_size):
+    """每个 (实例, 体素) 单元中取一个原始顶点 (组内索引最小者)，返回 (顶点索引, 实例序号)
+
+    单元按实例区分，所以再小的实例也至少保留一个点，且一个代理点不会跨实例。
+    """
+    order = index.vertices
+    ranks = np.repeat(np.arange(index.ids.shape[0], dtype=np.int64), index.counts())
+    points = positions[order]
+    cells = np.floor((points - points.min(axis=0)) / voxel_size).astype(np.int64)
+    dims = cells.max(axis=0) + 1
+    if float(index.ids.shape[0]) * float(np.prod(dims.astype(np.float64))) < 2.0 ** 62:
+        keys = ((ranks * dims[0] + cells[:, 0]) * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+        _, first = np.unique(keys, return_index=True)
+    else:
+        _, first = np.unique(np.column_stack([ranks, cells]), axis=0, return_index=True)
+    return order[first], ranks[first]
+
+
+def build_picking_proxy(positions, index, max_points=DEFAULT_PICK_POINTS):
+    """按实例感知的体素降采样构建点选代理，代理点数不超过 max_points (max_points为None时使用全分辨率)
+
+    mesh表面的点数大致与 (尺度/体素)^2 成正比，先按包围盒表面积估计体素大小，
+    点数仍超过上限时按比例放大体素重新采样。实例数本身超过上限时每个实例只保留一个点。
+    """
+    num_vertices = positions.shape[0]
+    if num_vertices != index.num_vertices:
+        raise ValueError(f'mesh顶点数 ({num_vertices}) 与实例掩码 ({index.num_vertices}) 不匹配')
+    if max_points is None or num_vertices <= max_points:
+        vertex_ids = np.arange(num_vertices, dtype=index.vertices.dtype)
+        instance_ids = np.empty(num_vertices, dtype=index.ids.dtype)
+        instance_ids[index.vertices] = np.repeat(index.ids, index.counts())
+        return PickingProxy(vertex_ids, instance_ids)
+
+    extent = positions.max(axis=0) - positions.min(axis=0)
+    area = 2.0 * (extent[0] * extent[1] + extent[1] * extent[2] + extent[0] * extent[2])
+    voxel_size = max(float(np.sqrt(area / max_points)), 1e-6)
+    for _ in range(MAX_VOXEL_ITERATIONS):
+        vertex_ids, ranks = _voxel_representatives(positions, index, voxel_size)
+        if vertex_ids.shape[0] <= max(max_points, index.ids.shape[0]):
+            break
+        voxel_size *= float(np.sqrt(vertex_ids.shape[0] / max_points)) * 1.05
+    return PickingProxy(vertex_ids, index.ids[ranks], voxel_size)
+
+
+def scene_picking_proxy(session, max_points=DEFAULT_PICK_POINTS):
+    """场景会话的点选代理，按点数上限缓存在会话中，每个场景只构建一次"""
+    mesh = session.mesh()
+    if max_points is not None and len(mesh.vertices) <= max_points:
+        max_points = None  # 小场景的降采样结果就是全分辨率，共用同一个缓存
+    return session.derived(('picking_proxy', max_points),
+                           lambda: build_picking_proxy(np.asarray(mesh.vertices), session.instance_index, max_points))
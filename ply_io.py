@@ -0,0 +1,233 @@
+import os
+
+import numpy as np
+
+# PLY属性类型到numpy类型的映射
+PLY_TYPES = {
+    'char': 'i1', 'int8': 'i1',
+    'uchar': 'u1', 'uint8': 'u1',
+    'short': 'i2', 'int16': 'i2',
+    'ushort': 'u2', 'uint16': 'u2',
+    'int': 'i4', 'int32': 'i4',
+    'uint': 'u4', 'uint32': 'u4',
+    'float': 'f4', 'float32': 'f4',
+    'double': 'f8', 'float64': 'f8',
+}
+
+SUPPORTED_FORMATS = ('ascii', 'binary_little_endian')
+
+# 头部最大长度，超过视为异常文件
+MAX_HEADER_BYTES = 1 << 20
+
+
+class PlyElement:
+    """PLY头部中的一个element声明"""
+
+    def __init__(self, name, count):
+        self.name = name
+        self.count = count
+        # (属性名, numpy类型) 或 (属性名, (长度类型, 元素类型)) 表示list属性
+        self.properties = []
+
+    @property
+    def has_list(self):
+        return any(isinstance(t, tuple) for _, t in self.properties)
+
+    def dtype(self):
+        """定长element的二进制(小端)记录类型，含list属性时返回None"""
+        if self.has_list:
+            return None
+        return np.dtype([(name, '<' + t) for name, t in self.properties])
+
+
+class PlyHeader:
+    """只解析PLY头部得到的信息，不读取任何顶点数据"""
+
+    def __init__(self, path, format, header_size, elements):
+        self.path = path
+        self.format = format
+        self.header_size = header_size
+        self.elements = elements
+
+    def element(self, name):
+        for element in self.elements:
+            if element.name == name:
+                return element
+        return None
+
+    @property
+    def vertex_count(self):
+        return self.element('vertex').count
+
+    @property
+    def vertex_dtype(self):
+        """顶点记录的字节布局 (仅二进制格式有意义)"""
+        return self.element('vertex').dtype()
+
+    @property
+    def vertex_offset(self):
+        """二进制文件中顶点数据的起始字节偏移，无法确定时返回None"""
+        if self.format != 'binary_little_endian':
+            return None
+        offset = self.header_size
+        for element in self.elements:
+            if element.name == 'vertex':
+                return offset
+            dtype = element.dtype()
+            if dtype is None:
+                return None
+            offset += dtype.itemsize * element.count
+        return None
+
+
+def read_ply_header(path):
+    """读取PLY文件头部，返回PlyHeader；头部异常时抛出ValueError"""
+    with open(path, 'rb') as f:
+        magic = f.readline()
+        if magic.strip() != b'ply':
+            raise ValueError(f'{path} 不是PLY文件')
+
+        format = None
+        elements = []
+        while True:
+            line = f.readline()
+            if not line:
+                raise ValueError(f'{path} 的PLY头部没有end_header')
+            if f.tell() > MAX_HEADER_BYTES:
+                raise ValueError(f'{path} 的PLY头部过长')
+
+            words = line.decode('ascii', errors='replace').split()
+            if not words or words[0] in ('comment', 'obj_info'):
+                continue
+            keyword = words[0]
+
+            if keyword == 'end_header':
+                break
+            elif keyword == 'format':
+                if len(words) != 3 or words[1] not in SUPPORTED_FORMATS:
+                    raise ValueError(f'{path} 的PLY格式不受支持: {" ".join(words[1:])}')
+                format = words[1]
+            elif keyword == 'element':
+                if len(words) != 3 or not words[2].isdigit():
+                    raise ValueError(f'{path} 的element声明异常: {line!r}')
+                elements.append(PlyElement(words[1], int(words[2])))
+            elif keyword == 'property':
+                if not elements:
+                    raise ValueError(f'{path} 的property出现在element之前')
+                if len(words) == 5 and words[1] == 'list':
+                    if words[2] not in PLY_TYPES or words[3] not in PLY_TYPES:
+                        raise ValueError(f'{path} 的list属性类型未知: {line!r}')
+                    elements[-1].properties.append((words[4], (PLY_TYPES[words[2]], PLY_TYPES[words[3]])))
+                elif len(words) == 3 and words[1] in PLY_TYPES:
+                    elements[-1].properties.append((words[2], PLY_TYPES[words[1]]))
+                else:
+                    raise ValueError(f'{path} 的property声明异常: {line!r}')
+            else:
+                raise ValueError(f'{path} 的PLY头部包含未知关键字: {keyword}')
+
+        header_size = f.tell()
+
+    if format is None:
+        raise ValueError(f'{path} 的PLY头部缺少format')
+    header = PlyHeader(path, format, header_size, elements)
+    if header.element('vertex') is None:
+        raise ValueError(f'{path} 没有vertex element')
+
+    # 二进制文件检查大小是否足以容纳声明的顶点，防止头部与数据不一致
+    offset = header.vertex_offset
+    dtype = header.vertex_dtype
+    if offset is not None and dtype is not None:
+        if os.path.getsize(path) < offset + dtype.itemsize * header.vertex_count:
+            raise ValueError(f'{path} 的文件大小小于头部声明的顶点数据')
+    return header
+
+
+def read_ply_positions(path, header=None):
+    """读取顶点坐标 (N, 3)；二进制文件直接内存映射顶点块，不解码颜色和面
+
+    无法按头部布局读取时抛出ValueError，调用方可退回Open3D。
+    """
+    if header is None:
+        header = read_ply_header(path)
+    vertex = header.element('vertex')
+    names = [name for name, _ in vertex.properties]
+    if not all(axis in names for axis in ('x', 'y', 'z')):
+        raise ValueError(f'{path} 的顶点缺少x/y/z属性')
+
+    if header.format == 'binary_little_endian':
+        offset = header.vertex_offset
+        dtype = header.vertex_dtype
+        if offset is None or dtype is None:
+            raise ValueError(f'{path} 的顶点数据布局无法确定')
+        records = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(vertex.count,))
+        positions = np.empty((vertex.count, 3), dtype=np.float64)
+        for i, axis in enumerate(('x', 'y', 'z')):
+            positions[:, i] = records[axis]
+        return positions
+
+    # ASCII: 每个element实例占一行，跳过vertex之前的element
+    if vertex.has_list:
+        raise ValueError(f'{path} 的顶点包含list属性')
+    skip = 0
+    for element in header.elements:
+        if element.name == 'vertex':
+            break
+        skip += element.count
+    columns = [names.index(axis) for axis in ('x', 'y', 'z')]
+    with open(path, 'rb') as f:
+        f.seek(header.header_size)
+        positions = np.loadtxt(f, dtype=np.float64, skiprows=skip, max_rows=vertex.count,
+                               usecols=columns, ndmin=2)
+    if positions.shape[0] != vertex.count:
+        raise ValueError(f'{path} 的顶点行数与头部不一致')
+    return positions
+
+
+def read_ply_mesh(path):
+    """读取二进制三角网格，返回包含以下数组的dict:
+    positions float32 (N, 3)、colors uint8 (N, 3) 或None、normals float32 (N, 3) 或None、triangles int32 (M, 3)
+
+    仅支持vertex在前、face全部为三角形的binary_little_endian文件，否则抛出ValueError。
+    """
+    header = read_ply_header(path)
+    if header.format != 'binary_little_endian':
+        raise ValueError(f'{path} 不是二进制PLY')
+    names = [element.name for element in header.elements]
+    if names[:1] != ['vertex'] or any(name not in ('vertex', 'face') for name in names):
+        raise ValueError(f'{path} 的element布局不受支持: {names}')
+
+    vertex = header.element('vertex')
+    vertex_dtype = header.vertex_dtype
+    if vertex_dtype is None:
+        raise ValueError(f'{path} 的顶点包含list属性')
+    records = np.memmap(path, dtype=vertex_dtype, mode='r', offset=header.header_size,
+                        shape=(vertex.count,))
+    positions = np.empty((vertex.count, 3), dtype=np.float32)
+    for i, axis in enumerate(('x', 'y', 'z')):
+        positions[:, i] = records[axis]
+    mesh = {'positions': positions, 'colors': None, 'normals': None}
+    if all(c in vertex_dtype.names for c in ('red', 'green', 'blue')):
+        mesh['colors'] = np.empty((vertex.count, 3), dtype=np.uint8)
+        for i, channel in enumerate(('red', 'green', 'blue')):
+            mesh['colors'][:, i] = records[channel]
+    if all(n in vertex_dtype.names for n in ('nx', 'ny', 'nz')):
+        mesh['normals'] = np.empty((vertex.count, 3), dtype=np.float32)
+        for i, axis in enumerate(('nx', 'ny', 'nz')):
+            mesh['normals'][:, i] = records[axis]
+
+    face = header.element('face')
+    if face is None or face.count == 0:
+        mesh['triangles'] = np.zeros((0, 3), dtype=np.int32)
+        return mesh
+    if len(face.properties) != 1 or not isinstance(face.properties[0][1], tuple):
+        raise ValueError(f'{path} 的face属性不受支持')
+    count_type, index_type = face.properties[0][1]
+    face_dtype = np.dtype([('n', '<' + count_type), ('v', '<' + index_type, (3,))])
+    face_offset = header.header_size + vertex_dtype.itemsize * vertex.count
+    if os.path.getsize(path) < face_offset + face_dtype.itemsize * face.count:
+        raise ValueError(f'{path} 的face数据不完整或不全是三角形')
+    faces = np.memmap(path, dtype=face_dtype, mode='r', offset=face_offset, shape=(face.count,))
+    if not np.all(faces['n'] == 3):
+        raise ValueError(f'{path} 包含非三角形的面')
+    mesh['triangles'] = np.ascontiguousarray(faces['v'], dtype=np.int32)
+    return mesh
@@ -1,60 +1,96 @@
 import os
+import sys
 import json
 import re
+import time
+import signal
+import hashlib
+import argparse
+import traceback
+from collections import OrderedDict, deque
+from functools import partial
+from itertools import starmap
+from concurrent.futures import ProcessPoolExecutor
 
-def process_annotation(annotation, segments_data):
-    """将旧格式的标注转换为新格式"""
-    object_ids = annotation.get("object_ids", [])
-    
-    # 从segments_anno.json获取对象名称
-    object_names = []
-    for obj_id in object_ids:
-        object_name = "unknown"  # 默认值
-        # 在segments_data中查找对应的object_id
-        for group in segments_data.get("segGroups", []):
-            if group.get("objectId") == obj_id or group.get("id") == obj_id:
-                object_name = group.get("label", "unknown")
-                break
-        object_names.append(object_name)
-    
-    # 处理description
-    original_text = annotation.get("full_text", annotation.get("description", ""))
-    
-    # 如果存在"#"符号，删除[object_id]部分
-    if "#" in original_text:
-        description = re.sub(r'\s*\[\d+\]', '', original_text)
-    else:
-        # 否则，删除[object_id]并添加object_name
-        description = re.sub(r'\s*\[\d+\]', '', original_text)
+from scene_data import write_json_atomic
+from segments_io import iter_seg_groups
+from stage_timing import (StageTimer, Profiled, file_size, format_stages, merge_profiles, merge_stages,
+                          prepare_profile_dir)
+
+# 转换结果的格式或规则改变时加一，清单中版本不同的场景会被重新转换
+CONVERTER_VERSION = 1
+MANIFEST_FILE = "processed_manifest.json"
+WATCH_STATS_FILE = "processed_watch_stats.json"
+
+def build_label_index(seg_groups):
+    """objectId/id → label 的索引，每个场景只构建一次
+
+    与逐个扫描segGroups的行为一致：按顺序第一个objectId或id匹配的segGroup获胜。
+    """
+    label_index = {}
+    for group in seg_groups:
+        label = group.get("label", "unknown")
+        label_index.setdefault(group.get("objectId"), label)
+        label_index.setdefault(group.get("id"), label)
+    return label_index
+
+def load_label_index(segments_file):
+    """从segments_anno.json流式构建标签索引，不解析segments数组 (没有segGroups时为空索引)"""
+    try:
+        return build_label_index(iter_seg_groups(segments_file, skip_segments=True))
+    except KeyError:
+        return {}
+
+# 描述中的 [object_id] 标记 (连同前面的空白)
+OBJECT_ID_TAG = re.compile(r'\s*\[\d+\]')
+
+def rewrite_descriptions(texts, object_names_list):
+    """批量改写一个场景的描述：删除[object_id]，必要时在末尾补上 [object_name]
+
+    - 文本含"#"时只删除[object_id]
+    - 否则删除后若不以 . ? ! 结尾，且描述中没有出现任何一个物体名称，则追加 " [name1], [name2]"
+    """
+    strip_tags = OBJECT_ID_TAG.sub
+    descriptions = []
+    for original_text, object_names in zip(texts, object_names_list):
+        # 没有"["时不可能有[object_id]，跳过正则
+        description = strip_tags('', original_text) if '[' in original_text else original_text
         # 如果没有标点符号结尾，添加一个空格和object_names (用[]括起来)
-        if description and not description[-1] in ['.', '?', '!']:
+        if "#" not in original_text and description and description[-1] not in '.?!':
             if not any(obj_name in description for obj_name in object_names):
-                object_names_formatted = ", ".join(f"[{name}]" for name in object_names)
-                description += " " + object_names_formatted
-    
+                description += " " + ", ".join(f"[{name}]" for name in object_names)
+        descriptions.append(description)
+    return descriptions
+
+def process_annotations(annotations, label_index):
+    """批量转换一个场景的常规标注，结果与逐条调用 process_annotation 相同"""
+    object_ids_list = [annotation.get("object_ids", []) for annotation in annotations]
+    # 从segments_anno.json获取对象名称
+    object_names_list = [[label_index.get(obj_id, "unknown") for obj_id in object_ids]
+                         for object_ids in object_ids_list]
+    texts = [annotation.get("full_text", annotation.get("description", "")) for annotation in annotations]
+    descriptions = rewrite_descriptions(texts, object_names_list)
     # 创建新格式的标注
-    new_annotation = {
-        "object_id": object_ids,
-        "object_name": object_names,
-        "description": description
-    }
-    
-    return new_annotation
+    return [{"object_id": object_ids, "object_name": object_names, "description": description}
+            for object_ids, object_names, description in zip(object_ids_list, object_names_list, descriptions)]
+
+def process_annotation(annotation, segments_data=None, label_index=None):
+    """将旧格式的标注转换为新格式
+
+    传入 label_index (见 build_label_index) 时不再扫描 segments_data。
+    """
+    if label_index is None:
+        label_index = build_label_index(segments_data.get("segGroups", []))
+    return process_annotations([annotation], label_index)[0]
 
-def process_abs_annotation(annotation, segments_data):
+def process_abs_annotation(annotation, segments_data=None, label_index=None):
     """处理_abs_annotations.json文件中的标注"""
     object_ids = annotation.get("object_ids", [])
     
     # 从segments_anno.json获取对象名称
-    object_names = []
-    for obj_id in object_ids:
-        object_name = "unknown"  # 默认值
-        # 在segments_data中查找对应的object_id
-        for group in segments_data.get("segGroups", []):
-            if group.get("objectId") == obj_id or group.get("id") == obj_id:
-                object_name = group.get("label", "unknown")
-                break
-        object_names.append(object_name)
+    if label_index is None:
+        label_index = build_label_index(segments_data.get("segGroups", []))
+    object_names = [label_index.get(obj_id, "unknown") for obj_id in object_ids]
     
     # 获取距离，保留两位小数
     distance = round(annotation.get("distance_m", 0), 2)
@@ -79,75 +115,508 @@ def process_abs_annotation(annotation, segments_data):
     
     return new_annotation
 
-def main():
-    # 指定data目录路径
-    data_dir = "data"
-    
-    # 遍历data目录下的所有文件夹
-    for folder_name in os.listdir(data_dir):
-        folder_path = os.path.join(data_dir, folder_name)
-        
-        # 确保是目录
-        if not os.path.isdir(folder_path):
+def process_abs_annotations(annotations, label_index):
+    """批量转换一个场景的距离标注"""
+    return [process_abs_annotation(annotation, label_index=label_index) for annotation in annotations]
+
+def convert_file(source_file, process, label_index, timer=None):
+    """用批量转换函数转换一个标注文件，返回转换后的标注列表"""
+    timer = timer or StageTimer()
+    with timer.stage('read_json', bytes_read=file_size(source_file)):
+        with open(source_file, 'r', encoding='utf-8') as f:
+            annotations = json.load(f)
+    timer.add('read_json', records=len(annotations), calls=0)
+    with timer.stage('rewrite', records=len(annotations)):
+        return process(annotations, label_index)
+
+# 来源类型 → (原始标注文件名模板, 输出文件名, 批量转换函数)
+ANNOTATION_SOURCES = {
+    "annotations": ("{scene}_annotations.json", "processed_annotations.json", process_annotations),
+    "abs_annotations": ("{scene}_abs_annotations.json", "processed_abs_annotations.json", process_abs_annotations),
+}
+
+def make_record(scene_id, source, index, annotation):
+    """带有场景ID、来源文件类型 (annotations/abs_annotations) 和在该文件中序号的转换结果"""
+    record = {"scene_id": scene_id, "source": source, "index": index}
+    record.update(annotation)
+    return record
+
+def jsonl_record(scene_id, source, index, annotation):
+    """JSONL中的一行，内容同 make_record"""
+    return json.dumps(make_record(scene_id, source, index, annotation), ensure_ascii=False)
+
+class LabelIndexCache:
+    """按segments_anno.json路径缓存标签索引的有界LRU，文件大小或修改时间变化时重新构建"""
+
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+
+    def get(self, segments_file):
+        st = os.stat(segments_file)
+        key = os.path.abspath(segments_file)
+        stamp = (st.st_size, st.st_mtime_ns)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == stamp:
+            self._entries.move_to_end(key)
+            return entry[1]
+        label_index = load_label_index(segments_file)
+        self._entries[key] = (stamp, label_index)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return label_index
+
+    def clear(self):
+        self._entries.clear()
+
+# iter_processed_annotations 默认使用的缓存
+label_index_cache = LabelIndexCache()
+
+def iter_scene_records(folder_path, sources=tuple(ANNOTATION_SOURCES), label_cache=None):
+    """逐条产出一个场景转换后的标注 (见 make_record)，不写任何文件
+
+    没有segments_anno.json的场景不产生结果；每次只载入一个原始标注文件。
+    """
+    folder_name = os.path.basename(os.path.normpath(folder_path))
+    segments_file = os.path.join(folder_path, "segments_anno.json")
+    if not os.path.exists(segments_file):
+        return
+    label_index = (label_cache or label_index_cache).get(segments_file)
+    for source in sources:
+        template, _, process = ANNOTATION_SOURCES[source]
+        source_file = os.path.join(folder_path, template.format(scene=folder_name))
+        if not os.path.exists(source_file):
             continue
-        
+        for i, annotation in enumerate(convert_file(source_file, process, label_index)):
+            yield make_record(folder_name, source, i, annotation)
+
+def iter_processed_annotations(data_dir, scenes=None, sources=tuple(ANNOTATION_SOURCES), label_cache=None):
+    """遍历数据目录，惰性地产出所有场景转换后的标注，供训练代码直接使用
+
+    scenes 可以是场景名的集合，也可以是接受场景名、返回bool的函数；
+    sources 选择 "annotations" 和/或 "abs_annotations"。
+    """
+    if scenes is not None and not callable(scenes):
+        wanted = set(scenes)
+        scenes = wanted.__contains__
+    for folder_path in list_scene_folders(data_dir):
+        if scenes is None or scenes(os.path.basename(folder_path)):
+            yield from iter_scene_records(folder_path, sources, label_cache)
+
+def file_fingerprint(path, previous=None):
+    """文件的大小、修改时间和sha256；大小和修改时间都与上次相同时沿用上次的哈希，文件不存在时返回None"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    if previous and previous.get("size") == st.st_size and previous.get("mtime_ns") == st.st_mtime_ns:
+        return previous
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": digest.hexdigest()}
+
+def scene_inputs(folder_path, folder_name):
+    """决定转换结果的三个输入文件"""
+    return {name: os.path.join(folder_path, name) for name in
+            ("segments_anno.json", f"{folder_name}_annotations.json", f"{folder_name}_abs_annotations.json")}
+
+def is_unchanged(previous, inputs, folder_path):
+    """清单记录的转换器版本和输入哈希都相同，且输出文件都还在"""
+    if not previous or previous.get("converter_version") != CONVERTER_VERSION:
+        return False
+    old_inputs = previous.get("inputs", {})
+    for name, fingerprint in inputs.items():
+        old = old_inputs.get(name)
+        if (fingerprint is None) != (old is None):
+            return False
+        if fingerprint is not None and fingerprint["sha256"] != old.get("sha256"):
+            return False
+    return all(os.path.exists(os.path.join(folder_path, name)) for name in previous.get("outputs", []))
+
+def process_scene(folder_path, previous=None, jsonl=False):
+    """转换一个场景文件夹，返回结构化结果；任何异常都只影响该场景
+
+    jsonl 为True时不写出每个场景的processed_*.json，而是在 result["lines"] 中返回JSONL行，由主进程统一写入。
+    previous 为清单中该场景上次的记录，输入内容和转换器版本都未变时直接跳过 (status 为 "unchanged")；
+    result["manifest"] 为本次应写入清单的记录；result["stages"] 为各阶段的耗时、读写字节数和记录数。
+    """
+    start = time.perf_counter()
+    timer = StageTimer()
+    folder_name = os.path.basename(os.path.normpath(folder_path))
+    result = {"scene": folder_name, "status": "ok", "annotations": 0, "abs_annotations": 0,
+              "outputs": [], "warnings": [], "lines": [], "manifest": None}
+    try:
         # 加载segments_anno.json
         segments_file = os.path.join(folder_path, "segments_anno.json")
         if not os.path.exists(segments_file):
-            print(f"警告: 在{folder_path}中找不到segments_anno.json文件")
-            continue
-            
-        try:
-            # 加载segments文件
-            with open(segments_file, 'r', encoding='utf-8') as f:
-                segments_data = json.load(f)
-                
-            # 处理常规annotations文件
-            annotations_file = os.path.join(folder_path, f"{folder_name}_annotations.json")
-            if os.path.exists(annotations_file):
-                # 加载annotation文件
-                with open(annotations_file, 'r', encoding='utf-8') as f:
-                    annotations = json.load(f)
-                    
-                # 处理每个标注
-                processed_annotations = []
-                for annotation in annotations:
-                    processed_annotation = process_annotation(annotation, segments_data)
-                    processed_annotations.append(processed_annotation)
-                    
-                # 保存处理后的标注
-                processed_file = os.path.join(folder_path, "processed_annotations.json")
-                with open(processed_file, 'w', encoding='utf-8') as f:
-                    json.dump(processed_annotations, f, ensure_ascii=False, indent=4)
-                    
-                print(f"成功处理并保存: {processed_file}")
-            
-            # 处理abs_annotations文件
-            abs_annotations_file = os.path.join(folder_path, f"{folder_name}_abs_annotations.json")
-            if os.path.exists(abs_annotations_file):
-                # 加载abs_annotation文件
-                with open(abs_annotations_file, 'r', encoding='utf-8') as f:
-                    abs_annotations = json.load(f)
-                    
-                # 处理每个标注
-                processed_abs_annotations = []
-                for annotation in abs_annotations:
-                    processed_annotation = process_abs_annotation(annotation, segments_data)
-                    processed_abs_annotations.append(processed_annotation)
-                    
-                # 保存处理后的标注
-                processed_abs_file = os.path.join(folder_path, "processed_abs_annotations.json")
-                with open(processed_abs_file, 'w', encoding='utf-8') as f:
-                    json.dump(processed_abs_annotations, f, ensure_ascii=False, indent=4)
-                    
-                print(f"成功处理并保存: {processed_abs_file}")
-                
-            # 如果两个文件都不存在，打印警告
-            if not os.path.exists(annotations_file) and not os.path.exists(abs_annotations_file):
-                print(f"警告: 在{folder_path}中找不到{folder_name}_annotations.json或{folder_name}_abs_annotations.json文件")
-                
-        except Exception as e:
-            print(f"处理{folder_path}时出错: {str(e)}")
-            
+            result["status"] = "skipped"
+            result["warnings"].append(f"在{folder_path}中找不到segments_anno.json文件")
+            return result
+
+        if not jsonl:
+            old_inputs = (previous or {}).get("inputs", {})
+            with timer.stage('hash_inputs'):
+                inputs = {name: file_fingerprint(path, old_inputs.get(name))
+                          for name, path in scene_inputs(folder_path, folder_name).items()}
+            if is_unchanged(previous, inputs, folder_path):
+                result["status"] = "unchanged"
+                result["manifest"] = dict(previous, inputs=inputs)
+                return result
+
+        # 加载segments文件并构建标签索引 (只需要objectId/id和label，跳过segments数组)
+        with timer.stage('label_index', bytes_read=file_size(segments_file)):
+            label_index = load_label_index(segments_file)
+        timer.add('label_index', records=len(label_index), calls=0)
+
+        # 处理常规annotations文件和abs_annotations文件
+        annotations_file = os.path.join(folder_path, f"{folder_name}_annotations.json")
+        abs_annotations_file = os.path.join(folder_path, f"{folder_name}_abs_annotations.json")
+        for key, (template, target_name, process) in ANNOTATION_SOURCES.items():
+            source_file = os.path.join(folder_path, template.format(scene=folder_name))
+            if not os.path.exists(source_file):
+                continue
+            processed_annotations = convert_file(source_file, process, label_index, timer)
+            result[key] = len(processed_annotations)
+            if jsonl:
+                with timer.stage('serialize_jsonl', records=len(processed_annotations)):
+                    lines = [jsonl_record(folder_name, key, i, annotation)
+                             for i, annotation in enumerate(processed_annotations)]
+                result["lines"].extend(lines)
+            else:
+                processed_file = os.path.join(folder_path, target_name)
+                with timer.stage('write_json', records=len(processed_annotations)):
+                    write_json_atomic(processed_file, processed_annotations, indent=4)
+                timer.add('write_json', bytes_written=file_size(processed_file), calls=0)
+                result["outputs"].append(processed_file)
+
+        # 如果两个文件都不存在，记录警告
+        if not os.path.exists(annotations_file) and not os.path.exists(abs_annotations_file):
+            result["warnings"].append(
+                f"在{folder_path}中找不到{folder_name}_annotations.json或{folder_name}_abs_annotations.json文件")
+        if not jsonl:
+            result["manifest"] = {"converter_version": CONVERTER_VERSION, "inputs": inputs,
+                                  "outputs": [os.path.basename(path) for path in result["outputs"]]}
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = f"处理{folder_path}时出错: {str(e)}"
+        result["traceback"] = traceback.format_exc()
+    finally:
+        result["seconds"] = time.perf_counter() - start
+        result["stages"] = timer.as_dict()
+    return result
+
+class JsonlWriter:
+    """把记录逐行追加到一个JSONL文件，或按大小切分为多个分片
+
+    max_bytes 为None时写入 path 本身；否则写入 <name>-00000.jsonl, <name>-00001.jsonl ...，
+    每个分片不超过 max_bytes (单条记录超过上限时独占一个分片)。
+    每个分片先写入临时文件，写满或 close() 时才替换为正式文件；close() 同时删除上次运行遗留的多余分片。
+    """
+
+    def __init__(self, path, max_bytes=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.paths = []
+        self.records = 0
+        self._file = None
+        self._size = 0
+
+    def shard_path(self, number):
+        if self.max_bytes is None:
+            return self.path
+        stem, ext = os.path.splitext(self.path)
+        return f"{stem}-{number:05d}{ext or '.jsonl'}"
+
+    def _open_next(self):
+        self._close_current()
+        path = self.shard_path(len(self.paths))
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.paths.append(path)
+        self._file = open(path + ".tmp", 'w', encoding='utf-8')
+        self._size = 0
+
+    def _close_current(self):
+        if self._file is not None:
+            self._file.close()
+            os.replace(self._file.name, self.paths[-1])
+            self._file = None
+
+    def write(self, line):
+        data = line + "\n"
+        size = len(data.encode('utf-8'))
+        if self._file is None or (self.max_bytes is not None and self._size and self._size + size > self.max_bytes):
+            self._open_next()
+        self._file.write(data)
+        self._size += size
+        self.records += 1
+
+    def close(self):
+        if self._file is None and not self.paths:
+            self._open_next()
+        self._close_current()
+        if self.max_bytes is not None:
+            number = len(self.paths)
+            while os.path.exists(self.shard_path(number)):
+                os.remove(self.shard_path(number))
+                number += 1
+
+    def discard(self):
+        """中途出错时删除尚未完成的临时文件，已完成的正式文件保持不变"""
+        if self._file is not None:
+            self._file.close()
+            os.remove(self._file.name)
+            self._file = None
+
+def ordered_results(executor, fn, items, window):
+    """按提交顺序产出 fn(*item) 的结果，同时最多只有 window 个任务在进行中，主进程内存不随场景数增长"""
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, *item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def list_scene_folders(data_dir):
+    """data目录下的所有场景文件夹，按名称排序"""
+    return [os.path.join(data_dir, name) for name in sorted(os.listdir(data_dir))
+            if os.path.isdir(os.path.join(data_dir, name))]
+
+def load_manifest(manifest_path):
+    """读取转换清单，不存在时返回空清单"""
+    if not os.path.exists(manifest_path):
+        return {"converter_version": CONVERTER_VERSION, "scenes": {}}
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def write_manifest(manifest_path, scenes):
+    write_json_atomic(manifest_path, {"converter_version": CONVERTER_VERSION, "scenes": scenes}, indent=1)
+
+def print_result(result, verbose=False):
+    for processed_file in result["outputs"]:
+        print(f"成功处理并保存: {processed_file}")
+    for warning in result["warnings"]:
+        print(f"警告: {warning}")
+    if result["status"] == "error":
+        print(result["error"])
+        if verbose:
+            print(result["traceback"])
+
+def scan_scene_mtimes(data_dir):
+    """一次scandir得到每个场景文件夹的修改时间
+
+    文件夹中有文件被创建、重命名替换或删除时其修改时间会变化 (标注工具以原子替换方式保存)，
+    因此无需逐个stat场景中的文件。
+    """
+    mtimes = {}
+    with os.scandir(data_dir) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                mtimes[entry.name] = entry.stat().st_mtime_ns
+    return mtimes
+
+def ignore_sigint():
+    """监视模式工作进程的初始化函数：Ctrl+C 只由主进程处理，由它关闭进程池"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def watch(args):
+    """持续监视数据目录，场景文件夹变化并安静 debounce 秒后用进程池重新转换该场景
+
+    是否真的需要转换仍由清单中的内容哈希决定，因此自身写出的processed_*.json引起的变化只会触发一次廉价的检查。
+    """
+    data_dir = args.data_dir
+    manifest_path = os.path.join(data_dir, MANIFEST_FILE)
+    stats_path = args.stats_file or os.path.join(data_dir, WATCH_STATS_FILE)
+    scenes = {} if args.force else load_manifest(manifest_path).get("scenes", {})
+    known = {}      # 场景 → 上次看到的文件夹修改时间
+    dirty = {}      # 场景 → 最近一次发现变化的时间
+    running = {}    # 场景 → Future
+    stats = {"processed": 0, "unchanged": 0, "failed": {}, "last_processed": {}}
+    first_scan = True
+    print(f"开始监视 {data_dir} (间隔 {args.interval}s, 防抖 {args.debounce}s, {args.workers} 个工作进程)，按 Ctrl+C 停止")
+
+    def write_stats():
+        stats.update(updated_at=time.strftime("%Y-%m-%dT%H:%M:%S"),
+                     pending=sorted(dirty), running=sorted(running))
+        write_json_atomic(stats_path, stats, indent=1)
+
+    executor = ProcessPoolExecutor(max_workers=max(1, args.workers), initializer=ignore_sigint)
+    try:
+        while True:
+            now = time.monotonic()
+            changed = False
+            mtimes = scan_scene_mtimes(data_dir)
+            for name, mtime in mtimes.items():
+                if known.get(name) != mtime:
+                    known[name] = mtime
+                    # 启动时的全量检查不需要等待
+                    dirty[name] = now - args.debounce if first_scan else now
+                    changed = True
+            for name in set(known) - set(mtimes):
+                del known[name]
+                dirty.pop(name, None)
+                if scenes.pop(name, None) is not None:
+                    write_manifest(manifest_path, scenes)
+                changed = True
+            first_scan = False
+
+            manifest_changed = False
+            for name, future in list(running.items()):
+                if not future.done():
+                    continue
+                del running[name]
+                result = future.result()
+                print_result(result, args.verbose)
+                if result["manifest"] is not None:
+                    scenes[name] = result["manifest"]
+                    manifest_changed = True
+                elif scenes.pop(name, None) is not None:
+                    manifest_changed = True
+                if result["status"] == "error":
+                    stats["failed"][name] = result["error"]
+                else:
+                    stats["failed"].pop(name, None)
+                    if result["status"] == "ok":
+                        stats["processed"] += 1
+                        print(f"已更新 {name}: {result['annotations'] + result['abs_annotations']} 条标注, "
+                              f"{result['seconds']:.2f}s")
+                    elif result["status"] == "unchanged":
+                        stats["unchanged"] += 1
+                stats["last_processed"][name] = {"at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                                                 "status": result["status"]}
+                changed = True
+            if manifest_changed:
+                write_manifest(manifest_path, scenes)
+
+            # 同一场景同时只转换一次，正在转换时的新变化等本次完成后再处理
+            for name, changed_at in sorted(dirty.items()):
+                if name not in running and now - changed_at >= args.debounce:
+                    del dirty[name]
+                    running[name] = executor.submit(process_scene, os.path.join(data_dir, name), scenes.get(name))
+                    changed = True
+
+            if changed:
+                write_stats()
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        print("停止监视")
+    finally:
+        executor.shutdown(cancel_futures=True)
+        write_stats()
+    return 1 if stats["failed"] else 0
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="把原始标注转换为 processed_annotations.json / processed_abs_annotations.json")
+    parser.add_argument("--data-dir", default="data", help="数据目录，每个子文件夹为一个场景 (默认: data)")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1,
+                        help="并行工作进程数 (默认: CPU核数)")
+    parser.add_argument("--jsonl", default=None,
+                        help="把所有场景的标注流式写入一个JSONL文件，而不是每个场景的processed_*.json")
+    parser.add_argument("--force", action="store_true",
+                        help=f"忽略{MANIFEST_FILE}，重新转换所有场景")
+    parser.add_argument("--shard-size", type=float, default=None,
+                        help="配合 --jsonl，按大小 (MB) 切分为多个分片")
+    parser.add_argument("--watch", action="store_true",
+                        help="持续监视数据目录，场景有新的保存时自动重新转换")
+    parser.add_argument("--interval", type=float, default=2.0, help="配合 --watch，轮询间隔秒数 (默认: 2)")
+    parser.add_argument("--debounce", type=float, default=5.0,
+                        help="配合 --watch，场景停止变化多少秒后才转换 (默认: 5)")
+    parser.add_argument("--stats-file", default=None,
+                        help=f"配合 --watch，状态文件路径 (默认: <data-dir>/{WATCH_STATS_FILE})")
+    parser.add_argument("--report", default=None,
+                        help="把每个场景及全局的分阶段耗时、读写字节数和记录数写入此JSON文件")
+    parser.add_argument("--profile", default=None, metavar="DIR",
+                        help="用cProfile运行，每个工作进程的结果写入 DIR/worker-<pid>.pstats 并合并为 combined.pstats")
+    parser.add_argument("-v", "--verbose", action="store_true", help="出错时打印完整堆栈")
+    args = parser.parse_args(argv)
+    if args.watch and args.jsonl:
+        parser.error("--watch 不能与 --jsonl 同时使用")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.watch:
+        return watch(args)
+
+    # 遍历data目录下的所有文件夹
+    folders = list_scene_folders(args.data_dir)
+    start = time.perf_counter()
+    jsonl = args.jsonl is not None
+    max_bytes = int(args.shard_size * 2**20) if args.shard_size else None
+    writer = JsonlWriter(args.jsonl, max_bytes) if jsonl else None
+    task = partial(process_scene, jsonl=jsonl)
+    if args.profile:
+        prepare_profile_dir(args.profile)
+        task = Profiled(task, args.profile)
+
+    # 清单只用于逐场景输出模式；JSONL模式每次都需要完整的记录
+    manifest_path = os.path.join(args.data_dir, MANIFEST_FILE)
+    previous_scenes = {} if args.force or jsonl else load_manifest(manifest_path).get("scenes", {})
+    items = [(folder, previous_scenes.get(os.path.basename(folder))) for folder in folders]
+    scenes = {}
+
+    # 按提交顺序返回结果，输出顺序与工作进程数无关
+    if args.workers <= 1 or len(folders) <= 1:
+        results = starmap(task, items)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=args.workers)
+        results = ordered_results(executor, task, items, window=args.workers * 4)
+
+    counts = {"ok": 0, "unchanged": 0, "skipped": 0, "error": 0}
+    total_records = 0
+    stages = {}
+    scene_stages = {}
+    try:
+        for result in results:
+            counts[result["status"]] += 1
+            if args.report:
+                merge_stages(stages, result["stages"])
+                scene_stages[result["scene"]] = {"status": result["status"], "seconds": result["seconds"],
+                                                 "stages": result["stages"]}
+            if result["manifest"] is not None:
+                scenes[result["scene"]] = result["manifest"]
+            total_records += result["annotations"] + result["abs_annotations"]
+            print_result(result, args.verbose)
+            if writer is not None and result["status"] == "ok" and result["lines"]:
+                write_start = time.perf_counter()
+                for line in result["lines"]:
+                    writer.write(line)
+                if args.report:
+                    merge_stages(stages, {"write_jsonl": {"seconds": time.perf_counter() - write_start, "calls": 1,
+                                                          "records": len(result["lines"])}})
+                print(f"已写入 {result['scene']}: {len(result['lines'])} 条记录")
+        if writer is not None:
+            writer.close()
+            print(f"共 {writer.records} 条记录写入: {', '.join(writer.paths)}")
+        else:
+            # 出错和已删除的场景不写入清单，下次运行会重新转换
+            write_manifest(manifest_path, scenes)
+    finally:
+        if writer is not None:
+            writer.discard()
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    elapsed = time.perf_counter() - start
+    print(f"完成: {len(folders)} 个场景 (成功 {counts['ok']}, 未变化 {counts['unchanged']}, "
+          f"跳过 {counts['skipped']}, 失败 {counts['error']}), "
+          f"{total_records} 条标注, 耗时 {elapsed:.1f}s, "
+          f"{len(folders) / max(elapsed, 1e-9):.2f} 场景/s, {total_records / max(elapsed, 1e-9):.0f} 条/s")
+    if args.report:
+        if writer is not None:
+            merge_stages(stages, {"write_jsonl": {"bytes_written": sum(file_size(path) for path in writer.paths)}})
+        write_json_atomic(args.report, {"seconds": elapsed, "total": stages, "scenes": scene_stages}, indent=1)
+        print(format_stages(stages))
+        print(f"分阶段报告已保存到 {args.report}")
+    if args.profile:
+        combined = merge_profiles(args.profile)
+        if combined:
+            print(f"profile已保存到 {combined} (python -m pstats {combined})")
+    return 1 if counts["error"] else 0
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,316 @@
+import os
+import sys
+import json
+import time
+import argparse
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from ply_io import read_ply_mesh
+from scene_data import (INSTANCE_FILE, InstanceIndex, load_instance_index, load_instance_mask)
+
+BUNDLE_FILE = 'scene_bundle.bin'
+# 量化压缩版本 (见scene_codec.py)，用于带宽受限时同步
+COMPRESSED_BUNDLE_FILE = 'scene_bundle.sbz'
+BUNDLE_MAGIC = b'SCNBNDL1'
+BUNDLE_VERSION = 1
+
+# 头部固定4096字节 (魔数 + JSON段表)，各数据段按64字节对齐
+HEADER_SIZE = 4096
+ALIGNMENT = 64
+
+DEFAULT_GRAY = 0.7
+
+
+def read_mesh_arrays(mesh_path):
+    """读取网格数组，PLY布局不受支持时退回Open3D"""
+    try:
+        return read_ply_mesh(mesh_path)
+    except ValueError:
+        import open3d as o3d
+        mesh = o3d.io.read_triangle_mesh(mesh_path)
+        arrays = {
+            'positions': np.asarray(mesh.vertices, dtype=np.float32),
+            'triangles': np.asarray(mesh.triangles, dtype=np.int32),
+            'colors': None,
+            'normals': None,
+        }
+        if mesh.has_vertex_colors():
+            arrays['colors'] = np.round(np.asarray(mesh.vertex_colors) * 255).astype(np.uint8)
+        if mesh.has_vertex_normals():
+            arrays['normals'] = np.asarray(mesh.vertex_normals, dtype=np.float32)
+        return arrays
+
+
+def write_bundle(path, sections):
+    """将若干数组按固定偏移写入一个bundle文件 (先写临时文件再替换)"""
+    table = {}
+    offset = HEADER_SIZE
+    for name, array in sections.items():
+        array = np.ascontiguousarray(array)
+        table[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+
+    header = json.dumps({'version': BUNDLE_VERSION, 'sections': table}).encode('utf-8')
+    if len(BUNDLE_MAGIC) + 4 + len(header) > HEADER_SIZE:
+        raise ValueError('bundle段表超出头部大小')
+
+    tmp_path = f'{path}.tmp.{os.getpid()}'
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(BUNDLE_MAGIC)
+            f.write(np.uint32(len(header)).tobytes())
+            f.write(header)
+            for name, array in sections.items():
+                f.seek(table[name]['offset'])
+                f.write(np.ascontiguousarray(array).tobytes())
+            f.truncate(offset)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class SceneBundle:
+    """内存映射打开的场景bundle：顶点、三角形、颜色、实例ID和实例索引"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(BUNDLE_MAGIC)) != BUNDLE_MAGIC:
+                raise ValueError(f'{path} 不是场景bundle文件')
+            header_len = int(np.frombuffer(f.read(4), dtype='<u4')[0])
+            header = json.loads(f.read(header_len).decode('utf-8'))
+        if header.get('version') != BUNDLE_VERSION:
+            raise ValueError(f'{path} 的bundle版本不受支持: {header.get("version")}')
+
+        self.sections = {}
+        for name, info in header['sections'].items():
+            shape = tuple(info['shape'])
+            if 0 in shape:
+                self.sections[name] = np.zeros(shape, dtype=info['dtype'])
+            else:
+                self.sections[name] = np.memmap(path, dtype=info['dtype'], mode='r',
+                                                offset=info['offset'], shape=shape)
+
+    @property
+    def vertices(self):
+        return self.sections['vertices']
+
+    @property
+    def triangles(self):
+        return self.sections['triangles']
+
+    @property
+    def colors(self):
+        return self.sections.get('colors')
+
+    @property
+    def normals(self):
+        return self.sections.get('normals')
+
+    @property
+    def instance_ids(self):
+        return self.sections['instance_ids']
+
+    @property
+    def num_instances(self):
+        return int(np.count_nonzero(self.sections['index_ids']))
+
+    @property
+    def index(self):
+        return InstanceIndex(self.sections['index_ids'], self.sections['index_offsets'],
+                             self.sections['index_vertices'])
+
+    def to_mesh(self):
+        """构建Open3D三角网格，无颜色时使用灰色"""
+        import open3d as o3d
+        mesh = o3d.geometry.TriangleMesh(
+            o3d.utility.Vector3dVector(np.asarray(self.vertices, dtype=np.float64)),
+            o3d.utility.Vector3iVector(np.asarray(self.triangles, dtype=np.int32)))
+        if self.colors is not None:
+            mesh.vertex_colors = o3d.utility.Vector3dVector(self.colors / 255.0)
+        else:
+            mesh.paint_uniform_color([DEFAULT_GRAY] * 3)
+        if self.normals is not None:
+            mesh.vertex_normals = o3d.utility.Vector3dVector(np.asarray(self.normals, dtype=np.float64))
+        return mesh
+
+
+def bundle_path_for(scene_dir):
+    return os.path.join(scene_dir, BUNDLE_FILE)
+
+
+def find_bundle(scene_dir):
+    """返回场景中的bundle路径 (优先未压缩的scene_bundle.bin)，没有时返回None"""
+    for name in (BUNDLE_FILE, COMPRESSED_BUNDLE_FILE):
+        path = os.path.join(scene_dir, name)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def open_bundle(path):
+    """打开bundle，压缩格式会被完整解码，两者接口相同"""
+    if path.endswith(COMPRESSED_BUNDLE_FILE):
+        from scene_codec import CompressedSceneBundle
+        return CompressedSceneBundle(path)
+    return SceneBundle(path)
+
+
+def bundle_is_current(bundle_path, scene_dir, mesh_path=None):
+    """bundle不早于mesh和instance.npy时可直接使用；只有bundle的场景也视为可用"""
+    try:
+        bundle_mtime = os.stat(bundle_path).st_mtime_ns
+    except OSError:
+        return False
+    for path in (mesh_path, os.path.join(scene_dir, INSTANCE_FILE)):
+        if path and os.path.exists(path) and os.stat(path).st_mtime_ns > bundle_mtime:
+            return False
+    return True
+
+
+def build_scene_bundle(scene_dir, mesh_path):
+    """由PLY和instance.npy生成场景bundle，返回 (顶点数, 三角形数)"""
+    mask_path = os.path.join(scene_dir, INSTANCE_FILE)
+    mask, _ = load_instance_mask(mask_path)
+    arrays = read_mesh_arrays(mesh_path)
+    if arrays['positions'].shape[0] != mask.shape[0]:
+        raise ValueError(f'mesh顶点数 ({arrays["positions"].shape[0]}) 与实例掩码 ({mask.shape[0]}) 不匹配')
+    index = load_instance_index(mask_path, mask)
+
+    sections = {'vertices': arrays['positions'], 'triangles': arrays['triangles']}
+    if arrays['colors'] is not None:
+        sections['colors'] = arrays['colors']
+    if arrays['normals'] is not None:
+        sections['normals'] = arrays['normals']
+    sections['instance_ids'] = np.asarray(mask)
+    sections['index_ids'] = index.ids
+    sections['index_offsets'] = index.offsets
+    sections['index_vertices'] = index.vertices
+    write_bundle(bundle_path_for(scene_dir), sections)
+    return arrays['positions'].shape[0], arrays['triangles'].shape[0]
+
+
+def read_scene_mesh(mesh_path, bundle=None):
+    """读取场景mesh：优先使用bundle，否则解析PLY；mesh没有顶点颜色时添加默认灰色"""
+    if bundle is not None:
+        return bundle.to_mesh()
+    import open3d as o3d
+    mesh = o3d.io.read_triangle_mesh(mesh_path)
+    if not mesh.has_vertex_colors():
+        mesh.paint_uniform_color([DEFAULT_GRAY] * 3)
+    return mesh
+
+
+def open_ply_scene(scene_dir, mesh_path):
+    """旧路径：解析PLY并加载掩码和索引"""
+    mask_path = os.path.join(scene_dir, INSTANCE_FILE)
+    mesh = read_scene_mesh(mesh_path)
+    mask, _ = load_instance_mask(mask_path)
+    index = load_instance_index(mask_path, mask)
+    return mesh, mask, index
+
+
+def open_bundle_scene(scene_dir):
+    """新路径：内存映射bundle并构建mesh"""
+    bundle = SceneBundle(bundle_path_for(scene_dir))
+    return bundle.to_mesh(), bundle.instance_ids, bundle.index
+
+
+def run_benchmark(scene_dirs, mesh_name, repeat):
+    """比较PLY+NPY与bundle两种方式的场景打开耗时"""
+    print(f'{"场景":<16}{"顶点数":>12}{"PLY+NPY (s)":>14}{"bundle (s)":>14}{"加速":>8}')
+    for scene_dir in scene_dirs:
+        mesh_path = os.path.join(scene_dir, mesh_name)
+        timings = {}
+        for label, opener in (('ply', lambda: open_ply_scene(scene_dir, mesh_path)),
+                              ('bundle', lambda: open_bundle_scene(scene_dir))):
+            best = float('inf')
+            for _ in range(repeat):
+                start = time.perf_counter()
+                mesh, mask, index = opener()
+                best = min(best, time.perf_counter() - start)
+            timings[label] = best
+        num_vertices = len(mask)
+        print(f'{os.path.basename(scene_dir):<16}{num_vertices:>12}{timings["ply"]:>14.3f}'
+              f'{timings["bundle"]:>14.3f}{timings["ply"] / max(timings["bundle"], 1e-9):>7.1f}x')
+
+
+def run_scene(scene_dir, mesh_name):
+    start = time.perf_counter()
+    result = {'scene': os.path.basename(scene_dir), 'status': 'ok'}
+    try:
+        result['num_vertices'], result['num_triangles'] = build_scene_bundle(
+            scene_dir, os.path.join(scene_dir, mesh_name))
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = f'{type(e).__name__}: {e}'
+        result['traceback'] = traceback.format_exc()
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='为每个场景生成可内存映射的打包文件 scene_bundle.bin')
+    parser.add_argument('dataset_path', help='数据集目录，每个子文件夹为一个场景')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1,
+                        help='并行工作进程数 (默认: CPU核数)')
+    parser.add_argument('--mesh-name', default='mesh_aligned_0.05.ply', help='场景mesh文件名')
+    parser.add_argument('--force', action='store_true', help='忽略时间戳，重新生成所有bundle')
+    parser.add_argument('--scenes', nargs='+', default=None, help='只处理指定的场景')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='不生成bundle，而是比较PLY+NPY与bundle的场景打开耗时')
+    parser.add_argument('--repeat', type=int, default=3, help='benchmark每种方式的重复次数')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    from data_preprocess import list_scenes
+
+    scenes = args.scenes if args.scenes else list_scenes(args.dataset_path)
+    scene_dirs = [os.path.join(args.dataset_path, name) for name in scenes]
+
+    if args.benchmark:
+        run_benchmark([d for d in scene_dirs if os.path.exists(bundle_path_for(d))],
+                      args.mesh_name, args.repeat)
+        return 0
+
+    pending = [d for d in scene_dirs
+               if args.force or not bundle_is_current(bundle_path_for(d), d, os.path.join(d, args.mesh_name))]
+    print(f'共 {len(scene_dirs)} 个场景: 需生成 {len(pending)} 个bundle')
+
+    start = time.perf_counter()
+    results = []
+
+    def report(result):
+        results.append(result)
+        prefix = f'[{len(results)}/{len(pending)}] {result["scene"]}'
+        if result['status'] == 'ok':
+            print(f'{prefix}: {result["num_vertices"]} 个顶点, {result["num_triangles"]} 个三角形, '
+                  f'{result["seconds"]:.2f}s')
+        else:
+            print(f'{prefix}: 出错 {result["error"]}')
+
+    if args.workers <= 1 or len(pending) <= 1:
+        for scene_dir in pending:
+            report(run_scene(scene_dir, args.mesh_name))
+    else:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            futures = [executor.submit(run_scene, d, args.mesh_name) for d in pending]
+            for future in as_completed(futures):
+                report(future.result())
+
+    failed = sorted(r['scene'] for r in results if r['status'] != 'ok')
+    print(f'完成: 成功 {len(results) - len(failed)}, 失败 {len(failed)}, '
+          f'耗时 {time.perf_counter() - start:.1f}s')
+    for name in failed:
+        print(f'  {name}')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
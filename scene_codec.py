@@ -0,0 +1,306 @@
+import os
+import sys
+import json
+import lzma
+import time
+import zlib
+import argparse
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+from scene_bundle import COMPRESSED_BUNDLE_FILE, SceneBundle, read_mesh_arrays
+from scene_data import INSTANCE_FILE, InstanceIndex, load_instance_mask
+
+CODEC_MAGIC = b'SCNCODE1'
+CODEC_VERSION = 1
+
+COMPRESSORS = {
+    'zlib': (lambda data: zlib.compress(data, 6), zlib.decompress),
+    'lzma': (lambda data: lzma.compress(data, preset=6), lzma.decompress),
+    'none': (bytes, bytes),
+}
+
+QUANT_LEVELS = 65535
+DEFAULT_BLOCK_SIZE = 1 << 18
+
+
+def quantize_positions(positions, aabb_min, aabb_max):
+    """相对场景AABB量化为16位"""
+    extent = aabb_max - aabb_min
+    scale = np.where(extent > 0, QUANT_LEVELS / np.where(extent > 0, extent, 1), 0)
+    return np.round((positions - aabb_min) * scale).astype(np.uint16)
+
+
+def dequantize_positions(quantized, aabb_min, aabb_max):
+    step = (aabb_max - aabb_min) / QUANT_LEVELS
+    return (aabb_min + quantized * step).astype(np.float32)
+
+
+def delta_encode(indices):
+    """块内差分 + zigzag，块首元素相对0编码，因此每块可独立解码"""
+    flat = indices.astype(np.int64).ravel()
+    delta = np.diff(flat, prepend=0)
+    return ((delta << 1) ^ (delta >> 63)).astype(np.uint32)
+
+
+def delta_decode(encoded):
+    zigzag = encoded.astype(np.int64)
+    delta = (zigzag >> 1) ^ -(zigzag & 1)
+    return np.cumsum(delta).astype(np.int32)
+
+
+def encode_scene(arrays, instance_ids, compression='zlib', block_size=DEFAULT_BLOCK_SIZE):
+    """编码为 (头部dict, 块数据列表)，返回的头部中记录了量化误差上界"""
+    compress, _ = COMPRESSORS[compression]
+    positions = np.asarray(arrays['positions'], dtype=np.float64)
+    num_vertices = positions.shape[0]
+    aabb_min = positions.min(axis=0) if num_vertices else np.zeros(3)
+    aabb_max = positions.max(axis=0) if num_vertices else np.zeros(3)
+
+    # 每个段: (名称, 编码后的数组, 每个元素的行宽)；按行切块
+    sections = [('positions', quantize_positions(positions, aabb_min, aabb_max), 3)]
+    if arrays.get('colors') is not None:
+        sections.append(('colors', np.asarray(arrays['colors'], dtype=np.uint8), 3))
+    if arrays.get('normals') is not None:
+        normals = np.clip(np.round(np.asarray(arrays['normals']) * 127), -127, 127)
+        sections.append(('normals', normals.astype(np.int8), 3))
+    sections.append(('triangles', np.asarray(arrays['triangles'], dtype=np.int32), 3))
+    sections.append(('instance_ids', np.asarray(instance_ids), 1))
+
+    header = {
+        'version': CODEC_VERSION,
+        'compression': compression,
+        'num_vertices': int(num_vertices),
+        'num_triangles': int(arrays['triangles'].shape[0]),
+        'aabb_min': aabb_min.tolist(),
+        'aabb_max': aabb_max.tolist(),
+        # 量化误差为半个量化步长，再加上float32输出的舍入
+        'position_error_bound': ((aabb_max - aabb_min) / QUANT_LEVELS / 2 + np.spacing(
+            np.maximum(np.abs(aabb_min), np.abs(aabb_max)).astype(np.float32))).tolist(),
+        'sections': {},
+        'blocks': [],
+    }
+    payloads = []
+    for name, data, width in sections:
+        header['sections'][name] = {'dtype': data.dtype.str, 'rows': int(data.shape[0]), 'width': width}
+        for start in range(0, data.shape[0], block_size):
+            chunk = data[start:start + block_size]
+            raw = delta_encode(chunk).tobytes() if name == 'triangles' else np.ascontiguousarray(chunk).tobytes()
+            payload = compress(raw)
+            header['blocks'].append({'section': name, 'start': start, 'rows': int(chunk.shape[0]),
+                                     'nbytes': len(payload), 'raw_nbytes': len(raw),
+                                     'crc32': zlib.crc32(payload)})
+            payloads.append(payload)
+    return header, payloads
+
+
+def write_codec(path, header, payloads):
+    offset = 0
+    for block, payload in zip(header['blocks'], payloads):
+        block['offset'] = offset
+        offset += len(payload)
+    encoded_header = json.dumps(header).encode('utf-8')
+
+    tmp_path = f'{path}.tmp.{os.getpid()}'
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(CODEC_MAGIC)
+            f.write(np.uint32(len(encoded_header)).tobytes())
+            f.write(encoded_header)
+            for payload in payloads:
+                f.write(payload)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def read_codec_header(path):
+    """返回 (头部dict, 数据区起始偏移)"""
+    with open(path, 'rb') as f:
+        if f.read(len(CODEC_MAGIC)) != CODEC_MAGIC:
+            raise ValueError(f'{path} 不是压缩场景文件')
+        header_len = int(np.frombuffer(f.read(4), dtype='<u4')[0])
+        header = json.loads(f.read(header_len).decode('utf-8'))
+        data_offset = f.tell()
+    if header.get('version') != CODEC_VERSION:
+        raise ValueError(f'{path} 的编码版本不受支持: {header.get("version")}')
+    return header, data_offset
+
+
+def decode_sections(path, names=None, rows=None, workers=None):
+    """解码指定段，可只解码 rows=(start, stop) 覆盖的块；各块在线程池中并行解压
+
+    返回 (头部dict, {段名: 数组})，positions 已反量化为float32、triangles 已还原为int32。
+    指定 rows 时每个段的结果恰好是第 start 到 stop 行 (超出段长的部分被截掉)，
+    即结果的第0行对应原始数据的第 start 行。
+    """
+    header, data_offset = read_codec_header(path)
+    _, decompress = COMPRESSORS[header['compression']]
+    names = list(header['sections']) if names is None else [n for n in names if n in header['sections']]
+
+    blocks = [b for b in header['blocks'] if b['section'] in names]
+    if rows is not None:
+        blocks = [b for b in blocks if b['start'] < rows[1] and b['start'] + b['rows'] > rows[0]]
+
+    def decode_block(block):
+        with open(path, 'rb') as f:
+            f.seek(data_offset + block['offset'])
+            payload = f.read(block['nbytes'])
+        if zlib.crc32(payload) != block['crc32']:
+            raise ValueError(f'{path} 的 {block["section"]} 块 (起始 {block["start"]}) 校验失败')
+        info = header['sections'][block['section']]
+        raw = decompress(payload)
+        if block['section'] == 'triangles':
+            data = delta_decode(np.frombuffer(raw, dtype=np.uint32))
+        else:
+            data = np.frombuffer(raw, dtype=info['dtype'])
+        return block, data.reshape(block['rows'], -1) if info['width'] > 1 else data
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        decoded = list(executor.map(decode_block, blocks))
+
+    sections = {}
+    for name in names:
+        parts = [data for block, data in sorted(decoded, key=lambda item: item[0]['start'])
+                 if block['section'] == name]
+        info = header['sections'][name]
+        if parts:
+            data = np.concatenate(parts)
+            if rows is not None:
+                # 块按整块解码，截取到请求的行范围
+                first = min(block['start'] for block, _ in decoded if block['section'] == name)
+                data = data[max(rows[0] - first, 0):max(rows[1] - first, 0)]
+        else:
+            data = np.zeros((0, info['width']) if info['width'] > 1 else (0,),
+                            dtype=np.int32 if name == 'triangles' else info['dtype'])
+        if name == 'positions':
+            data = dequantize_positions(data, np.array(header['aabb_min']), np.array(header['aabb_max']))
+        elif name == 'normals':
+            data = (data / 127.0).astype(np.float32)
+        sections[name] = data
+    return header, sections
+
+
+class CompressedSceneBundle(SceneBundle):
+    """完整解码的压缩场景，提供与SceneBundle相同的访问接口"""
+
+    def __init__(self, path, workers=None):
+        self.path = path
+        self.header, sections = decode_sections(path, workers=workers)
+        index = InstanceIndex.build(sections['instance_ids'])
+        self.sections = {
+            'vertices': sections['positions'],
+            'triangles': sections['triangles'],
+            'instance_ids': sections['instance_ids'],
+            'index_ids': index.ids,
+            'index_offsets': index.offsets,
+            'index_vertices': index.vertices,
+        }
+        for name in ('colors', 'normals'):
+            if name in sections:
+                self.sections[name] = sections[name]
+
+
+def encode_scene_dir(scene_dir, mesh_name, compression, block_size):
+    """编码一个场景并回读验证，返回统计信息 (大小、压缩比、误差)"""
+    mesh_path = os.path.join(scene_dir, mesh_name)
+    mask, _ = load_instance_mask(os.path.join(scene_dir, INSTANCE_FILE))
+    arrays = read_mesh_arrays(mesh_path)
+    if arrays['positions'].shape[0] != mask.shape[0]:
+        raise ValueError(f'mesh顶点数 ({arrays["positions"].shape[0]}) 与实例掩码 ({mask.shape[0]}) 不匹配')
+
+    header, payloads = encode_scene(arrays, mask, compression, block_size)
+    path = os.path.join(scene_dir, COMPRESSED_BUNDLE_FILE)
+    write_codec(path, header, payloads)
+
+    _, decoded = decode_sections(path)
+    error = np.abs(decoded['positions'].astype(np.float64) - arrays['positions']).max(axis=0) \
+        if arrays['positions'].shape[0] else np.zeros(3)
+    if not np.array_equal(decoded['triangles'], arrays['triangles']):
+        raise ValueError('三角形索引往返不一致')
+    if not np.array_equal(decoded['instance_ids'], np.asarray(mask)):
+        raise ValueError('实例ID往返不一致')
+
+    raw_bytes = sum(a.nbytes for a in (arrays['positions'], arrays['triangles'], np.asarray(mask))
+                    if a is not None)
+    raw_bytes += sum(arrays[k].nbytes for k in ('colors', 'normals') if arrays.get(k) is not None)
+    return {
+        'bytes': os.path.getsize(path),
+        'raw_bytes': raw_bytes,
+        'blocks': len(header['blocks']),
+        'max_position_error': error.tolist(),
+        'position_error_bound': header['position_error_bound'],
+    }
+
+
+def run_scene(scene_dir, mesh_name, compression, block_size):
+    start = time.perf_counter()
+    result = {'scene': os.path.basename(scene_dir), 'status': 'ok'}
+    try:
+        result.update(encode_scene_dir(scene_dir, mesh_name, compression, block_size))
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = f'{type(e).__name__}: {e}'
+        result['traceback'] = traceback.format_exc()
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='生成量化压缩的场景文件 scene_bundle.sbz，便于带宽受限时同步')
+    parser.add_argument('dataset_path', help='数据集目录，每个子文件夹为一个场景')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1,
+                        help='并行工作进程数 (默认: CPU核数)')
+    parser.add_argument('--mesh-name', default='mesh_aligned_0.05.ply', help='场景mesh文件名')
+    parser.add_argument('--compression', choices=sorted(COMPRESSORS), default='zlib',
+                        help='块压缩方式 (默认: zlib)')
+    parser.add_argument('--block-size', type=int, default=DEFAULT_BLOCK_SIZE,
+                        help='每个块的行数 (顶点或三角形)')
+    parser.add_argument('--scenes', nargs='+', default=None, help='只处理指定的场景')
+    parser.add_argument('--report', default=None, help='把每个场景的误差和压缩比写入JSON文件')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    from data_preprocess import list_scenes
+
+    scenes = args.scenes if args.scenes else list_scenes(args.dataset_path)
+    scene_dirs = [os.path.join(args.dataset_path, name) for name in scenes]
+    results = []
+
+    def report(result):
+        results.append(result)
+        prefix = f'[{len(results)}/{len(scene_dirs)}] {result["scene"]}'
+        if result['status'] == 'ok':
+            error = max(result['max_position_error'])
+            bound = max(result['position_error_bound'])
+            print(f'{prefix}: {result["raw_bytes"] / 2**20:.1f}MB -> {result["bytes"] / 2**20:.1f}MB '
+                  f'({result["raw_bytes"] / max(result["bytes"], 1):.1f}x), '
+                  f'最大坐标误差 {error * 1000:.3f}mm (上界 {bound * 1000:.3f}mm)')
+        else:
+            print(f'{prefix}: 出错 {result["error"]}')
+
+    if args.workers <= 1 or len(scene_dirs) <= 1:
+        for scene_dir in scene_dirs:
+            report(run_scene(scene_dir, args.mesh_name, args.compression, args.block_size))
+    else:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            futures = [executor.submit(run_scene, d, args.mesh_name, args.compression, args.block_size)
+                       for d in scene_dirs]
+            for future in as_completed(futures):
+                report(future.result())
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(sorted(results, key=lambda r: r['scene']), f, ensure_ascii=False, indent=4)
+    failed = sorted(r['scene'] for r in results if r['status'] != 'ok')
+    print(f'完成: 成功 {len(results) - len(failed)}, 失败 {len(failed)}')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
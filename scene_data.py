@@ -0,0 +1,202 @@
+import os
+import json
+
+import numpy as np
+
+INSTANCE_FILE = 'instance.npy'
+INSTANCE_META_FILE = 'instance_meta.json'
+
+INSTANCE_FORMAT_VERSION = 1
+
+
+def instance_dtype(min_id, max_id):
+    """能容纳实例ID范围的最小整数类型"""
+    if min_id >= 0 and max_id <= np.iinfo(np.uint16).max:
+        return np.dtype(np.uint16)
+    if min_id >= np.iinfo(np.int32).min and max_id <= np.iinfo(np.int32).max:
+        return np.dtype(np.int32)
+    return np.dtype(np.int64)
+
+
+def instance_meta_path(mask_path):
+    """instance.npy 对应的元数据文件路径 (instance_meta.json)"""
+    return os.path.splitext(mask_path)[0] + '_meta.json'
+
+
+def save_npy_atomic(path, array):
+    """先写临时文件再替换，避免中断时留下残缺文件"""
+    tmp_path = f'{path}.tmp.{os.getpid()}'
+    try:
+        with open(tmp_path, 'wb') as f:
+            np.save(f, array)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def write_json_atomic(path, data, **kwargs):
+    """原子地写入JSON文件"""
+    tmp_path = f'{path}.tmp.{os.getpid()}'
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, **kwargs)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def save_instance_mask(mask_path, mask):
+    """保存整数实例掩码及其元数据 (实例数、顶点数)"""
+    present = np.unique(mask)
+    meta = {
+        'format_version': INSTANCE_FORMAT_VERSION,
+        'dtype': mask.dtype.name,
+        'num_vertices': int(mask.shape[0]),
+        'num_instances': int(np.count_nonzero(present)),
+        'max_id': int(present[-1]) if present.size else 0,
+    }
+    save_npy_atomic(mask_path, mask)
+    # 元数据在掩码之后写入，保证其修改时间不早于掩码
+    write_json_atomic(instance_meta_path(mask_path), meta, indent=4)
+    return meta
+
+
+def read_instance_meta(mask_path):
+    """读取与掩码匹配的元数据，不存在或已过期时返回None"""
+    meta_path = instance_meta_path(mask_path)
+    try:
+        if os.stat(meta_path).st_mtime_ns < os.stat(mask_path).st_mtime_ns:
+            return None
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_instance_mask(mask_path):
+    """以内存映射方式加载实例掩码，返回 (mask, 实例数)
+
+    旧版本生成的float掩码会被转换为整数数组，实例数通过np.unique统计。
+    """
+    mask = np.load(mask_path, mmap_mode='r')
+    meta = read_instance_meta(mask_path)
+    if (meta is not None and mask.dtype.kind in 'iu'
+            and meta.get('dtype') == mask.dtype.name
+            and meta.get('num_vertices') == mask.shape[0]):
+        return mask, meta['num_instances']
+
+    # 旧格式或缺少元数据
+    if mask.dtype.kind == 'f':
+        values = np.asarray(mask)
+        mask = values.astype(instance_dtype(values.min(initial=0), values.max(initial=0)))
+    present = np.unique(mask)
+    return mask, int(np.count_nonzero(present))
+
+
+INSTANCE_INDEX_FILE = 'instance_index.npz'
+
+
+class InstanceIndex:
+    """实例→顶点的CSR索引
+
+    vertices 按实例ID分组排列，ids[i] 的顶点为 vertices[offsets[i]:offsets[i + 1]]，
+    因此取k个实例的顶点只需访问这些实例自身的顶点。
+    """
+
+    def __init__(self, ids, offsets, vertices):
+        self.ids = ids
+        self.offsets = offsets
+        self.vertices = vertices
+
+    @property
+    def num_vertices(self):
+        return int(self.vertices.shape[0])
+
+    @classmethod
+    def build(cls, mask):
+        """从实例掩码构建索引 (稳定排序，组内顶点保持升序)"""
+        mask = np.asarray(mask)
+        index_dtype = np.int32 if mask.shape[0] <= np.iinfo(np.int32).max else np.int64
+        order = np.argsort(mask, kind='stable').astype(index_dtype, copy=False)
+        ids, starts = np.unique(mask[order], return_index=True)
+        offsets = np.append(starts, mask.shape[0]).astype(np.int64)
+        return cls(ids, offsets, order)
+
+    def counts(self):
+        return np.diff(self.offsets)
+
+    def vertices_of(self, object_ids):
+        """返回若干实例的全部顶点索引，不存在的ID被忽略"""
+        slices = []
+        for object_id in object_ids:
+            position = np.searchsorted(self.ids, object_id)
+            if position < self.ids.shape[0] and self.ids[position] == object_id:
+                slices.append(self.vertices[self.offsets[position]:self.offsets[position + 1]])
+        if not slices:
+            return self.vertices[:0]
+        return np.concatenate(slices)
+
+    def save(self, path):
+        tmp_path = f'{path}.tmp.{os.getpid()}.npz'
+        try:
+            np.savez(tmp_path, ids=self.ids, offsets=self.offsets, vertices=self.vertices)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['ids'], data['offsets'], data['vertices'])
+
+
+def instance_index_path(mask_path):
+    return os.path.join(os.path.dirname(mask_path), INSTANCE_INDEX_FILE)
+
+
+def load_instance_index(mask_path, mask=None, save=True):
+    """读取与掩码匹配的CSR索引缓存，缺失或过期时重新构建；save 为True时把重建的索引写回磁盘"""
+    index_path = instance_index_path(mask_path)
+    try:
+        if os.stat(index_path).st_mtime_ns >= os.stat(mask_path).st_mtime_ns:
+            index = InstanceIndex.load(index_path)
+            if mask is None or index.num_vertices == mask.shape[0]:
+                return index
+    except (OSError, ValueError, KeyError):
+        pass
+
+    if mask is None:
+        mask, _ = load_instance_mask(mask_path)
+    index = InstanceIndex.build(mask)
+    if save:
+        try:
+            index.save(index_path)
+        except OSError:
+            # 只读目录下仍可使用内存中的索引
+            pass
+    return index
+
+
+INSTANCE_STATS_FILE = 'instance_stats.npy'
+
+
+def load_instance_stats(scene_dir):
+    """读取实例统计表 (结构化数组，按id排序)，不存在时返回None
+
+    每行包含 id、label、vertex_count、centroid、aabb_min/aabb_max、obb_center/obb_R/obb_extent。
+    """
+    path = os.path.join(scene_dir, INSTANCE_STATS_FILE)
+    if not os.path.exists(path):
+        return None
+    return np.load(path)
+
+
+def find_instance(stats, object_id):
+    """在统计表中查找某个实例，返回该行或None"""
+    position = np.searchsorted(stats['id'], object_id)
+    if position < stats.shape[0] and stats['id'][position] == object_id:
+        return stats[position]
+    return None
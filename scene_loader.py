@@ -0,0 +1,49 @@
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from picking_proxy import DEFAULT_PICK_POINTS, scene_picking_proxy
+from scene_session import SceneLoadCancelled, SceneSession
+
+
+class SceneLoader(QThread):
+    """在后台线程中打开场景 (查找文件、加载掩码和索引、读取mesh、构建点选代理)，避免阻塞界面
+
+    结果通过信号交给界面线程；cancel() 在下一步开始前生效，已在读取中的文件会读完后被丢弃。
+    """
+
+    progress = pyqtSignal(str, str)  # 场景目录, 进度信息
+    loaded = pyqtSignal(object)  # SceneSession
+    failed = pyqtSignal(str, object)  # 场景目录, 异常
+    cancelled = pyqtSignal(str)  # 场景目录
+
+    def __init__(self, scene_dir, prefetch=False, pick_points=DEFAULT_PICK_POINTS, parent=None):
+        super().__init__(parent)
+        self.scene_dir = scene_dir
+        self.prefetch = prefetch  # 预取的场景只在用户切换过去时才使用
+        self.pick_points = pick_points  # 预先构建的点选代理的点数上限，None表示全分辨率
+        self._cancel_requested = False
+
+    def cancel(self):
+        self._cancel_requested = True
+
+    def is_cancelled(self):
+        return self._cancel_requested
+
+    def report(self, message):
+        if self._cancel_requested:
+            raise SceneLoadCancelled(self.scene_dir)
+        self.progress.emit(self.scene_dir, message)
+
+    def run(self):
+        try:
+            session = SceneSession.open(self.scene_dir, progress=self.report)
+            self.report('正在读取mesh...')
+            session.mesh()
+            self.report('正在构建点选代理...')
+            scene_picking_proxy(session, self.pick_points)
+            if self._cancel_requested:
+                raise SceneLoadCancelled(self.scene_dir)
+            self.loaded.emit(session)
+        except SceneLoadCancelled:
+            self.cancelled.emit(self.scene_dir)
+        except Exception as e:
+            self.failed.emit(self.scene_dir, e)
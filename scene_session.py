@@ -0,0 +1,241 @@
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+from scene_data import INSTANCE_FILE, load_instance_index, load_instance_mask
+from scene_bundle import bundle_is_current, find_bundle, open_bundle, read_scene_mesh
+
+# 标注工具默认缓存最近打开的场景数和内存预算
+DEFAULT_CACHE_SCENES = 3
+DEFAULT_CACHE_MB = 2048
+
+
+class SceneLoadCancelled(Exception):
+    """后台加载被取消 (由progress回调抛出)"""
+
+
+class SceneLoadError(Exception):
+    """场景目录缺少文件或无法读取；title 和 status 供界面显示"""
+
+    def __init__(self, message, title='文件错误', status=None):
+        super().__init__(message)
+        self.title = title
+        self.status = status or message
+
+
+def find_mesh_file(scene_dir, scene_name):
+    """按优先级查找场景mesh：mesh_aligned_0.05.ply > <场景名>.ply > mesh.ply > 任意ply"""
+    ply_files = [f for f in os.listdir(scene_dir) if f.endswith('.ply')]
+    for name in ('mesh_aligned_0.05.ply', f'{scene_name}.ply', 'mesh.ply'):
+        if name in ply_files:
+            return name
+    return ply_files[0] if ply_files else None
+
+
+def find_instance_file(scene_dir):
+    """优先使用预处理生成的instance.npy，其次文件名含instance的npy，最后任意npy"""
+    npy_files = [f for f in os.listdir(scene_dir) if f.endswith('.npy')]
+    if INSTANCE_FILE in npy_files:
+        return INSTANCE_FILE
+    for npy_file in npy_files:
+        if 'instance' in npy_file.lower():
+            return npy_file
+    return npy_files[0] if npy_files else None
+
+
+def resident_nbytes(array):
+    """数组实际占用的内存字节数；内存映射的数组由页缓存承担，不计入"""
+    if array is None or isinstance(array, np.memmap):
+        return 0
+    return int(getattr(array, 'nbytes', 0))
+
+
+def sibling_scenes(scene_dir):
+    """与场景同级的所有场景文件夹 (按名称排序)，用于切换和预取下一个场景"""
+    parent = os.path.dirname(os.path.normpath(scene_dir))
+    try:
+        names = sorted(name for name in os.listdir(parent) if os.path.isdir(os.path.join(parent, name)))
+    except OSError:
+        return []
+    return [os.path.join(parent, name) for name in names]
+
+
+def next_scene(scene_dir):
+    """按名称排序的下一个同级场景，已是最后一个时返回None"""
+    scenes = sibling_scenes(scene_dir)
+    current = os.path.normpath(scene_dir)
+    for i, path in enumerate(scenes):
+        if os.path.normpath(path) == current:
+            return scenes[i + 1] if i + 1 < len(scenes) else None
+    return None
+
+
+def mtime_ns(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class SceneSession:
+    """一个已打开场景的全部数据：mesh、实例掩码、CSR索引以及由它们派生的缓存
+
+    mesh在第一次使用时读取，之后所有操作共享同一个对象；派生数据 (如点选用的点云)
+    通过 derived() 按名称缓存，随会话一起被淘汰。
+    """
+
+    def __init__(self, scene_dir, mesh_path, instance_mask_path, instance_mask, instance_index,
+                 num_instances, bundle=None, status=''):
+        self.scene_dir = scene_dir
+        self.scene_name = os.path.basename(os.path.normpath(scene_dir))
+        self.mesh_path = mesh_path
+        self.instance_mask_path = instance_mask_path
+        self.instance_mask = instance_mask
+        self.instance_index = instance_index
+        self.num_instances = num_instances
+        self.bundle = bundle
+        self.status = status
+        self.loaded_mesh = None
+        self._derived = {}
+        # 打开时输入文件的修改时间，用于判断缓存的会话是否过期
+        self._mtimes = {path: mtime_ns(path) for path in (mesh_path, instance_mask_path)}
+
+    @classmethod
+    def open(cls, scene_dir, progress=None):
+        """查找并打开场景的mesh和实例掩码 (mesh延迟读取)，找不到文件时抛出SceneLoadError
+
+        progress(message) 在每一步之前调用，可在其中抛出SceneLoadCancelled来取消加载。
+        """
+        progress = progress or (lambda message: None)
+        scene_name = os.path.basename(os.path.normpath(scene_dir))
+        progress('正在查找mesh和实例掩码文件...')
+        mesh_file = find_mesh_file(scene_dir, scene_name)
+        bundle_path = find_bundle(scene_dir)
+        if mesh_file:
+            mesh_path = os.path.join(scene_dir, mesh_file)
+        elif bundle_path:
+            # 只同步了bundle的场景
+            mesh_path = bundle_path
+        else:
+            raise SceneLoadError('在选中的目录中没有找到ply文件', status='未找到mesh文件')
+
+        # 优先使用不早于mesh和掩码的bundle
+        fallback_status = None
+        if bundle_path and bundle_is_current(bundle_path, scene_dir, mesh_path if mesh_file else None):
+            progress(f'正在打开 {os.path.basename(bundle_path)}...')
+            try:
+                bundle = open_bundle(bundle_path)
+                return cls(scene_dir, mesh_path, bundle_path, bundle.instance_ids, bundle.index,
+                           bundle.num_instances, bundle=bundle,
+                           status=f'已从bundle加载实例掩码，包含 {bundle.num_instances} 个实例')
+            except Exception as e:
+                fallback_status = f'无法读取bundle，改用PLY和NPY文件: {e}'
+
+        instance_file = find_instance_file(scene_dir)
+        if not instance_file:
+            raise SceneLoadError('在选中的目录中没有找到npy文件', status='未找到实例掩码文件')
+        mask_path = os.path.join(scene_dir, instance_file)
+        progress(f'正在加载实例掩码 {instance_file}...')
+        try:
+            # 内存映射加载，实例数从元数据读取 (兼容旧版float掩码)
+            mask, num_instances = load_instance_mask(mask_path)
+            index = load_instance_index(mask_path, mask)
+        except Exception as e:
+            raise SceneLoadError(f'无法加载实例掩码文件: {e}', title='加载错误',
+                                 status=f'无法加载实例掩码: {e}') from e
+        status = f'已加载实例掩码，包含 {num_instances} 个实例'
+        if fallback_status:
+            status = f'{fallback_status}; {status}'
+        return cls(scene_dir, mesh_path, mask_path, mask, index, num_instances, status=status)
+
+    def mesh(self):
+        """场景mesh，只在第一次调用时读取 (优先从bundle构建)"""
+        if self.loaded_mesh is None:
+            self.loaded_mesh = read_scene_mesh(self.mesh_path, self.bundle)
+        return self.loaded_mesh
+
+    def derived(self, name, build):
+        """按名称缓存由场景数据派生的对象，build() 只在第一次请求时调用"""
+        if name not in self._derived:
+            self._derived[name] = build()
+        return self._derived[name]
+
+    def discard(self, name):
+        self._derived.pop(name, None)
+
+    def is_current(self):
+        """mesh和掩码文件自打开后没有被修改 (例如重新运行了预处理)"""
+        return all(mtime_ns(path) == mtime for path, mtime in self._mtimes.items())
+
+    def nbytes(self):
+        """会话占用的内存估计：mesh按Open3D的float64/int32存储计算，内存映射的数组不计入"""
+        total = 0
+        mesh = self.loaded_mesh
+        if mesh is not None:
+            num_vertices = len(mesh.vertices)
+            vertex_arrays = 1 + mesh.has_vertex_colors() + mesh.has_vertex_normals()
+            total += num_vertices * 3 * 8 * vertex_arrays
+            total += len(mesh.triangles) * 3 * (4 + 8 * mesh.has_triangle_normals())
+        if self.bundle is not None:
+            total += sum(resident_nbytes(array) for array in self.bundle.sections.values())
+        else:
+            total += resident_nbytes(self.instance_mask)
+            index = self.instance_index
+            total += resident_nbytes(index.ids) + resident_nbytes(index.offsets) + resident_nbytes(index.vertices)
+        total += sum(resident_nbytes(value) for value in self._derived.values())
+        return total
+
+
+class SceneCache:
+    """最近打开场景的LRU缓存：超过场景数或内存预算时从最久未使用的场景开始淘汰
+
+    当前场景 (keep) 永远不会被淘汰，即使它单独已超过预算。
+    """
+
+    def __init__(self, max_scenes=DEFAULT_CACHE_SCENES, budget_mb=DEFAULT_CACHE_MB):
+        self.max_scenes = max(1, max_scenes)
+        self.budget_bytes = int(budget_mb * 2**20)
+        self.sessions = OrderedDict()
+
+    def get(self, scene_dir):
+        """返回缓存的会话并标记为最近使用；不存在或文件已变化时返回None"""
+        key = os.path.abspath(scene_dir)
+        session = self.sessions.get(key)
+        if session is None:
+            return None
+        if not session.is_current():
+            del self.sessions[key]
+            return None
+        self.sessions.move_to_end(key)
+        return session
+
+    def __contains__(self, scene_dir):
+        """缓存中有该场景的有效会话 (不改变使用顺序)"""
+        session = self.sessions.get(os.path.abspath(scene_dir))
+        return session is not None and session.is_current()
+
+    def put(self, session, keep=None):
+        """加入一个会话；keep 为需要保留的当前场景 (默认为新加入的会话)"""
+        key = os.path.abspath(session.scene_dir)
+        self.sessions[key] = session
+        self.sessions.move_to_end(key)
+        self.trim(keep=keep or session)
+
+    def nbytes(self):
+        return sum(session.nbytes() for session in self.sessions.values())
+
+    def trim(self, keep=None):
+        """淘汰最久未使用的会话，直到场景数和内存都在预算内；返回被淘汰的场景名"""
+        evicted = []
+        while len(self.sessions) > 1:
+            if len(self.sessions) <= self.max_scenes and self.nbytes() <= self.budget_bytes:
+                break
+            key = next((k for k, s in self.sessions.items() if s is not keep), None)
+            if key is None:
+                break
+            evicted.append(self.sessions.pop(key).scene_name)
+        return evicted
+
+    def clear(self):
+        self.sessions.clear()
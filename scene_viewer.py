@@ -0,0 +1,121 @@
+import time
+
+import numpy as np
+import open3d as o3d
+
+# GLFW键码：Esc 和 Q 结束当前交互但不关闭窗口
+KEY_ESCAPE = 256
+KEY_Q = ord('Q')
+HIGHLIGHT_COLOR = (0.0, 1.0, 0.0)  # 绿色
+DEFAULT_WINDOW_SIZE = (1024, 768)
+# 交互循环中两次处理窗口事件之间的间隔 (秒)
+POLL_INTERVAL = 0.005
+
+
+class SceneViewer:
+    """一个场景的常驻Open3D窗口
+
+    mesh只在创建窗口时上传一次；查看、高亮和设置相机视角都复用同一个窗口，
+    高亮只更新颜色，相机在各操作之间自然保留。按 Esc/Q 结束当前操作，窗口保持打开；
+    用户关闭窗口后下次使用时重新创建。
+
+    窗口直接显示场景会话中的mesh，不复制几何体；高亮直接写入它的颜色数组，
+    只保存被覆盖的那些行，下一次高亮或关闭窗口时恢复。
+    """
+
+    def __init__(self, mesh, scene_name):
+        self.scene_name = scene_name
+        self.mesh = mesh
+        self._highlighted = None  # 当前高亮的顶点索引
+        self._saved_colors = None  # 这些顶点被覆盖前的颜色
+        self.coordinate_frame = o3d.geometry.TriangleMesh.create_coordinate_frame(size=0.5)
+        self.vis = None
+        self.size = None
+        self.done = False
+
+    @property
+    def is_open(self):
+        return self.vis is not None
+
+    def open(self, width=DEFAULT_WINDOW_SIZE[0], height=DEFAULT_WINDOW_SIZE[1]):
+        """窗口未打开或需要不同尺寸 (相机内参与窗口尺寸绑定) 时创建窗口并上传几何体"""
+        if self.vis is not None and self.size == (width, height):
+            return
+        self.close()
+        vis = o3d.visualization.VisualizerWithKeyCallback()
+        vis.create_window(window_name=f'场景: {self.scene_name}', width=width, height=height)
+        vis.add_geometry(self.mesh)
+        vis.add_geometry(self.coordinate_frame)
+        vis.get_render_option().background_color = np.array([1.0, 1.0, 1.0])  # 白色背景
+        for key in (KEY_ESCAPE, KEY_Q):
+            vis.register_key_callback(key, self._finish)
+        self.vis = vis
+        self.size = (width, height)
+
+    def _finish(self, vis):
+        self.done = True
+        return False
+
+    def _restore(self):
+        """恢复上一次高亮覆盖的顶点颜色，没有高亮时返回False"""
+        if self._highlighted is None:
+            return False
+        # np.asarray 直接引用Open3D的颜色缓冲，不复制
+        np.asarray(self.mesh.vertex_colors)[self._highlighted] = self._saved_colors
+        self._highlighted = None
+        self._saved_colors = None
+        return True
+
+    def set_highlight(self, vertex_indices=None, color=HIGHLIGHT_COLOR):
+        """把给定顶点设为高亮色 (None 表示取消高亮)
+
+        只恢复上一次高亮的顶点并保存这次覆盖的顶点，耗时和额外内存都与选中的顶点数成正比。
+        """
+        changed = self._restore()
+        if vertex_indices is not None and len(vertex_indices):
+            colors = np.asarray(self.mesh.vertex_colors)
+            self._highlighted = np.asarray(vertex_indices)
+            self._saved_colors = colors[self._highlighted]
+            colors[self._highlighted] = color
+            changed = True
+        if changed and self.vis is not None:
+            self.vis.update_geometry(self.mesh)
+
+    def set_camera(self, params):
+        """应用PinholeCameraParameters，失败时由Open3D抛出异常"""
+        self.vis.get_view_control().convert_from_pinhole_camera_parameters(params, True)
+
+    def camera_params(self):
+        return self.vis.get_view_control().convert_to_pinhole_camera_parameters()
+
+    def run(self):
+        """交互直到按下 Esc/Q 或关闭窗口，返回结束时的相机参数"""
+        self.done = False
+        while not self.done:
+            if not self.vis.poll_events():
+                break
+            self.vis.update_renderer()
+            time.sleep(POLL_INTERVAL)
+        params = self.camera_params()
+        if not self.done:
+            # 用户关闭了窗口，下次使用时重新创建
+            self.close()
+        return params
+
+    def poll(self):
+        """空闲时由界面定时器调用，保持窗口响应；窗口已被关闭时返回False"""
+        if self.vis is None:
+            return False
+        if not self.vis.poll_events():
+            self.close()
+            return False
+        self.vis.update_renderer()
+        return True
+
+    def close(self):
+        """关闭窗口并恢复mesh的原始颜色 (mesh仍由场景会话缓存)"""
+        self._restore()
+        if self.vis is not None:
+            self.vis.destroy_window()
+            self.vis = None
+            self.size = None
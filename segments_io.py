@@ -0,0 +1,153 @@
+import json
+import warnings
+
+import numpy as np
+
+# 每次从文件读取的字符数
+CHUNK_SIZE = 1 << 20
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+
+
+class _StreamReader:
+    """在文本流上维护一个滑动缓冲区，按需读取更多内容"""
+
+    def __init__(self, f, chunk_size=CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """丢弃已解析部分并追加一块新内容，文件结束时返回False"""
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """跳过空白并返回下一个字符，文件结束时返回空串"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f'segments_anno.json 格式错误: 期望 {char!r}，得到 {found!r}')
+        self.pos += 1
+
+    def value(self):
+        """解析一个完整的JSON值 (用于segments以外的小字段)"""
+        self.peek()
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # 数字位于缓冲区末尾时可能被截断，需要读到更多内容再确认
+            if end == len(self.buf) and self.fill():
+                continue
+            self.pos = end
+            return obj
+
+    def array_text(self):
+        """返回一个不含嵌套的数组 [...] 内部的原始文本"""
+        self.expect('[')
+        scanned = 0
+        while True:
+            end = self.buf.find(']', self.pos + scanned)
+            if end >= 0:
+                break
+            scanned = len(self.buf) - self.pos
+            if not self.fill():
+                raise ValueError('segments_anno.json 格式错误: 数组未闭合')
+        text = self.buf[self.pos:end]
+        self.pos = end + 1
+        return text
+
+
+def parse_int_array(text):
+    """把逗号分隔的整数文本直接转换为int64数组，不经过Python int列表"""
+    text = text.strip()
+    if not text:
+        return np.empty(0, dtype=np.int64)
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            values = np.fromstring(text, dtype=np.int64, sep=',')
+        if values.size == text.count(',') + 1:
+            return values
+    except (ValueError, DeprecationWarning):
+        pass
+    # 非常规内容 (如 1.0 或嵌套数组) 交给json解析，并保持原有的报错行为
+    return np.asarray(json.loads(f'[{text}]'), dtype=np.int64)
+
+
+def _read_group(reader, skip_segments):
+    group = {}
+    reader.expect('{')
+    if reader.peek() == '}':
+        reader.pos += 1
+        return group
+    while True:
+        key = reader.value()
+        reader.expect(':')
+        if key == 'segments' and reader.peek() == '[':
+            text = reader.array_text()
+            if not skip_segments:
+                group[key] = parse_int_array(text)
+        else:
+            group[key] = reader.value()
+        if reader.peek() == ',':
+            reader.pos += 1
+            continue
+        reader.expect('}')
+        return group
+
+
+def iter_seg_groups(path, skip_segments=False, chunk_size=CHUNK_SIZE):
+    """逐个读取 segments_anno.json 中的 segGroups
+
+    每个segGroup以dict返回，其中 segments 为int64数组；峰值内存只取决于最大的单个segGroup。
+    skip_segments 为True时不解析segments (只需要objectId/label的场合)。
+    文件中没有 segGroups 时抛出KeyError (与 json.load(f)['segGroups'] 一致)。
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        reader = _StreamReader(f, chunk_size)
+        reader.expect('{')
+        if reader.peek() == '}':
+            raise KeyError('segGroups')
+        while True:
+            key = reader.value()
+            reader.expect(':')
+            if key == 'segGroups':
+                reader.expect('[')
+                if reader.peek() == ']':
+                    return
+                while True:
+                    yield _read_group(reader, skip_segments)
+                    if reader.peek() == ',':
+                        reader.pos += 1
+                        continue
+                    reader.expect(']')
+                    return
+            reader.value()
+            if reader.peek() == ',':
+                reader.pos += 1
+                continue
+            reader.expect('}')
+            raise KeyError('segGroups')
@@ -0,0 +1,113 @@
+import os
+import time
+import cProfile
+import pstats
+from contextlib import contextmanager
+
+STAGE_FIELDS = ('seconds', 'calls', 'bytes_read', 'bytes_written', 'records')
+
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+class StageTimer:
+    """按阶段累计耗时、读写字节数和记录数，结果为可直接写入JSON的dict"""
+
+    def __init__(self):
+        self.stages = {}
+
+    def add(self, name, seconds=0.0, bytes_read=0, bytes_written=0, records=0, calls=1):
+        stage = self.stages.setdefault(name, dict.fromkeys(STAGE_FIELDS, 0))
+        stage['seconds'] += seconds
+        stage['calls'] += calls
+        stage['bytes_read'] += bytes_read
+        stage['bytes_written'] += bytes_written
+        stage['records'] += records
+
+    @contextmanager
+    def stage(self, name, bytes_read=0, records=0):
+        """计时一个阶段；写入字节数等在阶段内才知道的量可以事后用 add(name, calls=0, ...) 补充"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start, bytes_read=bytes_read, records=records)
+
+    def as_dict(self):
+        return {name: dict(stage) for name, stage in self.stages.items()}
+
+
+def merge_stages(total, stages):
+    """把一个场景的阶段统计累加到全局统计中"""
+    for name, stage in stages.items():
+        merged = total.setdefault(name, dict.fromkeys(STAGE_FIELDS, 0))
+        for field in STAGE_FIELDS:
+            merged[field] += stage.get(field, 0)
+    return total
+
+
+def _pad(text, width):
+    """按显示宽度右对齐 (中文字符占两列)"""
+    display = sum(2 if ord(ch) > 0x2e80 else 1 for ch in text)
+    return ' ' * max(width - display, 0) + text
+
+
+def format_stages(stages):
+    """全局阶段统计的文本表格，按耗时从高到低排列"""
+    total = sum(stage['seconds'] for stage in stages.values()) or 1e-9
+    headers = ('耗时(s)', '占比', '次数', '读(MB)', '写(MB)', '记录数')
+    lines = ['阶段' + ' ' * 16 + ''.join(_pad(h, 11) for h in headers)]
+    for name, stage in sorted(stages.items(), key=lambda item: -item[1]['seconds']):
+        lines.append(f'{name:<20}{stage["seconds"]:>11.3f}{stage["seconds"] / total:>11.1%}{stage["calls"]:>11}'
+                     f'{stage["bytes_read"] / 2**20:>11.1f}{stage["bytes_written"] / 2**20:>11.1f}'
+                     f'{stage["records"]:>11}')
+    return '\n'.join(lines)
+
+
+# 每个工作进程一个profiler，跨任务累计
+_profiler = None
+
+
+class Profiled:
+    """用cProfile包装任务函数；每个任务结束后把本进程累计的结果写入 <profile_dir>/worker-<pid>.pstats
+
+    实例可以被pickle，因此可以直接提交给ProcessPoolExecutor。
+    """
+
+    def __init__(self, fn, profile_dir):
+        self.fn = fn
+        self.profile_dir = profile_dir
+
+    def __call__(self, *args, **kwargs):
+        global _profiler
+        if _profiler is None:
+            _profiler = cProfile.Profile()
+        _profiler.enable()
+        try:
+            return self.fn(*args, **kwargs)
+        finally:
+            _profiler.disable()
+            _profiler.dump_stats(os.path.join(self.profile_dir, f'worker-{os.getpid()}.pstats'))
+
+
+def prepare_profile_dir(profile_dir):
+    """创建profile目录并删除上次运行留下的工作进程结果"""
+    os.makedirs(profile_dir, exist_ok=True)
+    for name in os.listdir(profile_dir):
+        if name.startswith('worker-') and name.endswith('.pstats'):
+            os.remove(os.path.join(profile_dir, name))
+
+
+def merge_profiles(profile_dir, output_name='combined.pstats'):
+    """合并所有工作进程的pstats，返回合并后的文件路径；没有结果时返回None"""
+    paths = sorted(os.path.join(profile_dir, name) for name in os.listdir(profile_dir)
+                   if name.startswith('worker-') and name.endswith('.pstats'))
+    if not paths:
+        return None
+    output = os.path.join(profile_dir, output_name)
+    pstats.Stats(*paths).dump_stats(output)
+    return output
@@ -0,0 +1,190 @@
+import os
+import sys
+import json
+import argparse
+
+import numpy as np
+
+LABELS = [
+    'chair', 'table', 'door', 'window', 'sofa', 'bed', 'cabinet', 'shelf', 'lamp', 'monitor',
+    'computer tower', 'keyboard', 'trash can', 'whiteboard', 'pillow', 'plant', 'toilet',
+    'sink', 'radiator', 'bottle', 'pen holder', 'headphones', 'book', 'box', 'backpack',
+]
+
+PHRASES = [
+    '站在门后，望向正前方，左手边的', '坐在背靠白板的椅子看向室内，右手边最近的',
+    '站在房间的正中央，面向窗户，前方最近的', '刚进门背对着门，正对着我可以承载东西的物体是？#',
+    '离白板最远的', '桌子上的', '更远离门的', 'What is the object closest to the window?',
+    '坐在沙发靠近窗户的一侧，左边的', '主机上的',
+]
+
+
+def write_binary_ply(path, positions, colors, triangles):
+    """写出与ScanNet++相同布局的binary_little_endian网格"""
+    vertex = np.empty(positions.shape[0], dtype=[('x', '<f4'), ('y', '<f4'), ('z', '<f4'),
+                                                  ('red', 'u1'), ('green', 'u1'), ('blue', 'u1')])
+    vertex['x'], vertex['y'], vertex['z'] = positions.T
+    vertex['red'], vertex['green'], vertex['blue'] = colors.T
+    face = np.empty(triangles.shape[0], dtype=[('n', 'u1'), ('v', '<i4', (3,))])
+    face['n'] = 3
+    face['v'] = triangles
+    header = (
+        'ply\n'
+        'format binary_little_endian 1.0\n'
+        f'element vertex {positions.shape[0]}\n'
+        'property float x\nproperty float y\nproperty float z\n'
+        'property uchar red\nproperty uchar green\nproperty uchar blue\n'
+        f'element face {triangles.shape[0]}\n'
+        'property list uchar int vertex_indices\n'
+        'end_header\n'
+    )
+    with open(path, 'wb') as f:
+        f.write(header.encode('ascii'))
+        f.write(vertex.tobytes())
+        f.write(face.tobytes())
+
+
+def camera_params(rng):
+    """随机但合法的相机参数 (外参为刚体变换)"""
+    q = rng.normal(size=4)
+    w, x, y, z = q / np.linalg.norm(q)
+    rotation = np.array([
+        [1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)],
+        [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)],
+        [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)],
+    ])
+    extrinsic = np.eye(4)
+    extrinsic[:3, :3] = rotation
+    extrinsic[:3, 3] = rng.uniform(-3, 3, size=3)
+    return {
+        'extrinsic': extrinsic.tolist(),
+        'intrinsic': {'width': 1024, 'height': 768, 'fx': 665.1, 'fy': 665.1, 'cx': 511.5, 'cy': 383.5},
+        'position': (-extrinsic[:3, 3]).tolist(),
+        'direction': (-extrinsic[2, :3]).tolist(),
+        'up': extrinsic[1, :3].tolist(),
+        'view_description': str(rng.choice(['俯视角度', '正面视图', '门口视角', ''])),
+    }
+
+
+def generate_scene(scene_dir, num_vertices=100000, num_instances=50, segments_per_group=None,
+                   num_annotations=20, num_abs_annotations=10, overlap_fraction=0.0, seed=0):
+    """在 scene_dir 下生成与真实数据相同布局的合成场景
+
+    segments_per_group 指定每个segGroup的segments长度 (默认由顶点数和实例数决定，约70%的顶点属于实例)；
+    overlap_fraction 为被两个实例同时声明的顶点比例。
+    """
+    rng = np.random.default_rng(seed)
+    scene_id = os.path.basename(os.path.normpath(scene_dir))
+    os.makedirs(scene_dir, exist_ok=True)
+
+    # 每个实例在房间中占据一个小盒子，背景顶点散布在整个房间
+    if segments_per_group is None:
+        segments_per_group = max(1, int(num_vertices * 0.7) // max(num_instances, 1))
+    segments_per_group = min(segments_per_group, num_vertices // max(num_instances, 1))
+    instance_vertices = segments_per_group * num_instances
+    order = rng.permutation(num_vertices)
+    positions = rng.uniform([0, 0, 0], [8, 6, 3], size=(num_vertices, 3))
+    centers = rng.uniform([0.5, 0.5, 0.2], [7.5, 5.5, 2.5], size=(num_instances, 3))
+    sizes = rng.uniform(0.1, 0.8, size=(num_instances, 3))
+    groups = order[:instance_vertices].reshape(num_instances, segments_per_group) \
+        if num_instances else np.zeros((0, 0), dtype=np.int64)
+    for k in range(num_instances):
+        positions[groups[k]] = centers[k] + rng.uniform(-0.5, 0.5, size=(segments_per_group, 3)) * sizes[k]
+    positions = positions.astype(np.float32)
+    colors = rng.integers(0, 256, size=(num_vertices, 3), dtype=np.uint8)
+
+    # 相邻顶点组成三角形，约2N个面
+    num_triangles = max(0, 2 * (num_vertices - 2))
+    base = np.arange(num_triangles) // 2
+    triangles = np.stack([base, base + 1, base + 2], axis=1).astype(np.int32)
+    triangles[1::2] = triangles[1::2][:, [0, 2, 1]]
+    write_binary_ply(os.path.join(scene_dir, 'mesh_aligned_0.05.ply'), positions, colors, triangles)
+
+    seg_groups = []
+    labels = []
+    for k in range(num_instances):
+        segments = groups[k]
+        if overlap_fraction > 0 and num_instances > 1:
+            other = groups[(k + 1) % num_instances]
+            segments = np.concatenate([segments, other[:int(len(other) * overlap_fraction)]])
+        label = LABELS[rng.integers(len(LABELS))]
+        labels.append(label)
+        seg_groups.append({
+            'id': k + 1,
+            'objectId': k + 1,
+            'label': label,
+            'segments': np.sort(segments).tolist(),
+        })
+    with open(os.path.join(scene_dir, 'segments_anno.json'), 'w', encoding='utf-8') as f:
+        json.dump({'sceneId': scene_id, 'segGroups': seg_groups}, f)
+
+    annotations = []
+    for _ in range(num_annotations if num_instances else 0):
+        count = min(int(rng.integers(1, 4)), num_instances)
+        object_ids = sorted(int(i) + 1 for i in rng.choice(num_instances, size=count, replace=False))
+        description = str(rng.choice(PHRASES))
+        if rng.random() < 0.2:
+            description += labels[object_ids[0] - 1]
+        params = camera_params(rng) if rng.random() < 0.5 else {}
+        full_text = description
+        if params.get('view_description'):
+            full_text = f"[{params['view_description']}] {description}"
+        for object_id in object_ids:
+            full_text += f' [{object_id}]'
+        annotations.append({'description': description, 'object_ids': object_ids,
+                            'full_text': full_text, 'camera_params': params})
+    with open(os.path.join(scene_dir, f'{scene_id}_annotations.json'), 'w', encoding='utf-8') as f:
+        json.dump(annotations, f, indent=4, ensure_ascii=False)
+
+    abs_annotations = []
+    for _ in range(num_abs_annotations if num_instances >= 2 else 0):
+        pair = rng.choice(num_instances, size=2, replace=False)
+        point1 = positions[groups[pair[0]][rng.integers(segments_per_group)]].astype(np.float64)
+        point2 = positions[groups[pair[1]][rng.integers(segments_per_group)]].astype(np.float64)
+        abs_annotations.append({
+            'description': str(rng.choice(['离靠近背靠白板的', '离', ''])),
+            'object_ids': [int(pair[0]) + 1, int(pair[1]) + 1],
+            'distance_m': round(float(np.linalg.norm(point1 - point2)), 4),
+            'point1': point1.tolist(),
+            'point2': point2.tolist(),
+        })
+    with open(os.path.join(scene_dir, f'{scene_id}_abs_annotations.json'), 'w', encoding='utf-8') as f:
+        json.dump(abs_annotations, f, indent=4, ensure_ascii=False)
+
+
+def generate_dataset(root, num_scenes, seed=0, **scene_kwargs):
+    """生成 num_scenes 个场景，返回场景目录列表；相同参数和种子生成的数据完全相同"""
+    scene_dirs = []
+    for i in range(num_scenes):
+        scene_dir = os.path.join(root, f'synth{i:04d}')
+        generate_scene(scene_dir, seed=seed * 100003 + i, **scene_kwargs)
+        scene_dirs.append(scene_dir)
+    return scene_dirs
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='生成确定性的合成场景 (mesh、segments_anno.json 和标注文件)')
+    parser.add_argument('root', help='输出目录')
+    parser.add_argument('--scenes', type=int, default=4, help='场景数')
+    parser.add_argument('--vertices', type=int, default=100000, help='每个场景的顶点数')
+    parser.add_argument('--instances', type=int, default=50, help='每个场景的实例数')
+    parser.add_argument('--segments-per-group', type=int, default=None, help='每个segGroup的segments长度')
+    parser.add_argument('--annotations', type=int, default=20, help='每个场景的常规标注数')
+    parser.add_argument('--abs-annotations', type=int, default=10, help='每个场景的距离标注数')
+    parser.add_argument('--overlap', type=float, default=0.0, help='被两个实例同时声明的顶点比例')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    scene_dirs = generate_dataset(args.root, args.scenes, seed=args.seed, num_vertices=args.vertices,
+                                  num_instances=args.instances, segments_per_group=args.segments_per_group,
+                                  num_annotations=args.annotations, num_abs_annotations=args.abs_annotations,
+                                  overlap_fraction=args.overlap)
+    print(f'已生成 {len(scene_dirs)} 个场景到 {args.root}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,16 +1,23 @@
 import sys
 import os
 import json
+import argparse
 import open3d as o3d
 import numpy as np
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QVBoxLayout, QHBoxLayout, 
                             QWidget, QPushButton, QFileDialog, QLabel, QTextEdit, 
-                            QListWidget, QMessageBox, QListWidgetItem, QInputDialog)
-from PyQt5.QtCore import Qt
+                            QListWidget, QMessageBox, QListWidgetItem, QInputDialog, QCheckBox)
+from PyQt5.QtCore import Qt, QThread, QTimer
 from PyQt5.QtGui import QFont
 
+from picking_proxy import DEFAULT_PICK_POINTS, scene_picking_proxy
+from scene_data import write_json_atomic
+from scene_session import DEFAULT_CACHE_MB, DEFAULT_CACHE_SCENES, SceneCache, SceneLoadError, next_scene
+from scene_loader import SceneLoader
+from scene_viewer import SceneViewer
+
 class MeshAnnotator(QMainWindow):
-    def __init__(self):
+    def __init__(self, cache_scenes=DEFAULT_CACHE_SCENES, cache_mb=DEFAULT_CACHE_MB, pick_points=DEFAULT_PICK_POINTS):
         super().__init__()
         
         self.setWindowTitle("3D场景标注工具")
@@ -32,8 +39,13 @@ class MeshAnnotator(QMainWindow):
         self.visualize_button.clicked.connect(self.visualize_scene)
         self.visualize_button.setEnabled(False)
         
+        self.next_scene_button = QPushButton("下一个场景")
+        self.next_scene_button.clicked.connect(self.open_next_scene)
+        self.next_scene_button.setEnabled(False)
+        
         top_layout.addWidget(self.scene_path_label)
         top_layout.addWidget(self.browse_button)
+        top_layout.addWidget(self.next_scene_button)
         top_layout.addWidget(self.visualize_button)
         
         main_layout.addLayout(top_layout)
@@ -51,9 +63,14 @@ class MeshAnnotator(QMainWindow):
         self.add_description_button.clicked.connect(self.add_description)
         self.add_description_button.setEnabled(False)
         
+        # 默认在降采样的点选代理上点选，密集场景下交互更流畅
+        self.full_res_pick_checkbox = QCheckBox("全分辨率点选")
+        self.full_res_pick_checkbox.setToolTip("使用mesh的全部顶点进行点选 (密集场景下较慢)")
+        
         left_layout.addWidget(self.description_label)
         left_layout.addWidget(self.description_input)
         left_layout.addWidget(self.add_description_button)
+        left_layout.addWidget(self.full_res_pick_checkbox)
         
         # 右侧 - 标注列表
         right_layout = QVBoxLayout()
@@ -104,6 +121,16 @@ class MeshAnnotator(QMainWindow):
         self.instance_mask_path = ""
         self.mesh = None
         self.instance_mask = None
+        self.instance_index = None  # 实例→顶点CSR索引
+        self.bundle = None  # scene_bundle.bin (内存映射) 或 scene_bundle.sbz (解码后)，可选
+        self.session = None  # 当前场景的会话，持有mesh、掩码、索引和派生数据
+        self.scene_cache = SceneCache(cache_scenes, cache_mb)  # 最近打开场景的LRU缓存
+        self.loaders = {}  # 场景目录 → 正在运行的后台加载线程 (含预取)
+        self.pick_points = pick_points if pick_points > 0 else None  # 点选代理的点数上限，None表示全分辨率
+        self.viewer = None  # 当前场景的常驻Open3D查看窗口
+        self.viewer_timer = QTimer(self)
+        self.viewer_timer.setInterval(30)
+        self.viewer_timer.timeout.connect(self.pump_viewer)
         
         # 存储标注数据
         self.annotations = []
@@ -125,6 +152,23 @@ class MeshAnnotator(QMainWindow):
         if not dir_path:
             return
         
+        self.open_scene(dir_path)
+        
+    def open_scene(self, dir_path):
+        """切换到指定的场景目录"""
+        
+        # 如果已有修改的标注且未保存，先询问是否保存
+        if self.annotations and self.annotations_modified:
+            reply = QMessageBox.question(self, '保存标注', 
+                                        '当前场景的标注已修改但尚未保存。\n是否在加载新场景前保存标注？',
+                                        QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel, 
+                                        QMessageBox.Yes)
+            
+            if reply == QMessageBox.Yes:
+                self.save_annotations()
+            elif reply == QMessageBox.Cancel:
+                return  # 取消加载新场景
+        
         self.scene_dir = dir_path
         self.scene_name = os.path.basename(dir_path)
         self.scene_path_label.setText(f"当前场景: {self.scene_name}")
@@ -139,64 +183,42 @@ class MeshAnnotator(QMainWindow):
         
         self.status_label.setText(f"状态: 正在查找场景 {self.scene_name} 的文件...")
         
-        # 查找ply文件
-        ply_files = [f for f in os.listdir(self.scene_dir) if f.endswith('.ply')]
-        
-        # 修改优先级：首先查找"mesh_aligned_0.05.ply"文件
-        mesh_file = None
-        
-        # 第一优先级：mesh_aligned_0.05.ply
-        if "mesh_aligned_0.05.ply" in ply_files:
-            mesh_file = "mesh_aligned_0.05.ply"
-        # 第二优先级：与场景同名的ply文件
-        elif f"{self.scene_name}.ply" in ply_files:
-            mesh_file = f"{self.scene_name}.ply"
-        # 第三优先级：mesh.ply
-        elif "mesh.ply" in ply_files:
-            mesh_file = "mesh.ply"
-        # 如果都没找到，使用第一个ply文件
-        elif ply_files:
-            mesh_file = ply_files[0]
-        
-        if mesh_file:
-            self.mesh_path = os.path.join(self.scene_dir, mesh_file)
-            self.status_label.setText(f"状态: 找到mesh文件 {mesh_file}")
-        else:
-            self.status_label.setText("状态: 未找到mesh文件")
-            QMessageBox.warning(self, "文件错误", "在选中的目录中没有找到ply文件")
-            return
-        
-        # 查找npy文件
-        npy_files = [f for f in os.listdir(self.scene_dir) if f.endswith('.npy')]
-        
-        # 优先查找带有instance或instances的npy文件
-        instance_file = None
-        for npy_file in npy_files:
-            if "instance" in npy_file.lower():
-                instance_file = npy_file
-                break
+        # 切换场景时先关闭上一个场景的窗口并丢弃其数据，加载完成前禁用依赖场景数据的按钮
+        self.close_viewer()
+        self.session = None
+        self.mesh = None
+        self.bundle = None
+        self.mesh_path = ""
+        self.instance_mask_path = ""
+        self.instance_mask = None
+        self.instance_index = None
+        self.annotations = []
+        self.current_annotation_index = -1
+        self.update_annotations_list()
+        self.visualize_button.setEnabled(False)
+        self.next_scene_button.setEnabled(False)
+        self.add_description_button.setEnabled(False)
+        self.save_annotations_button.setEnabled(False)
         
-        # 如果没找到，使用第一个npy文件
-        if not instance_file and npy_files:
-            instance_file = npy_files[0]
+        # 取消不再需要的后台加载；正在预取的就是目标场景时让它继续
+        self.cancel_loaders(keep=self.scene_dir)
         
-        if instance_file:
-            self.instance_mask_path = os.path.join(self.scene_dir, instance_file)
-            self.status_label.setText(f"状态: 找到实例掩码文件 {instance_file}")
-        else:
-            self.status_label.setText("状态: 未找到实例掩码文件")
-            QMessageBox.warning(self, "文件错误", "在选中的目录中没有找到npy文件")
+        # 最近打开过且文件没有变化的场景直接复用会话，不再读取mesh和掩码
+        session = self.scene_cache.get(self.scene_dir)
+        if session is not None:
+            self.use_session(session)
+            self.status_label.setText(f"状态: 已从缓存恢复场景 {self.scene_name}，包含 {session.num_instances} 个实例")
+            self.load_scene_annotations()
             return
         
-        # 尝试加载实例掩码
-        try:
-            self.instance_mask = np.load(self.instance_mask_path)
-            self.status_label.setText(f"状态: 已加载实例掩码，包含 {len(np.unique(self.instance_mask))} 个实例")
-        except Exception as e:
-            self.status_label.setText(f"状态: 无法加载实例掩码: {str(e)}")
-            QMessageBox.warning(self, "加载错误", f"无法加载实例掩码文件: {str(e)}")
-            return
+        # 查找文件、加载掩码和读取mesh都在后台线程中进行，完成后由scene_loaded继续
+        loader = self.loaders.get(os.path.abspath(self.scene_dir))
+        if loader is None or loader.is_cancelled():
+            self.start_loader(self.scene_dir)
+        self.status_label.setText(f"状态: 正在后台加载场景 {self.scene_name}...")
         
+    def load_scene_annotations(self):
+        """场景数据就绪后读取标注文件并启用按钮，随后在后台预取下一个场景"""
         # 尝试加载annotations文件
         self.annotations_file_path = os.path.join(self.scene_dir, f"{self.scene_name}_abs_annotations.json")
         if os.path.exists(self.annotations_file_path):
@@ -221,6 +243,120 @@ class MeshAnnotator(QMainWindow):
         self.visualize_button.setEnabled(True)
         self.add_description_button.setEnabled(True)
         self.save_annotations_button.setEnabled(True)
+        self.next_scene_button.setEnabled(next_scene(self.scene_dir) is not None)
+        
+        # 标注当前场景时在后台预取下一个场景
+        self.prefetch_next_scene()
+        
+    def use_session(self, session):
+        """切换到一个场景会话；mesh、掩码和索引都由会话持有，在各操作之间共享"""
+        self.session = session
+        self.mesh_path = session.mesh_path
+        self.bundle = session.bundle
+        self.instance_mask_path = session.instance_mask_path
+        self.instance_mask = session.instance_mask
+        self.instance_index = session.instance_index
+        self.mesh = session.loaded_mesh
+        
+    def load_mesh(self):
+        """当前场景的mesh：由场景会话在第一次使用时读取，之后直接返回同一个对象"""
+        self.mesh = self.session.mesh()
+        # mesh读取后会话变大，按内存预算淘汰其他缓存的场景
+        self.scene_cache.trim(keep=self.session)
+        return self.mesh
+        
+    def start_loader(self, scene_dir, prefetch=False):
+        """启动后台加载线程；预取使用较低的线程优先级"""
+        loader = SceneLoader(scene_dir, prefetch=prefetch, pick_points=self.pick_points, parent=self)
+        loader.progress.connect(self.scene_load_progress)
+        loader.loaded.connect(self.scene_loaded)
+        loader.failed.connect(self.scene_load_failed)
+        loader.finished.connect(lambda: self.loader_finished(loader))
+        self.loaders[os.path.abspath(scene_dir)] = loader
+        loader.start(QThread.LowPriority if prefetch else QThread.InheritPriority)
+        return loader
+        
+    def loader_finished(self, loader):
+        key = os.path.abspath(loader.scene_dir)
+        if self.loaders.get(key) is loader:
+            del self.loaders[key]
+        loader.deleteLater()
+        
+    def cancel_loaders(self, keep=None):
+        """取消除keep以外所有场景的后台加载"""
+        for key, loader in self.loaders.items():
+            if keep is None or key != os.path.abspath(keep):
+                loader.cancel()
+        
+    def stop_loaders(self):
+        """退出前取消并等待所有后台加载线程结束"""
+        self.cancel_loaders()
+        for loader in list(self.loaders.values()):
+            loader.wait()
+        
+    def is_current_scene(self, scene_dir):
+        return bool(self.scene_dir) and os.path.abspath(scene_dir) == os.path.abspath(self.scene_dir)
+        
+    def scene_load_progress(self, scene_dir, message):
+        """在状态栏显示当前场景的加载进度 (预取的进度不显示)"""
+        if self.is_current_scene(scene_dir) and self.session is None:
+            self.status_label.setText(f"状态: [{os.path.basename(scene_dir)}] {message}")
+        
+    def scene_loaded(self, session):
+        """后台加载完成：当前场景直接使用，预取的场景放入缓存等待切换"""
+        if self.is_current_scene(session.scene_dir) and self.session is None:
+            self.scene_cache.put(session)
+            self.use_session(session)
+            self.status_label.setText(f"状态: {session.status}")
+            self.load_scene_annotations()
+        else:
+            self.scene_cache.put(session, keep=self.session)
+        
+    def scene_load_failed(self, scene_dir, error):
+        """当前场景加载失败时提示；预取失败不打扰用户，真正打开该场景时会重新加载并报告"""
+        if not self.is_current_scene(scene_dir):
+            return
+        if isinstance(error, SceneLoadError):
+            self.status_label.setText(f"状态: {error.status}")
+            QMessageBox.warning(self, error.title, str(error))
+        else:
+            self.status_label.setText(f"状态: 加载场景失败: {str(error)}")
+            QMessageBox.warning(self, "加载错误", f"无法加载场景: {str(error)}")
+        
+    def prefetch_next_scene(self):
+        """标注当前场景时，在后台把下一个同级场景读入缓存"""
+        next_dir = next_scene(self.scene_dir)
+        if next_dir is None or next_dir in self.scene_cache or os.path.abspath(next_dir) in self.loaders:
+            return
+        self.start_loader(next_dir, prefetch=True)
+        
+    def open_next_scene(self):
+        """切换到按名称排序的下一个同级场景"""
+        next_dir = next_scene(self.scene_dir) if self.scene_dir else None
+        if next_dir is None:
+            QMessageBox.information(self, "下一个场景", "已经是最后一个场景")
+            return
+        self.open_scene(next_dir)
+        
+    def scene_viewer(self, width=1024, height=768):
+        """当前场景的常驻查看窗口：第一次使用时创建，之后查看、高亮和设置视角都复用同一窗口和相机"""
+        if self.viewer is None:
+            self.viewer = SceneViewer(self.load_mesh(), self.scene_name)
+        self.viewer.open(width, height)
+        # 操作之间由定时器处理窗口事件，保持窗口响应
+        self.viewer_timer.start()
+        return self.viewer
+        
+    def pump_viewer(self):
+        if self.viewer is None or not self.viewer.poll():
+            self.viewer_timer.stop()
+        
+    def close_viewer(self):
+        """关闭当前场景的查看窗口 (切换场景或退出时)"""
+        self.viewer_timer.stop()
+        if self.viewer is not None:
+            self.viewer.close()
+            self.viewer = None
         
     def update_annotations_list(self):
         """更新标注列表显示"""
@@ -253,28 +389,11 @@ class MeshAnnotator(QMainWindow):
         try:
             self.status_label.setText("状态: 正在加载mesh...")
             
-            # 加载mesh
-            self.mesh = o3d.io.read_triangle_mesh(self.mesh_path)
-            
-            # 如果mesh没有顶点颜色，添加默认颜色
-            if not self.mesh.has_vertex_colors():
-                vertices = np.asarray(self.mesh.vertices)
-                colors = np.ones((len(vertices), 3)) * 0.7  # 灰色
-                self.mesh.vertex_colors = o3d.utility.Vector3dVector(colors)
-            
-            # 可视化mesh
-            coordinate_frame = o3d.geometry.TriangleMesh.create_coordinate_frame(size=0.5)
-            vis = o3d.visualization.Visualizer()
-            vis.create_window(window_name=f"场景: {self.scene_name}", width=1024, height=768)
-            vis.add_geometry(self.mesh)
-            vis.add_geometry(coordinate_frame)
-            
-            # 设置为白色背景
-            opt = vis.get_render_option()
-            opt.background_color = np.array([1.0, 1.0, 1.0])  # 白色背景
-            
-            vis.run()
-            vis.destroy_window()
+            # 可视化mesh：复用常驻窗口并恢复原始颜色，相机保持上一次操作结束时的视角
+            viewer = self.scene_viewer()
+            viewer.set_highlight(None)
+            self.status_label.setText(f"状态: 正在查看场景 {self.scene_name}，按Esc或Q结束")
+            viewer.run()
             
             self.status_label.setText(f"状态: 已可视化场景 {self.scene_name}")
             
@@ -285,18 +404,9 @@ class MeshAnnotator(QMainWindow):
     def visualize_updated_mesh(self):
         """可视化更新后的mesh，包括颜色变化"""
         try:
-            coordinate_frame = o3d.geometry.TriangleMesh.create_coordinate_frame(size=0.5)
-            vis = o3d.visualization.Visualizer()
-            vis.create_window(window_name=f"更新后的场景: {self.scene_name}", width=1024, height=768)
-            vis.add_geometry(self.mesh)
-            vis.add_geometry(coordinate_frame)
-            
-            # 设置为白色背景
-            opt = vis.get_render_option()
-            opt.background_color = np.array([1.0, 1.0, 1.0])  # 白色背景
-            
-            vis.run()
-            vis.destroy_window()
+            # 复用常驻窗口，不重新上传mesh
+            viewer = self.scene_viewer()
+            viewer.run()
             
             self.status_label.setText(f"状态: 实时可视化更新后的场景")
             
@@ -304,21 +414,12 @@ class MeshAnnotator(QMainWindow):
             self.status_label.setText(f"状态: 可视化更新后的mesh出错: {str(e)}")
             QMessageBox.warning(self, "可视化错误", f"无法可视化更新后的mesh: {str(e)}")    
 
-    def visualize_highlighted_mesh(self, highlighted_mesh):
-        """可视化高亮后的mesh副本"""
+    def visualize_highlighted_mesh(self, highlight_vertices):
+        """在常驻窗口中把给定顶点高亮为绿色 (只推送颜色更新，不复制也不重新上传mesh)"""
         try:
-            coordinate_frame = o3d.geometry.TriangleMesh.create_coordinate_frame(size=0.5)
-            vis = o3d.visualization.Visualizer()
-            vis.create_window(window_name=f"高亮后的场景: {self.scene_name}", width=1024, height=768)
-            vis.add_geometry(highlighted_mesh)
-            vis.add_geometry(coordinate_frame)
-            
-            # 设置为白色背景
-            opt = vis.get_render_option()
-            opt.background_color = np.array([1.0, 1.0, 1.0])  # 白色背景
-            
-            vis.run()
-            vis.destroy_window()
+            viewer = self.scene_viewer()
+            viewer.set_highlight(highlight_vertices)
+            viewer.run()
             
             self.status_label.setText(f"状态: 高亮后的mesh已可视化")
             
@@ -339,28 +440,32 @@ class MeshAnnotator(QMainWindow):
             QMessageBox.warning(self, "文件错误", "请先选择包含mesh和实例掩码的场景目录")
             return
         
-        # 加载mesh（如果尚未加载）
-        if not self.mesh:
-            try:
-                self.mesh = o3d.io.read_triangle_mesh(self.mesh_path)
-                
-                # 如果mesh没有顶点颜色，添加默认颜色
-                if not self.mesh.has_vertex_colors():
-                    vertices = np.asarray(self.mesh.vertices)
-                    colors = np.ones((len(vertices), 3)) * 0.7  # 灰色
-                    self.mesh.vertex_colors = o3d.utility.Vector3dVector(colors)
-            except Exception as e:
-                self.status_label.setText(f"状态: 加载mesh失败: {str(e)}")
-                QMessageBox.warning(self, "加载错误", f"无法加载mesh: {str(e)}")
-                return
+        # mesh由场景会话持有，只在第一次使用时读取
+        try:
+            self.load_mesh()
+        except Exception as e:
+            self.status_label.setText(f"状态: 加载mesh失败: {str(e)}")
+            QMessageBox.warning(self, "加载错误", f"无法加载mesh: {str(e)}")
+            return
         
         try:
             self.status_label.setText("状态: 进入点选模式，按住Shift并点击两个点...")
             
-            # 创建点云以进行点选
-            pcd = o3d.geometry.PointCloud()
-            pcd.points = o3d.utility.Vector3dVector(np.asarray(self.mesh.vertices))
-            pcd.colors = o3d.utility.Vector3dVector(np.asarray(self.mesh.vertex_colors))
+            # 点选窗口与常驻窗口共用同一份mesh颜色，先取消高亮
+            if self.viewer is not None:
+                self.viewer.set_highlight(None)
+            
+            vertices = np.asarray(self.mesh.vertices)
+            if len(self.instance_mask) != len(vertices):
+                self.status_label.setText(f"状态: 实例掩码大小 ({len(self.instance_mask)}) 与mesh顶点数 ({len(vertices)}) 不匹配")
+                QMessageBox.warning(self, "数据错误", "实例掩码与mesh顶点数量不匹配")
+                return
+            
+            # 在点选代理上点选：每个 (实例, 体素) 保留一个顶点，小实例也不会丢失；
+            # 代理按场景缓存，之后的点选直接复用
+            max_points = None if self.full_res_pick_checkbox.isChecked() else self.pick_points
+            proxy = scene_picking_proxy(self.session, max_points)
+            pcd = proxy.cloud(self.mesh)
             
             # 创建坐标系
             coordinate_frame = o3d.geometry.TriangleMesh.create_coordinate_frame(size=0.5)
@@ -376,12 +481,19 @@ class MeshAnnotator(QMainWindow):
             opt.background_color = np.array([1.0, 1.0, 1.0])  # 白色背景
             opt.point_size = 3.0  # 增大点大小便于选择
             
+            # 沿用常驻查看窗口当前的相机视角
+            if self.viewer is not None and self.viewer.is_open:
+                try:
+                    vis.get_view_control().convert_from_pinhole_camera_parameters(self.viewer.camera_params(), True)
+                except Exception as e:
+                    print(f"应用相机视角失败: {str(e)}")
+            
             # 运行可视化器
             vis.run()
             vis.destroy_window()
             
-            # 获取选中的点索引
-            picked_indices = vis.get_picked_points()
+            # 获取选中的点对应的原始顶点索引
+            picked_indices = proxy.to_vertices(vis.get_picked_points())
             
             if len(picked_indices) != 2:
                 self.status_label.setText("状态: 请点选两个点")
@@ -391,13 +503,6 @@ class MeshAnnotator(QMainWindow):
             # 获取两个点的实例 ID 和坐标
             instance_ids = []
             points = []
-            vertices = np.asarray(self.mesh.vertices)
-            
-            if len(self.instance_mask) != len(vertices):
-                self.status_label.setText(f"状态: 实例掩码大小 ({len(self.instance_mask)}) 与mesh顶点数 ({len(vertices)}) 不匹配")
-                QMessageBox.warning(self, "数据错误", "实例掩码与mesh顶点数量不匹配")
-                return
-            
             for idx in picked_indices:
                 if 0 <= idx < len(self.instance_mask):
                     instance_id = int(self.instance_mask[idx])
@@ -414,16 +519,8 @@ class MeshAnnotator(QMainWindow):
             point1, point2 = points
             distance = np.linalg.norm(point1 - point2)
             
-            # 创建新的mesh副本以进行可视化
-            highlighted_mesh = o3d.geometry.TriangleMesh(self.mesh)  # 复制原始mesh
-            colors = np.asarray(highlighted_mesh.vertex_colors)
-            
-            # 更新实例对应的顶点为绿色
-            for instance_id in instance_ids:
-                mask = (self.instance_mask == instance_id)
-                colors[mask] = [0, 1, 0]  # 绿色
-            
-            highlighted_mesh.vertex_colors = o3d.utility.Vector3dVector(colors)  # 更新副本的颜色
+            # 实例对应的顶点，稍后在常驻窗口中高亮为绿色
+            highlight_vertices = self.instance_index.vertices_of(instance_ids)
             
             # 创建新的标注项
             new_annotation = {
@@ -450,8 +547,8 @@ class MeshAnnotator(QMainWindow):
             else:
                 self.status_label.setText("状态: 已取消添加标注")
                 
-            # 实时可视化mesh副本
-            self.visualize_highlighted_mesh(highlighted_mesh)
+            # 在常驻窗口中实时高亮
+            self.visualize_highlighted_mesh(highlight_vertices)
             
         except Exception as e:
             self.status_label.setText(f"状态: 点选过程中出错: {str(e)}")
@@ -459,30 +556,15 @@ class MeshAnnotator(QMainWindow):
     
     def visualize_selected_instances(self, object_ids):
         """可视化选中的实例"""
-        if not self.mesh or not self.instance_mask.any():
+        if not self.mesh or self.instance_index is None:
             return
         
         try:
-            # 创建mesh的副本，以防修改原始mesh
-            highlighted_mesh = o3d.geometry.TriangleMesh(self.mesh)
-            
-            # 获取顶点和颜色
-            vertices = np.asarray(highlighted_mesh.vertices)
-            colors = np.asarray(highlighted_mesh.vertex_colors).copy()
-            
-            # 计算高亮点
-            highlight_mask = np.zeros(len(self.instance_mask), dtype=bool)
-            for obj_id in object_ids:
-                highlight_mask |= (self.instance_mask == obj_id)
-            
-            # 将高亮点设置为绿色
-            colors[highlight_mask] = [0, 1, 0]  # 绿色
-            
-            # 更新mesh颜色
-            highlighted_mesh.vertex_colors = o3d.utility.Vector3dVector(colors)
+            # 通过CSR索引只取选中实例的顶点
+            highlight_vertices = self.instance_index.vertices_of(object_ids)
             
-            # 可视化
-            self.visualize_highlighted_mesh(highlighted_mesh)
+            # 在常驻窗口中将高亮点设置为绿色
+            self.visualize_highlighted_mesh(highlight_vertices)
             
         except Exception as e:
             self.status_label.setText(f"状态: 可视化选中实例时出错: {str(e)}")
@@ -570,8 +652,8 @@ class MeshAnnotator(QMainWindow):
             self.annotations_file_path = os.path.join(self.scene_dir, f"{self.scene_name}_abs_annotations.json")
         
         try:
-            with open(self.annotations_file_path, 'w', encoding='utf-8') as f:
-                json.dump(self.annotations, f, indent=4, ensure_ascii=False)
+            # 原子替换：转换脚本的监视模式依赖文件夹修改时间，也不会读到写了一半的文件
+            write_json_atomic(self.annotations_file_path, self.annotations, indent=4)
             
             self.status_label.setText(f"状态: 已保存 {len(self.annotations)} 条标注到 {os.path.basename(self.annotations_file_path)}")
             QMessageBox.information(self, "保存成功", f"已保存 {len(self.annotations)} 条标注到\n{self.annotations_file_path}")
@@ -600,13 +682,24 @@ class MeshAnnotator(QMainWindow):
             event.accept()
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
+    parser = argparse.ArgumentParser(description="3D场景标注工具")
+    parser.add_argument("--cache-scenes", type=int, default=DEFAULT_CACHE_SCENES,
+                        help=f"在内存中保留最近打开的场景数 (默认: {DEFAULT_CACHE_SCENES})")
+    parser.add_argument("--cache-mb", type=float, default=DEFAULT_CACHE_MB,
+                        help=f"场景缓存的内存预算 (MB, 默认: {DEFAULT_CACHE_MB})")
+    parser.add_argument("--pick-points", type=int, default=DEFAULT_PICK_POINTS,
+                        help=f"点选代理的点数上限，0表示始终全分辨率 (默认: {DEFAULT_PICK_POINTS})")
+    args, qt_args = parser.parse_known_args()
+    app = QApplication(sys.argv[:1] + qt_args)
     
     # 设置应用样式
     app.setStyle("Fusion")
     
     # 创建并显示主窗口
-    annotator = MeshAnnotator()
+    annotator = MeshAnnotator(cache_scenes=args.cache_scenes, cache_mb=args.cache_mb, pick_points=args.pick_points)
     annotator.show()
     
-    sys.exit(app.exec_())
\ No newline at end of file
+    exit_code = app.exec_()
+    annotator.stop_loaders()
+    annotator.close_viewer()
+    sys.exit(exit_code)
\ No newline at end of file
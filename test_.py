@@ -1,16 +1,23 @@
 import sys
 import os
 import json
+import argparse
 import open3d as o3d
 import numpy as np
 import time
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QVBoxLayout, QHBoxLayout, 
                             QWidget, QPushButton, QFileDialog, QLabel, QTextEdit, 
-                            QListWidget, QMessageBox, QListWidgetItem, QInputDialog,
+                            QListWidget, QMessageBox, QListWidgetItem, QInputDialog, QCheckBox,
                             QDialog)
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QThread, QTimer
 from PyQt5.QtGui import QFont
 
+from picking_proxy import DEFAULT_PICK_POINTS, scene_picking_proxy
+from scene_data import write_json_atomic
+from scene_session import DEFAULT_CACHE_MB, DEFAULT_CACHE_SCENES, SceneCache, SceneLoadError, next_scene
+from scene_loader import SceneLoader
+from scene_viewer import SceneViewer
+
 # Helper class for camera view description input
 class CameraViewDescriptionDialog(QDialog):
     def __init__(self, parent=None, existing_description=""):
@@ -70,7 +77,7 @@ def dict_to_camera_params(param_dict):
     return params
 
 class MeshAnnotator(QMainWindow):
-    def __init__(self):
+    def __init__(self, cache_scenes=DEFAULT_CACHE_SCENES, cache_mb=DEFAULT_CACHE_MB, pick_points=DEFAULT_PICK_POINTS):
         super().__init__()
         
         self.setWindowTitle("3D场景标注工具")
@@ -92,8 +99,13 @@ class MeshAnnotator(QMainWindow):
         self.visualize_button.clicked.connect(self.visualize_scene)
         self.visualize_button.setEnabled(False)
         
+        self.next_scene_button = QPushButton("下一个场景")
+        self.next_scene_button.clicked.connect(self.open_next_scene)
+        self.next_scene_button.setEnabled(False)
+        
         top_layout.addWidget(self.scene_path_label)
         top_layout.addWidget(self.browse_button)
+        top_layout.addWidget(self.next_scene_button)
         top_layout.addWidget(self.visualize_button)
         
         main_layout.addLayout(top_layout)
@@ -111,9 +123,14 @@ class MeshAnnotator(QMainWindow):
         self.add_description_button.clicked.connect(self.add_description)
         self.add_description_button.setEnabled(False)
         
+        # 默认在降采样的点选代理上点选，密集场景下交互更流畅
+        self.full_res_pick_checkbox = QCheckBox("全分辨率点选")
+        self.full_res_pick_checkbox.setToolTip("使用mesh的全部顶点进行点选 (密集场景下较慢)")
+        
         left_layout.addWidget(self.description_label)
         left_layout.addWidget(self.description_input)
         left_layout.addWidget(self.add_description_button)
+        left_layout.addWidget(self.full_res_pick_checkbox)
         
         # 相机保存模式按钮 - 添加到左侧布局
         self.camera_mode_button = QPushButton("启用相机保存模式")
@@ -194,6 +211,16 @@ class MeshAnnotator(QMainWindow):
         self.instance_mask_path = ""
         self.mesh = None
         self.instance_mask = None
+        self.instance_index = None  # 实例→顶点CSR索引
+        self.bundle = None  # scene_bundle.bin (内存映射) 或 scene_bundle.sbz (解码后)，可选
+        self.session = None  # 当前场景的会话，持有mesh、掩码、索引和派生数据
+        self.scene_cache = SceneCache(cache_scenes, cache_mb)  # 最近打开场景的LRU缓存
+        self.loaders = {}  # 场景目录 → 正在运行的后台加载线程 (含预取)
+        self.pick_points = pick_points if pick_points > 0 else None  # 点选代理的点数上限，None表示全分辨率
+        self.viewer = None  # 当前场景的常驻Open3D查看窗口
+        self.viewer_timer = QTimer(self)
+        self.viewer_timer.setInterval(30)
+        self.viewer_timer.timeout.connect(self.pump_viewer)
         self.camera_pose = None
         self.camera_view_description = ""  # 存储相机视角描述
         self.present_params = None
@@ -266,19 +293,6 @@ class MeshAnnotator(QMainWindow):
             
             QMessageBox.information(self, "当前相机视角", info_text)
             
-            # 加载mesh，如果尚未加载
-            if not self.mesh:
-                self.mesh = o3d.io.read_triangle_mesh(self.mesh_path)
-                
-                # 如果mesh没有顶点颜色，添加默认颜色
-                if not self.mesh.has_vertex_colors():
-                    vertices = np.asarray(self.mesh.vertices)
-                    colors = np.ones((len(vertices), 3)) * 0.7  # 灰色
-                    self.mesh.vertex_colors = o3d.utility.Vector3dVector(colors)
-            
-            # 创建mesh的副本，用于可视化
-            vis_mesh = o3d.geometry.TriangleMesh(self.mesh)
-            
             # 设置窗口尺寸
             window_width = 1024
             window_height = 768
@@ -291,27 +305,16 @@ class MeshAnnotator(QMainWindow):
                 window_width = self.present_params.intrinsic.width
                 window_height = self.present_params.intrinsic.height
             
-            # 创建可视化窗口
-            vis = o3d.visualization.Visualizer()
-            vis.create_window(window_name=f"当前相机视角 - {view_description}", 
-                            width=window_width, height=window_height)
-            vis.add_geometry(vis_mesh)
-            
-            # 添加坐标系
-            coordinate_frame = o3d.geometry.TriangleMesh.create_coordinate_frame(size=0.5)
-            vis.add_geometry(coordinate_frame)
-            
-            # 设置渲染选项
-            opt = vis.get_render_option()
-            opt.background_color = np.array([1.0, 1.0, 1.0])  # 白色背景
+            # 复用常驻窗口 (mesh只在创建窗口时上传一次)，显示原始颜色
+            viewer = self.scene_viewer(window_width, window_height)
+            viewer.set_highlight(None)
             
             # 应用相机参数
-            view_control = vis.get_view_control()
             
             # 优先使用complete_params对象
             if self.present_params:
                 try:
-                    view_control.convert_from_pinhole_camera_parameters(self.present_params, True)
+                    viewer.set_camera(self.present_params)
                     self.status_label.setText(f"状态: 正在显示相机视角 '{view_description}'")
                 except Exception as e:
                     self.status_label.setText(f"状态: 应用相机视角出错: {str(e)}")
@@ -320,14 +323,13 @@ class MeshAnnotator(QMainWindow):
                 try:
                     params = dict_to_camera_params(self.camera_pose)
                     if params:
-                        view_control.convert_from_pinhole_camera_parameters(params, True)
+                        viewer.set_camera(params)
                         self.status_label.setText(f"状态: 正在显示相机视角 '{view_description}'")
                 except Exception as e:
                     self.status_label.setText(f"状态: 应用相机视角出错: {str(e)}")
             
-            # 运行可视化器
-            vis.run()
-            vis.destroy_window()
+            # 交互直到按Esc/Q，窗口保留供后续操作复用
+            viewer.run()
             
             self.status_label.setText(f"状态: 已查看相机视角 '{view_description}'")
             
@@ -345,53 +347,22 @@ class MeshAnnotator(QMainWindow):
             return
                 
         try:
-            # 加载mesh，如果尚未加载
-            if not self.mesh:
-                self.mesh = o3d.io.read_triangle_mesh(self.mesh_path)
-                
-                # 如果mesh没有顶点颜色，添加默认颜色
-                if not self.mesh.has_vertex_colors():
-                    vertices = np.asarray(self.mesh.vertices)
-                    colors = np.ones((len(vertices), 3)) * 0.7  # 灰色
-                    self.mesh.vertex_colors = o3d.utility.Vector3dVector(colors)
-            
-            # 创建mesh的副本，用于可视化
-            vis_mesh = o3d.geometry.TriangleMesh(self.mesh)
-            
-            # 设置窗口标题
-            window_title = f"设置通用相机视角 - 将用于新标注"
-            
-            # 创建可视化窗口
-            window_width = 1024
-            window_height = 768
-            vis = o3d.visualization.Visualizer()
-            vis.create_window(window_name=window_title, width=window_width, height=window_height)
-            vis.add_geometry(vis_mesh)
-            
-            # 添加坐标系
-            coordinate_frame = o3d.geometry.TriangleMesh.create_coordinate_frame(size=0.5)
-            vis.add_geometry(coordinate_frame)
-            
-            # 设置渲染选项
-            opt = vis.get_render_option()
-            opt.background_color = np.array([1.0, 1.0, 1.0])  # 白色背景
+            # 复用常驻窗口，显示原始颜色
+            viewer = self.scene_viewer()
+            viewer.set_highlight(None)
+            self.status_label.setText("状态: 设置通用相机视角 (将用于新标注)，调整好后按Esc或Q确认")
             
             # 如果已有之前设置的相机参数，则应用它
-            view_control = vis.get_view_control()
-            
             if self.present_params:
                 try:
                     # 恢复上次使用的相机参数
-                    view_control.convert_from_pinhole_camera_parameters(self.present_params, True)
+                    viewer.set_camera(self.present_params)
                     self.status_label.setText("状态: 已恢复上次的相机视角")
                 except Exception as e:
                     self.status_label.setText(f"状态: 恢复相机视角出错: {str(e)}")
             
-            # 运行可视化器
-            vis.run()
-            
-            # 获取最终的相机参数
-            final_params = view_control.convert_to_pinhole_camera_parameters()
+            # 交互直到按Esc/Q，获取最终的相机参数 (窗口保留供后续操作复用)
+            final_params = viewer.run()
             
             # 提取相机外参和内参
             extrinsic = final_params.extrinsic
@@ -404,9 +375,6 @@ class MeshAnnotator(QMainWindow):
                 "cy": final_params.intrinsic.get_principal_point()[1]
             }
             
-            # 关闭可视化窗口
-            vis.destroy_window()
-            
             # 从外参矩阵中提取相机位置和朝向
             camera_position = -np.array([extrinsic[0, 3], extrinsic[1, 3], extrinsic[2, 3]])
             camera_direction = -np.array([extrinsic[2, 0], extrinsic[2, 1], extrinsic[2, 2]])
@@ -468,36 +436,6 @@ class MeshAnnotator(QMainWindow):
             if has_camera_params and "view_description" in annotation["camera_params"]:
                 existing_camera_description = annotation["camera_params"]["view_description"]
             
-            # 加载mesh，如果尚未加载
-            if not self.mesh:
-                self.mesh = o3d.io.read_triangle_mesh(self.mesh_path)
-                
-                # 如果mesh没有顶点颜色，添加默认颜色
-                if not self.mesh.has_vertex_colors():
-                    vertices = np.asarray(self.mesh.vertices)
-                    colors = np.ones((len(vertices), 3)) * 0.7  # 灰色
-                    self.mesh.vertex_colors = o3d.utility.Vector3dVector(colors)
-            
-            # 创建mesh的副本，用于可视化
-            vis_mesh = o3d.geometry.TriangleMesh(self.mesh)
-            
-            # 高亮显示标注的物体
-            if self.instance_mask is not None and len(object_ids) > 0:
-                # 获取顶点和颜色
-                vertices = np.asarray(vis_mesh.vertices)
-                colors = np.asarray(vis_mesh.vertex_colors).copy()
-                
-                # 计算高亮点
-                highlight_mask = np.zeros(len(self.instance_mask), dtype=bool)
-                for obj_id in object_ids:
-                    highlight_mask |= (self.instance_mask == obj_id)
-                
-                # 将高亮点设置为绿色
-                colors[highlight_mask] = [0, 1, 0]  # 绿色
-                
-                # 更新mesh颜色
-                vis_mesh.vertex_colors = o3d.utility.Vector3dVector(colors)
-            
             # 设置窗口尺寸
             window_width = 1024
             window_height = 768
@@ -511,47 +449,32 @@ class MeshAnnotator(QMainWindow):
                 window_width = self.camera_pose["intrinsic"]["width"]
                 window_height = self.camera_pose["intrinsic"]["height"]
             
-            # 设置窗口标题
-            window_title = f"修改相机视角 - 标注 #{self.current_annotation_index + 1}"
-            
-            # 创建可视化窗口
-            vis = o3d.visualization.Visualizer()
-            vis.create_window(window_name=window_title, width=window_width, height=window_height)
-            vis.add_geometry(vis_mesh)
-            
-            # 添加坐标系
-            coordinate_frame = o3d.geometry.TriangleMesh.create_coordinate_frame(size=0.5)
-            vis.add_geometry(coordinate_frame)
-            
-            # 设置渲染选项
-            opt = vis.get_render_option()
-            opt.background_color = np.array([1.0, 1.0, 1.0])  # 白色背景
+            # 复用常驻窗口，只更新颜色缓冲来高亮标注的物体 (通过CSR索引只取选中实例的顶点)
+            viewer = self.scene_viewer(window_width, window_height)
+            viewer.set_highlight(self.instance_index.vertices_of(object_ids) if self.instance_index is not None else None)
+            self.status_label.setText(f"状态: 修改标注 #{self.current_annotation_index + 1} 的相机视角，调整好后按Esc或Q确认")
             
             # 设置相机视角
-            view_control = vis.get_view_control()
             
             # 优先应用标注中已有的相机参数
             if has_camera_params:
                 try:
                     params_dict = annotation["camera_params"]
                     vis_params = dict_to_camera_params(params_dict)
-                    view_control.convert_from_pinhole_camera_parameters(vis_params, True)
+                    viewer.set_camera(vis_params)
                     self.status_label.setText("状态: 已恢复标注的相机视角")
                 except Exception as e:
                     self.status_label.setText(f"状态: 恢复相机视角出错: {str(e)}")
             # 如果标注没有相机参数但有全局设置的相机参数，则应用全局参数
             elif self.present_params:
                 try:
-                    view_control.convert_from_pinhole_camera_parameters(self.present_params, True)
+                    viewer.set_camera(self.present_params)
                     self.status_label.setText("状态: 已应用当前全局相机视角")
                 except Exception as e:
                     self.status_label.setText(f"状态: 应用相机视角出错: {str(e)}")
             
-            # 运行可视化器
-            vis.run()
-            
-            # 获取最终的相机参数
-            final_params = view_control.convert_to_pinhole_camera_parameters()
+            # 交互直到按Esc/Q，获取最终的相机参数 (窗口保留供后续操作复用)
+            final_params = viewer.run()
             
             # 提取相机外参和内参
             extrinsic = final_params.extrinsic
@@ -564,9 +487,6 @@ class MeshAnnotator(QMainWindow):
                 "cy": final_params.intrinsic.get_principal_point()[1]
             }
             
-            # 关闭可视化窗口
-            vis.destroy_window()
-            
             # 从外参矩阵中提取相机位置和朝向
             camera_position = -np.array([extrinsic[0, 3], extrinsic[1, 3], extrinsic[2, 3]])
             camera_direction = -np.array([extrinsic[2, 0], extrinsic[2, 1], extrinsic[2, 2]])
@@ -617,6 +537,11 @@ class MeshAnnotator(QMainWindow):
         
         if not dir_path:
             return
+        
+        self.open_scene(dir_path)
+        
+    def open_scene(self, dir_path):
+        """切换到指定的场景目录"""
             
         # 如果已有修改的标注且未保存，先询问是否保存
         if self.annotations and self.annotations_modified:
@@ -649,64 +574,43 @@ class MeshAnnotator(QMainWindow):
         
         self.status_label.setText(f"状态: 正在查找场景 {self.scene_name} 的文件...")
         
-        # 查找ply文件
-        ply_files = [f for f in os.listdir(self.scene_dir) if f.endswith('.ply')]
-        
-        # 修改优先级：首先查找"mesh_aligned_0.05.ply"文件
-        mesh_file = None
-        
-        # 第一优先级：mesh_aligned_0.05.ply
-        if "mesh_aligned_0.05.ply" in ply_files:
-            mesh_file = "mesh_aligned_0.05.ply"
-        # 第二优先级：与场景同名的ply文件
-        elif f"{self.scene_name}.ply" in ply_files:
-            mesh_file = f"{self.scene_name}.ply"
-        # 第三优先级：mesh.ply
-        elif "mesh.ply" in ply_files:
-            mesh_file = "mesh.ply"
-        # 如果都没找到，使用第一个ply文件
-        elif ply_files:
-            mesh_file = ply_files[0]
-        
-        if mesh_file:
-            self.mesh_path = os.path.join(self.scene_dir, mesh_file)
-            self.status_label.setText(f"状态: 找到mesh文件 {mesh_file}")
-        else:
-            self.status_label.setText("状态: 未找到mesh文件")
-            QMessageBox.warning(self, "文件错误", "在选中的目录中没有找到ply文件")
-            return
-        
-        # 查找npy文件
-        npy_files = [f for f in os.listdir(self.scene_dir) if f.endswith('.npy')]
-        
-        # 优先查找带有instance或instances的npy文件
-        instance_file = None
-        for npy_file in npy_files:
-            if "instance" in npy_file.lower():
-                instance_file = npy_file
-                break
+        # 切换场景时先关闭上一个场景的窗口并丢弃其数据，加载完成前禁用依赖场景数据的按钮
+        self.close_viewer()
+        self.session = None
+        self.mesh = None
+        self.bundle = None
+        self.mesh_path = ""
+        self.instance_mask_path = ""
+        self.instance_mask = None
+        self.instance_index = None
+        self.annotations = []
+        self.current_annotation_index = -1
+        self.update_annotations_list()
+        self.visualize_button.setEnabled(False)
+        self.next_scene_button.setEnabled(False)
+        self.add_description_button.setEnabled(False)
+        self.save_annotations_button.setEnabled(False)
+        self.camera_mode_button.setEnabled(False)
         
-        # 如果没找到，使用第一个npy文件
-        if not instance_file and npy_files:
-            instance_file = npy_files[0]
+        # 取消不再需要的后台加载；正在预取的就是目标场景时让它继续
+        self.cancel_loaders(keep=self.scene_dir)
         
-        if instance_file:
-            self.instance_mask_path = os.path.join(self.scene_dir, instance_file)
-            self.status_label.setText(f"状态: 找到实例掩码文件 {instance_file}")
-        else:
-            self.status_label.setText("状态: 未找到实例掩码文件")
-            QMessageBox.warning(self, "文件错误", "在选中的目录中没有找到npy文件")
+        # 最近打开过且文件没有变化的场景直接复用会话，不再读取mesh和掩码
+        session = self.scene_cache.get(self.scene_dir)
+        if session is not None:
+            self.use_session(session)
+            self.status_label.setText(f"状态: 已从缓存恢复场景 {self.scene_name}，包含 {session.num_instances} 个实例")
+            self.load_scene_annotations()
             return
         
-        # 尝试加载实例掩码
-        try:
-            self.instance_mask = np.load(self.instance_mask_path)
-            self.status_label.setText(f"状态: 已加载实例掩码，包含 {len(np.unique(self.instance_mask))} 个实例")
-        except Exception as e:
-            self.status_label.setText(f"状态: 无法加载实例掩码: {str(e)}")
-            QMessageBox.warning(self, "加载错误", f"无法加载实例掩码文件: {str(e)}")
-            return
+        # 查找文件、加载掩码和读取mesh都在后台线程中进行，完成后由scene_loaded继续
+        loader = self.loaders.get(os.path.abspath(self.scene_dir))
+        if loader is None or loader.is_cancelled():
+            self.start_loader(self.scene_dir)
+        self.status_label.setText(f"状态: 正在后台加载场景 {self.scene_name}...")
         
+    def load_scene_annotations(self):
+        """场景数据就绪后读取标注文件并启用按钮，随后在后台预取下一个场景"""
         # 尝试加载annotations文件
         self.annotations_file_path = os.path.join(self.scene_dir, f"{self.scene_name}_annotations.json")
         if os.path.exists(self.annotations_file_path):
@@ -737,6 +641,120 @@ class MeshAnnotator(QMainWindow):
         self.add_description_button.setEnabled(True)
         self.save_annotations_button.setEnabled(True)
         self.camera_mode_button.setEnabled(True)  # 启用相机模式按钮
+        self.next_scene_button.setEnabled(next_scene(self.scene_dir) is not None)
+        
+        # 标注当前场景时在后台预取下一个场景
+        self.prefetch_next_scene()
+        
+    def use_session(self, session):
+        """切换到一个场景会话；mesh、掩码和索引都由会话持有，在各操作之间共享"""
+        self.session = session
+        self.mesh_path = session.mesh_path
+        self.bundle = session.bundle
+        self.instance_mask_path = session.instance_mask_path
+        self.instance_mask = session.instance_mask
+        self.instance_index = session.instance_index
+        self.mesh = session.loaded_mesh
+        
+    def load_mesh(self):
+        """当前场景的mesh：由场景会话在第一次使用时读取，之后直接返回同一个对象"""
+        self.mesh = self.session.mesh()
+        # mesh读取后会话变大，按内存预算淘汰其他缓存的场景
+        self.scene_cache.trim(keep=self.session)
+        return self.mesh
+        
+    def start_loader(self, scene_dir, prefetch=False):
+        """启动后台加载线程；预取使用较低的线程优先级"""
+        loader = SceneLoader(scene_dir, prefetch=prefetch, pick_points=self.pick_points, parent=self)
+        loader.progress.connect(self.scene_load_progress)
+        loader.loaded.connect(self.scene_loaded)
+        loader.failed.connect(self.scene_load_failed)
+        loader.finished.connect(lambda: self.loader_finished(loader))
+        self.loaders[os.path.abspath(scene_dir)] = loader
+        loader.start(QThread.LowPriority if prefetch else QThread.InheritPriority)
+        return loader
+        
+    def loader_finished(self, loader):
+        key = os.path.abspath(loader.scene_dir)
+        if self.loaders.get(key) is loader:
+            del self.loaders[key]
+        loader.deleteLater()
+        
+    def cancel_loaders(self, keep=None):
+        """取消除keep以外所有场景的后台加载"""
+        for key, loader in self.loaders.items():
+            if keep is None or key != os.path.abspath(keep):
+                loader.cancel()
+        
+    def stop_loaders(self):
+        """退出前取消并等待所有后台加载线程结束"""
+        self.cancel_loaders()
+        for loader in list(self.loaders.values()):
+            loader.wait()
+        
+    def is_current_scene(self, scene_dir):
+        return bool(self.scene_dir) and os.path.abspath(scene_dir) == os.path.abspath(self.scene_dir)
+        
+    def scene_load_progress(self, scene_dir, message):
+        """在状态栏显示当前场景的加载进度 (预取的进度不显示)"""
+        if self.is_current_scene(scene_dir) and self.session is None:
+            self.status_label.setText(f"状态: [{os.path.basename(scene_dir)}] {message}")
+        
+    def scene_loaded(self, session):
+        """后台加载完成：当前场景直接使用，预取的场景放入缓存等待切换"""
+        if self.is_current_scene(session.scene_dir) and self.session is None:
+            self.scene_cache.put(session)
+            self.use_session(session)
+            self.status_label.setText(f"状态: {session.status}")
+            self.load_scene_annotations()
+        else:
+            self.scene_cache.put(session, keep=self.session)
+        
+    def scene_load_failed(self, scene_dir, error):
+        """当前场景加载失败时提示；预取失败不打扰用户，真正打开该场景时会重新加载并报告"""
+        if not self.is_current_scene(scene_dir):
+            return
+        if isinstance(error, SceneLoadError):
+            self.status_label.setText(f"状态: {error.status}")
+            QMessageBox.warning(self, error.title, str(error))
+        else:
+            self.status_label.setText(f"状态: 加载场景失败: {str(error)}")
+            QMessageBox.warning(self, "加载错误", f"无法加载场景: {str(error)}")
+        
+    def prefetch_next_scene(self):
+        """标注当前场景时，在后台把下一个同级场景读入缓存"""
+        next_dir = next_scene(self.scene_dir)
+        if next_dir is None or next_dir in self.scene_cache or os.path.abspath(next_dir) in self.loaders:
+            return
+        self.start_loader(next_dir, prefetch=True)
+        
+    def open_next_scene(self):
+        """切换到按名称排序的下一个同级场景"""
+        next_dir = next_scene(self.scene_dir) if self.scene_dir else None
+        if next_dir is None:
+            QMessageBox.information(self, "下一个场景", "已经是最后一个场景")
+            return
+        self.open_scene(next_dir)
+        
+    def scene_viewer(self, width=1024, height=768):
+        """当前场景的常驻查看窗口：第一次使用时创建，之后查看、高亮和设置视角都复用同一窗口和相机"""
+        if self.viewer is None:
+            self.viewer = SceneViewer(self.load_mesh(), self.scene_name)
+        self.viewer.open(width, height)
+        # 操作之间由定时器处理窗口事件，保持窗口响应
+        self.viewer_timer.start()
+        return self.viewer
+        
+    def pump_viewer(self):
+        if self.viewer is None or not self.viewer.poll():
+            self.viewer_timer.stop()
+        
+    def close_viewer(self):
+        """关闭当前场景的查看窗口 (切换场景或退出时)"""
+        self.viewer_timer.stop()
+        if self.viewer is not None:
+            self.viewer.close()
+            self.viewer = None
         
     def update_annotations_list(self):
         """更新标注列表显示"""
@@ -791,38 +809,15 @@ class MeshAnnotator(QMainWindow):
         try:
             self.status_label.setText("状态: 正在加载mesh...")
             
-            # 加载mesh
-            self.mesh = o3d.io.read_triangle_mesh(self.mesh_path)
-            
-            # 如果mesh没有顶点颜色，添加默认颜色
-            if not self.mesh.has_vertex_colors():
-                vertices = np.asarray(self.mesh.vertices)
-                colors = np.ones((len(vertices), 3)) * 0.7  # 灰色
-                self.mesh.vertex_colors = o3d.utility.Vector3dVector(colors)
+            # 可视化mesh：复用常驻窗口并恢复原始颜色，相机保持上一次操作结束时的视角
+            viewer = self.scene_viewer()
+            viewer.set_highlight(None)
+            self.status_label.setText(f"状态: 正在查看场景 {self.scene_name}，按Esc或Q结束")
             
-            # 可视化mesh
-            coordinate_frame = o3d.geometry.TriangleMesh.create_coordinate_frame(size=0.5)
-            vis = o3d.visualization.Visualizer()
-            window_width = 1024
-            window_height = 768
-            vis.create_window(window_name=f"场景: {self.scene_name}", width=window_width, height=window_height)
-            vis.add_geometry(self.mesh)
-            vis.add_geometry(coordinate_frame)
-            
-            # 设置为白色背景
-            opt = vis.get_render_option()
-            opt.background_color = np.array([1.0, 1.0, 1.0])  # 白色背景
-            
-            # 运行可视化器
-            vis.run()
-            
-            # 保存默认视角参数，以备后用
-            view_control = vis.get_view_control()
-            self.default_camera_params = view_control.convert_to_pinhole_camera_parameters()
+            # 运行可视化器，保存结束时的视角参数，以备后用
+            self.default_camera_params = viewer.run()
             self.present_params = self.default_camera_params
             
-            vis.destroy_window()
-            
             self.status_label.setText(f"状态: 已可视化场景 {self.scene_name}")
             
         except Exception as e:
@@ -842,29 +837,32 @@ class MeshAnnotator(QMainWindow):
             QMessageBox.warning(self, "文件错误", "请先选择包含mesh和实例掩码的场景目录")
             return
         
-        # 点选逻辑
-        if not self.mesh:
-            try:
-                self.mesh = o3d.io.read_triangle_mesh(self.mesh_path)
-                
-                # 如果mesh没有顶点颜色，添加默认颜色
-                if not self.mesh.has_vertex_colors():
-                    vertices = np.asarray(self.mesh.vertices)
-                    colors = np.ones((len(vertices), 3)) * 0.7  # 灰色
-                    self.mesh.vertex_colors = o3d.utility.Vector3dVector(colors)
-            except Exception as e:
-                self.status_label.setText(f"状态: 加载mesh失败: {str(e)}")
-                QMessageBox.warning(self, "加载错误", f"无法加载mesh: {str(e)}")
-                return
+        # mesh由场景会话持有，只在第一次使用时读取
+        try:
+            self.load_mesh()
+        except Exception as e:
+            self.status_label.setText(f"状态: 加载mesh失败: {str(e)}")
+            QMessageBox.warning(self, "加载错误", f"无法加载mesh: {str(e)}")
+            return
         
         try:
             self.status_label.setText("状态: 进入点选模式，按住Shift并点击物体以选择实例...")
             
-            # 创建点云以进行点选
-            # 我们从mesh获取点并使用顶点颜色
-            pcd = o3d.geometry.PointCloud()
-            pcd.points = o3d.utility.Vector3dVector(np.asarray(self.mesh.vertices))
-            pcd.colors = o3d.utility.Vector3dVector(np.asarray(self.mesh.vertex_colors))
+            # 点选窗口与常驻窗口共用同一份mesh颜色，先取消高亮
+            if self.viewer is not None:
+                self.viewer.set_highlight(None)
+            
+            vertices = np.asarray(self.mesh.vertices)
+            if len(self.instance_mask) != len(vertices):
+                self.status_label.setText(f"状态: 实例掩码大小 ({len(self.instance_mask)}) 与mesh顶点数 ({len(vertices)}) 不匹配")
+                QMessageBox.warning(self, "数据错误", "实例掩码与mesh顶点数量不匹配")
+                return
+            
+            # 在点选代理上点选：每个 (实例, 体素) 保留一个顶点，小实例也不会丢失；
+            # 代理按场景缓存，之后的点选直接复用
+            max_points = None if self.full_res_pick_checkbox.isChecked() else self.pick_points
+            proxy = scene_picking_proxy(self.session, max_points)
+            pcd = proxy.cloud(self.mesh)
             
             # 创建坐标系
             coordinate_frame = o3d.geometry.TriangleMesh.create_coordinate_frame(size=0.5)
@@ -880,12 +878,19 @@ class MeshAnnotator(QMainWindow):
             opt.background_color = np.array([1.0, 1.0, 1.0])  # 白色背景
             opt.point_size = 3.0  # 增大点大小便于选择
             
+            # 沿用常驻查看窗口当前的相机视角
+            if self.viewer is not None and self.viewer.is_open:
+                try:
+                    vis.get_view_control().convert_from_pinhole_camera_parameters(self.viewer.camera_params(), True)
+                except Exception as e:
+                    print(f"应用相机视角失败: {str(e)}")
+            
             # 运行可视化器
             vis.run()
             vis.destroy_window()
             
-            # 获取选中的点索引
-            picked_indices = vis.get_picked_points()
+            # 获取选中的点对应的原始顶点索引
+            picked_indices = proxy.to_vertices(vis.get_picked_points())
             
             if not picked_indices:
                 self.status_label.setText("状态: 未选择任何点，请重试")
@@ -896,12 +901,6 @@ class MeshAnnotator(QMainWindow):
             unique_instance_ids = set()
             
             # 提取所有被点选的点对应的实例ID
-            vertices = np.asarray(self.mesh.vertices)
-            if len(self.instance_mask) != len(vertices):
-                self.status_label.setText(f"状态: 实例掩码大小 ({len(self.instance_mask)}) 与mesh顶点数 ({len(vertices)}) 不匹配")
-                QMessageBox.warning(self, "数据错误", "实例掩码与mesh顶点数量不匹配")
-                return
-            
             for idx in picked_indices:
                 if 0 <= idx < len(self.instance_mask):
                     instance_id = int(self.instance_mask[idx])
@@ -973,27 +972,12 @@ class MeshAnnotator(QMainWindow):
     
     def visualize_selected_instances(self, object_ids, annotation=None):
         """可视化选中的实例"""
-        if not self.mesh or not self.instance_mask.any():
+        if not self.mesh or self.instance_index is None:
             return
         
         try:
-            # 创建mesh的副本，以防修改原始mesh
-            highlighted_mesh = o3d.geometry.TriangleMesh(self.mesh)
-            
-            # 获取顶点和颜色
-            vertices = np.asarray(highlighted_mesh.vertices)
-            colors = np.asarray(highlighted_mesh.vertex_colors).copy()
-            
-            # 计算高亮点
-            highlight_mask = np.zeros(len(self.instance_mask), dtype=bool)
-            for obj_id in object_ids:
-                highlight_mask |= (self.instance_mask == obj_id)
-            
-            # 将高亮点设置为绿色
-            colors[highlight_mask] = [0, 1, 0]  # 绿色
-            
-            # 更新mesh颜色
-            highlighted_mesh.vertex_colors = o3d.utility.Vector3dVector(colors)
+            # 通过CSR索引只取选中实例的顶点
+            highlight_vertices = self.instance_index.vertices_of(object_ids)
             
             # 设置默认窗口尺寸
             window_width = 1024
@@ -1021,34 +1005,20 @@ class MeshAnnotator(QMainWindow):
                 except Exception as e:
                     print(f"创建相机参数失败: {str(e)}")
             
-            # 可视化
-            coordinate_frame = o3d.geometry.TriangleMesh.create_coordinate_frame(size=0.5)
-            vis = o3d.visualization.Visualizer()
-            
-            # 设置窗口标题
-            window_title = f"选中的实例 - {len(object_ids)}个"
-            if camera_view_description:
-                window_title += f" - {camera_view_description}"
-            
-            vis.create_window(window_name=window_title, width=window_width, height=window_height)
-            vis.add_geometry(highlighted_mesh)
-            vis.add_geometry(coordinate_frame)
-            
-            # 设置为白色背景
-            opt = vis.get_render_option()
-            opt.background_color = np.array([1.0, 1.0, 1.0])  # 白色背景
+            # 复用常驻窗口 (点选后查看高亮不会重新上传mesh)，只更新颜色缓冲，将高亮点设置为绿色
+            viewer = self.scene_viewer(window_width, window_height)
+            viewer.set_highlight(highlight_vertices)
+            self.status_label.setText(f"状态: 正在查看选中的 {len(object_ids)} 个实例，按Esc或Q结束")
             
-            # 如果有相机参数，应用它
+            # 如果有相机参数，应用它；否则保持上一次操作的视角
             if vis_params:
                 try:
-                    view_control = vis.get_view_control()
-                    view_control.convert_from_pinhole_camera_parameters(vis_params, True)
+                    viewer.set_camera(vis_params)
                     self.status_label.setText(f"状态: 已应用相机视角 '{camera_view_description}'")
                 except Exception as e:
                     print(f"应用相机视角失败: {str(e)}")
             
-            vis.run()
-            vis.destroy_window()
+            viewer.run()
             
             self.status_label.setText(f"状态: 已可视化 {len(object_ids)} 个选中实例")
             
@@ -1177,8 +1147,8 @@ class MeshAnnotator(QMainWindow):
             self.annotations_file_path = os.path.join(self.scene_dir, f"{self.scene_name}_annotations.json")
         
         try:
-            with open(self.annotations_file_path, 'w', encoding='utf-8') as f:
-                json.dump(self.annotations, f, indent=4, ensure_ascii=False)
+            # 原子替换：转换脚本的监视模式依赖文件夹修改时间，也不会读到写了一半的文件
+            write_json_atomic(self.annotations_file_path, self.annotations, indent=4)
             
             self.status_label.setText(f"状态: 已保存 {len(self.annotations)} 条标注到 {os.path.basename(self.annotations_file_path)}")
             QMessageBox.information(self, "保存成功", f"已保存 {len(self.annotations)} 条标注到\n{self.annotations_file_path}")
@@ -1209,13 +1179,24 @@ class MeshAnnotator(QMainWindow):
             event.accept()
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
+    parser = argparse.ArgumentParser(description="3D场景标注工具")
+    parser.add_argument("--cache-scenes", type=int, default=DEFAULT_CACHE_SCENES,
+                        help=f"在内存中保留最近打开的场景数 (默认: {DEFAULT_CACHE_SCENES})")
+    parser.add_argument("--cache-mb", type=float, default=DEFAULT_CACHE_MB,
+                        help=f"场景缓存的内存预算 (MB, 默认: {DEFAULT_CACHE_MB})")
+    parser.add_argument("--pick-points", type=int, default=DEFAULT_PICK_POINTS,
+                        help=f"点选代理的点数上限，0表示始终全分辨率 (默认: {DEFAULT_PICK_POINTS})")
+    args, qt_args = parser.parse_known_args()
+    app = QApplication(sys.argv[:1] + qt_args)
     
     # 设置应用样式
     app.setStyle("Fusion")
     
     # 创建并显示主窗口
-    annotator = MeshAnnotator()
+    annotator = MeshAnnotator(cache_scenes=args.cache_scenes, cache_mb=args.cache_mb, pick_points=args.pick_points)
     annotator.show()
     
-    sys.exit(app.exec_())
\ No newline at end of file
+    exit_code = app.exec_()
+    annotator.stop_loaders()
+    annotator.close_viewer()
+    sys.exit(exit_code)
\ No newline at end of file
@@ -0,0 +1,230 @@
+import os
+import sys
+import json
+import time
+import argparse
+import traceback
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from process_raw_annotation import ANNOTATION_SOURCES, load_label_index
+from scene_data import INSTANCE_FILE, load_instance_index, write_json_atomic
+
+SEGMENTS_FILE = 'segments_anno.json'
+REPORT_FILE = 'validation_report.json'
+
+
+def issue(check, detail, source=None, index=None):
+    return {'source': source, 'index': index, 'check': check, 'detail': detail}
+
+
+def object_id_table(annotations):
+    """把所有标注的object_ids展开为 (所属标注序号, id) 两个数组，非整数id单独返回"""
+    owners, ids, bad = [], [], []
+    for i, annotation in enumerate(annotations):
+        for obj_id in annotation.get('object_ids', []):
+            if isinstance(obj_id, int) and not isinstance(obj_id, bool) and abs(obj_id) < 2**63:
+                owners.append(i)
+                ids.append(obj_id)
+            else:
+                bad.append((i, obj_id))
+    return np.asarray(owners, dtype=np.int64), np.asarray(ids, dtype=np.int64), bad
+
+
+def check_object_ids(annotations, source, mask_ids, segment_ids):
+    """object_ids 必须非空、为整数，并同时出现在 instance.npy 和 segments_anno.json 中"""
+    issues = []
+    for i, annotation in enumerate(annotations):
+        if not annotation.get('object_ids'):
+            issues.append(issue('no_objects', '没有object_ids', source, i))
+    owners, ids, bad = object_id_table(annotations)
+    for i, obj_id in bad:
+        issues.append(issue('bad_object_id', f'object_id不是整数: {obj_id!r}', source, i))
+    if mask_ids is not None:
+        missing = ~np.isin(ids, mask_ids)
+        for i, obj_id in zip(owners[missing].tolist(), ids[missing].tolist()):
+            issues.append(issue('missing_in_mask', f'实例 {obj_id} 不在 {INSTANCE_FILE} 中', source, i))
+    missing = ~np.isin(ids, segment_ids)
+    for i, obj_id in zip(owners[missing].tolist(), ids[missing].tolist()):
+        issues.append(issue('missing_in_segments', f'实例 {obj_id} 不在 {SEGMENTS_FILE} 中', source, i))
+    return issues
+
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def is_point(value):
+    return isinstance(value, (list, tuple)) and len(value) == 3 and all(is_number(v) for v in value)
+
+
+def check_distances(annotations, source, tolerance):
+    """distance_m 必须与 point1/point2 之间的距离一致 (标注工具保留4位小数)"""
+    issues = []
+    rows, points1, points2, distances = [], [], [], []
+    for i, annotation in enumerate(annotations):
+        count = len(annotation.get('object_ids', []))
+        if count != 2:
+            issues.append(issue('abs_object_count', f'距离标注应有2个实例，实际 {count} 个', source, i))
+        p1, p2, d = annotation.get('point1'), annotation.get('point2'), annotation.get('distance_m')
+        if not (is_point(p1) and is_point(p2) and is_number(d)):
+            issues.append(issue('missing_points', '缺少point1/point2/distance_m或格式错误', source, i))
+            continue
+        rows.append(i)
+        points1.append(p1)
+        points2.append(p2)
+        distances.append(d)
+    if rows:
+        actual = np.linalg.norm(np.asarray(points1, dtype=np.float64) - np.asarray(points2, dtype=np.float64), axis=1)
+        error = np.abs(actual - np.asarray(distances, dtype=np.float64))
+        for k in np.flatnonzero(~(error <= tolerance)):
+            issues.append(issue('distance_mismatch', f'distance_m={distances[k]}，两点实际距离 {actual[k]:.4f}',
+                                source, rows[k]))
+    return issues
+
+
+def check_extrinsics(annotations, source, tolerance):
+    """camera_params.extrinsic 必须是刚体变换：R正交、det(R)=1、最后一行为 [0, 0, 0, 1]"""
+    issues = []
+    rows, extrinsics = [], []
+    for i, annotation in enumerate(annotations):
+        params = annotation.get('camera_params')
+        if not params:
+            continue
+        try:
+            extrinsic = np.asarray(params['extrinsic'], dtype=np.float64)
+        except (KeyError, TypeError, ValueError):
+            issues.append(issue('bad_extrinsic', 'camera_params中没有有效的extrinsic', source, i))
+            continue
+        if extrinsic.shape != (4, 4):
+            issues.append(issue('bad_extrinsic', f'extrinsic形状为 {extrinsic.shape}，应为 (4, 4)', source, i))
+            continue
+        rows.append(i)
+        extrinsics.append(extrinsic)
+    if rows:
+        E = np.stack(extrinsics)
+        R = E[:, :3, :3]
+        orthogonality = np.abs(np.einsum('kji,kjl->kil', R, R) - np.eye(3)).max(axis=(1, 2))
+        det = np.linalg.det(R)
+        bottom = np.abs(E[:, 3] - [0, 0, 0, 1]).max(axis=1)
+        finite = np.isfinite(E).all(axis=(1, 2))
+        bad = ~finite | ~(orthogonality <= tolerance) | ~(np.abs(det - 1) <= tolerance) | ~(bottom <= tolerance)
+        for k in np.flatnonzero(bad):
+            issues.append(issue('non_rigid_extrinsic',
+                                f'|RᵀR-I|={orthogonality[k]:.2e}, det(R)={det[k]:.6f}, 最后一行偏差 {bottom[k]:.2e}',
+                                source, rows[k]))
+    return issues
+
+
+def validate_scene(scene_dir, distance_tol=1e-3, rigid_tol=1e-4):
+    """检查一个场景的所有标注；实例掩码和segments只读取一次，任何异常都只影响该场景"""
+    start = time.perf_counter()
+    scene = os.path.basename(os.path.normpath(scene_dir))
+    result = {'scene': scene, 'status': 'ok', 'annotations': 0, 'abs_annotations': 0, 'issues': []}
+    try:
+        segments_path = os.path.join(scene_dir, SEGMENTS_FILE)
+        if not os.path.exists(segments_path):
+            result['status'] = 'skipped'
+            return result
+        # 与转换脚本一致，objectId和id都算作存在
+        segment_ids = np.asarray([k for k in load_label_index(segments_path)
+                                  if isinstance(k, int) and not isinstance(k, bool) and abs(k) < 2**63],
+                                 dtype=np.int64)
+
+        mask_path = os.path.join(scene_dir, INSTANCE_FILE)
+        mask_ids = None
+        if os.path.exists(mask_path):
+            # 校验只读取数据集，索引缺失时只在内存中构建
+            ids = load_instance_index(mask_path, save=False).ids
+            mask_ids = ids[ids != 0]
+        else:
+            result['issues'].append(issue('no_instance_mask', f'没有 {INSTANCE_FILE}，跳过掩码检查'))
+
+        for source, (template, _, _) in ANNOTATION_SOURCES.items():
+            path = os.path.join(scene_dir, template.format(scene=scene))
+            if not os.path.exists(path):
+                continue
+            with open(path, 'r', encoding='utf-8') as f:
+                annotations = json.load(f)
+            result[source] = len(annotations)
+            result['issues'] += check_object_ids(annotations, source, mask_ids, segment_ids)
+            result['issues'] += check_extrinsics(annotations, source, rigid_tol)
+            if source == 'abs_annotations':
+                result['issues'] += check_distances(annotations, source, distance_tol)
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = f'{type(e).__name__}: {e}'
+        result['traceback'] = traceback.format_exc()
+    finally:
+        result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='检查数据集中所有标注与实例掩码、segments和相机参数是否一致')
+    parser.add_argument('dataset_path', help='数据集目录，每个子文件夹为一个场景')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1,
+                        help='并行工作进程数 (默认: CPU核数)')
+    parser.add_argument('--scenes', nargs='+', default=None, help='只检查指定的场景')
+    parser.add_argument('--output', default=None,
+                        help=f'报告路径 (默认: <dataset_path>/{REPORT_FILE})')
+    parser.add_argument('--distance-tol', type=float, default=1e-3,
+                        help='distance_m 与两点距离允许的误差 (米, 默认: 0.001)')
+    parser.add_argument('--rigid-tol', type=float, default=1e-4,
+                        help='判断外参为刚体变换时允许的误差 (默认: 1e-4)')
+    parser.add_argument('-v', '--verbose', action='store_true', help='打印每个问题')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    from data_preprocess import list_scenes
+
+    scenes = args.scenes if args.scenes else list_scenes(args.dataset_path)
+    scene_dirs = [os.path.join(args.dataset_path, name) for name in scenes]
+    start = time.perf_counter()
+    tolerances = [args.distance_tol] * len(scene_dirs), [args.rigid_tol] * len(scene_dirs)
+    if args.workers <= 1 or len(scene_dirs) <= 1:
+        results = list(map(validate_scene, scene_dirs, *tolerances))
+    else:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            results = list(executor.map(validate_scene, scene_dirs, *tolerances,
+                                        chunksize=max(1, len(scene_dirs) // (args.workers * 8))))
+    elapsed = time.perf_counter() - start
+
+    checks = Counter(i['check'] for r in results for i in r['issues'])
+    failed = [r['scene'] for r in results if r['status'] == 'error']
+    summary = {
+        'scenes': len(results),
+        'annotations': sum(r['annotations'] for r in results),
+        'abs_annotations': sum(r['abs_annotations'] for r in results),
+        'scenes_with_issues': sum(1 for r in results if r['issues']),
+        'issues': dict(sorted(checks.items())),
+        'errors': failed,
+        'seconds': elapsed,
+    }
+    output = args.output or os.path.join(args.dataset_path, REPORT_FILE)
+    write_json_atomic(output, {'summary': summary, 'scenes': results}, indent=1)
+
+    for r in results:
+        if r['status'] == 'error':
+            print(f'{r["scene"]}: 出错 {r["error"]}')
+        elif r['issues']:
+            print(f'{r["scene"]}: {len(r["issues"])} 个问题')
+            if args.verbose:
+                for i in r['issues']:
+                    where = f'{i["source"]}[{i["index"]}]' if i['source'] else '场景'
+                    print(f'  {where} {i["check"]}: {i["detail"]}')
+    print(f'完成: {len(results)} 个场景, {summary["annotations"] + summary["abs_annotations"]} 条标注, '
+          f'{sum(checks.values())} 个问题, {len(failed)} 个场景出错, 耗时 {elapsed:.1f}s '
+          f'({len(results) / max(elapsed, 1e-9):.2f} 场景/s)')
+    for check, count in sorted(checks.items()):
+        print(f'  {check}: {count}')
+    print(f'报告已保存到 {output}')
+    return 1 if checks or failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())